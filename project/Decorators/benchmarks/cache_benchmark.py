@@ -0,0 +1,212 @@
+"""
+Hit rate and call latency of the cached decorator on Zipf-distributed keys,
+where a few hot keys take most of the calls. "fifo" is the behaviour of the
+original implementation, which never refreshed an entry on a hit. Another
+table bounds the cache by bytes instead of entries for results of mixed
+size. The key table compares the original (args, frozenset(kwargs)) key
+with the current one and content_key on a 10x10 matrix. Another table
+counts how often a slow function is computed when threads miss on the same
+keys at once. The last one measures a cold start (an empty in-memory cache)
+with and without a warm DiskCache tier. Run from the repository root:
+
+    python -m project.Decorators.benchmarks.cache_benchmark [calls]
+"""
+
+import bisect
+import itertools
+import random
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from project.Decorators.cache import (
+    POLICIES,
+    DiskCache,
+    _make_key,
+    cached,
+    content_key,
+)
+
+KEYS = 10_000
+MAX_SIZE = 500
+
+
+def zipf_keys(count, s, seed=0):
+    """
+    Returns ``count`` keys in range(KEYS); key k is drawn with a probability
+    proportional to 1 / (k + 1) ** s.
+    """
+    weights = itertools.accumulate(1 / (k + 1) ** s for k in range(KEYS))
+    cumulative = list(weights)
+    rng = random.Random(seed)
+    total = cumulative[-1]
+    return [bisect.bisect(cumulative, rng.random() * total) for _ in range(count)]
+
+
+def run(keys, **options):
+    """
+    Calls a cached function with every key.
+
+    Returns:
+        tuple: The hit rate and the mean time per call in nanoseconds.
+    """
+    misses = 0
+
+    @cached(**options)
+    def square(x):
+        nonlocal misses
+        misses += 1
+        return x * x
+
+    start = time.perf_counter()
+    for key in keys:
+        square(key)
+    elapsed = time.perf_counter() - start
+    return 1 - misses / len(keys), elapsed / len(keys) * 1e9
+
+
+def run_sized(keys, sizes, **options):
+    """
+    Calls a cached function that returns a bytes object of ``sizes[key]``
+    bytes with every key.
+
+    Returns:
+        float: The hit rate.
+    """
+    misses = 0
+
+    @cached(**options)
+    def load(x):
+        nonlocal misses
+        misses += 1
+        return bytes(sizes[x])
+
+    for key in keys:
+        load(key)
+    return 1 - misses / len(keys)
+
+
+def original_key(args, kwargs):
+    return (args, frozenset(kwargs.items()))
+
+
+def key_time(build, count=100_000):
+    """
+    Returns the best mean time in nanoseconds of building a key.
+    """
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(count):
+            build()
+        best = min(best, time.perf_counter() - start)
+    return best / count * 1e9
+
+
+def main(calls=200_000):
+    print(f"keys = {KEYS}, max_size = {MAX_SIZE}, calls = {calls}")
+    print(f"{'hit rate':<12}" + "".join(f"{policy:>12}" for policy in POLICIES))
+    samples = {s: zipf_keys(calls, s) for s in (0.8, 1.0, 1.2)}
+    latencies = {}
+    for s, keys in samples.items():
+        row = []
+        for policy in POLICIES:
+            hit_rate, latency = run(keys, max_size=MAX_SIZE, policy=policy)
+            row.append(f"{hit_rate:>12.1%}")
+            latencies.setdefault(policy, []).append(latency)
+        print(f"{f'zipf s={s}':<12}" + "".join(row))
+
+    print(f"\n{'ns per call':<12}" + "".join(f"{policy:>12}" for policy in POLICIES))
+    print(
+        f"{'zipf':<12}"
+        + "".join(f"{min(latencies[policy]):>12.0f}" for policy in POLICIES)
+    )
+    hot = [key % MAX_SIZE for key in range(calls)]
+    hits = [
+        min(run(hot, max_size=MAX_SIZE, policy=policy)[1] for _ in range(3))
+        for policy in POLICIES
+    ]
+    print(f"{'all hits':<12}" + "".join(f"{latency:>12.0f}" for latency in hits))
+    for label, options in (
+        ("unbounded", {}),
+        ("stats", {"stats": True}),
+        ("ttl=60", {"ttl": 60}),
+    ):
+        latency = min(run(hot, **options)[1] for _ in range(3))
+        print(f"{label:<12}{latency:>12.0f}")
+
+    # Hot keys return small results and cold keys large ones, so an entry
+    # bound either wastes memory or holds few entries.
+    rng = random.Random(1)
+    sizes = [rng.randint(100, 1000) if k < 1000 else 50_000 for k in range(KEYS)]
+    keys = samples[1.0]
+    budget = MAX_SIZE * 5_000
+    print(f"\nbudget = {budget:,} bytes, zipf s=1.0")
+    for label, options in (
+        ("max_size", {"max_size": budget // max(sizes)}),
+        ("max_weight", {"max_weight": budget, "weigher": len}),
+    ):
+        print(f"{label:<12}{run_sized(keys, sizes, **options):>12.1%}")
+
+    print(f"\n{'key, ns':<16}{'original':>12}{'current':>12}")
+    for label, args, kwargs in (
+        ("f(1)", (1,), {}),
+        ("f(1, 'a')", (1, "a"), {}),
+        ("f(1, b=2)", (1,), {"b": 2}),
+    ):
+        original = key_time(lambda: original_key(args, kwargs))
+        current = key_time(lambda: _make_key(args, kwargs))
+        print(f"{label:<16}{original:>12.0f}{current:>12.0f}")
+    matrix = [[float(i * j) for j in range(10)] for i in range(10)]
+    print(f"{'content_key':<16}{'':>12}{key_time(lambda: content_key(matrix)):>12.0f}")
+
+    print(f"\n{'8 threads':<12}{'calls':>12}{'seconds':>12}")
+    for thread_safe in (False, True):
+        computed = 0
+
+        @cached(thread_safe=thread_safe)
+        def slow(x):
+            nonlocal computed
+            computed += 1
+            time.sleep(0.002)
+            return x
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(8) as executor:
+            list(executor.map(slow, [k // 8 for k in range(800)]))
+        elapsed = time.perf_counter() - start
+        label = "thread_safe" if thread_safe else "default"
+        print(f"{label:<12}{computed:>12}{elapsed:>12.2f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        storage = DiskCache(os.path.join(directory, "cache.db"))
+        print(f"\n{'cold start':<12}{'us per call':>12}")
+        for label, options in (
+            ("no tier", {}),
+            ("empty tier", {"persist": storage}),
+            ("warm tier", {"persist": storage}),
+        ):
+            print(f"{label:<12}{cold_start(**options):>12.1f}")
+        storage.close()
+
+
+def cold_start(count=1_000, **options):
+    """
+    Returns the mean time in microseconds of the first call of a function
+    that takes about a millisecond, with a new in-memory cache.
+    """
+
+    @cached(**options)
+    def work(x):
+        return sum(i * x for i in range(20_000))
+
+    start = time.perf_counter()
+    for x in range(count):
+        work(x)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -1,8 +1,481 @@
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict, defaultdict, namedtuple
 from functools import wraps
-from typing import OrderedDict
+from time import monotonic
 
+from project.thread_pool.thread_pool import ResultWrapper
 
-def cached(max_size=None):
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+CacheInfo = namedtuple(
+    "CacheInfo", ["hits", "misses", "evictions", "size", "max_size", "memory"]
+)
+_KWARGS = object()
+_FAST_TYPES = {int, str}
+_SCALAR_TYPES = {int, float, complex, bool, str, type(None)}
+_FLOAT = {float}
+
+
+def _make_key(args, kwargs):
+    """
+    Builds the cache key of a call. Positional-only calls use the argument
+    tuple itself (or its only int or str item), so nothing is allocated.
+    Keyword arguments are stored in a frozenset, so their order does not
+    matter.
+    """
+    if kwargs:
+        return (_KWARGS, args, frozenset(kwargs.items()))
+    if len(args) == 1 and type(args[0]) in _FAST_TYPES:
+        return args[0]
+    return args
+
+
+def content_key(*args, **kwargs):
+    """
+    Key function for cached that hashes the contents of the arguments, so
+    unhashable ones such as nested lists (matrices) or dicts can be cached.
+
+    Lists, tuples, dicts, sets and scalars are encoded recursively (dicts and
+    sets regardless of their order), bytes, bytearrays, memoryviews and
+    objects with ``tobytes()``, ``shape`` and ``dtype`` (arrays) by their raw
+    data, and other objects by their pickle.
+
+    Returns:
+        bytes: A 16-byte BLAKE2b digest of the arguments.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    _feed(digest, args)
+    _feed(digest, kwargs)
+    return digest.digest()
+
+
+def _feed(digest, value):
+    """
+    Adds an unambiguous encoding of a value to a digest.
+    """
+    kind = type(value)
+    if kind in _SCALAR_TYPES:
+        digest.update(f"{kind.__name__}:{value!r};".encode())
+    elif kind is list or kind is tuple:
+        types = set(map(type, value))
+        if types == _FLOAT:
+            # A vector or a matrix row: its raw doubles are the cheapest
+            # unambiguous encoding.
+            digest.update(f"{kind.__name__}:float{len(value)};".encode())
+            digest.update(array("d", value).tobytes())
+            return
+        if types <= _SCALAR_TYPES:
+            digest.update(f"{kind.__name__}:{value!r};".encode())
+            return
+        digest.update(f"{kind.__name__}[{len(value)};".encode())
+        for item in value:
+            _feed(digest, item)
+    elif kind is dict or kind is set or kind is frozenset:
+        items = value.items() if kind is dict else value
+        digest.update(f"{kind.__name__}{{{len(value)};".encode())
+        for item in sorted(content_key(item) for item in items):
+            digest.update(item)
+    elif kind is bytes or kind is bytearray:
+        digest.update(f"{kind.__name__}:{len(value)};".encode())
+        digest.update(value)
+    elif kind is memoryview:
+        digest.update(f"memoryview:{value.format}{value.shape};".encode())
+        digest.update(value.tobytes())
+    elif all(hasattr(value, name) for name in ("tobytes", "shape", "dtype")):
+        digest.update(f"{kind.__name__}:{value.dtype}{value.shape};".encode())
+        digest.update(value.tobytes())
+    else:
+        data = pickle.dumps(value)
+        digest.update(f"pickle:{len(data)};".encode())
+        digest.update(data)
+
+
+class _FIFOStore:
+    """
+    Entries in insertion order; the oldest one is evicted first.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+
+    def pop(self, key):
+        return self.entries.pop(key)
+
+    def evict(self):
+        return self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class _LRUStore(_FIFOStore):
+    """
+    Entries in recency order: a hit moves the entry to the end, so the least
+    recently used one is evicted first.
+    """
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+
+class _LFUStore:
+    """
+    Entries grouped by hit count. The least frequently used entry is evicted
+    first, the least recently used one among equally frequent entries. get,
+    put and pop are O(1), and so is evict while the least frequent bucket is
+    known. After pop() empties that bucket, the next evict() finds the new
+    minimum in O(number of distinct hit counts).
+    """
+
+    def __init__(self):
+        # Ordered by insertion, so that expired entries can be swept from
+        # the front in O(1) each.
+        self.entries = OrderedDict()
+        self.counts = {}
+        self.buckets = defaultdict(OrderedDict)
+        self.min_count = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            count = self._unlink(key)
+            self.counts[key] = count + 1
+            self.buckets[count + 1][key] = None
+            if self.min_count == count and count not in self.buckets:
+                self.min_count = count + 1
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.counts[key] = 1
+        self.buckets[1][key] = None
+        self.min_count = 1
+
+    def pop(self, key):
+        self._unlink(key)
+        del self.counts[key]
+        return self.entries.pop(key)
+
+    def evict(self):
+        if self.min_count not in self.buckets:
+            # The least frequent bucket was emptied by pop().
+            self.min_count = min(self.buckets)
+        key = next(iter(self.buckets[self.min_count]))
+        return key, self.pop(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.counts.clear()
+        self.buckets.clear()
+        self.min_count = 0
+
+    def _unlink(self, key):
+        count = self.counts[key]
+        bucket = self.buckets[count]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[count]
+        return count
+
+
+POLICIES = {"lru": _LRUStore, "lfu": _LFUStore, "fifo": _FIFOStore}
+
+
+class _Cache:
+    """
+    Bounded store of function results. An entry is a (value, expires, weight)
+    tuple; expired entries are dropped when they are looked up or evicted,
+    and swept from the front of the store (the oldest insertions for FIFO
+    and LFU, the least recently used for LRU) when a result is added.
+    """
+
+    def __init__(self, policy, max_size, ttl, max_weight, weigher, on_evict):
+        self.store = POLICIES[policy]()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_weight = float("inf") if max_weight is None else max_weight
+        self.weigher = weigher if max_weight is not None else None
+        self.on_evict = on_evict
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        entry = self.store.get(key)
+        if entry is None:
+            return _MISSING
+        if self.ttl is not None and entry[1] <= monotonic():
+            self.store.pop(key)
+            self._evicted(key, entry)
+            return _MISSING
+        return entry[0]
+
+    def put(self, key, value):
+        weight = 0
+        if self.weigher is not None:
+            weight = self.weigher(value)
+            if weight > self.max_weight:
+                return
+        expires = None
+        if self.ttl is not None:
+            now = monotonic()
+            expires = now + self.ttl
+            self._sweep(now)
+        if key in self.store.entries:
+            self.weight -= self.store.pop(key)[2]
+        # Evict before inserting, so that a new entry is not the LFU victim.
+        while len(self.store) and (
+            (self.max_size is not None and len(self.store) >= self.max_size)
+            or self.weight + weight > self.max_weight
+        ):
+            self._evicted(*self.store.evict())
+        self.store.put(key, (value, expires, weight))
+        self.weight += weight
+
+    def _sweep(self, now):
+        """
+        Drops the expired entries at the front of the store. Every entry is
+        swept at most once, so the cost is amortized O(1) per put.
+        """
+        entries = self.store.entries
+        while entries:
+            key = next(iter(entries))
+            entry = entries[key]
+            if entry[1] > now:
+                return
+            self.store.pop(key)
+            self._evicted(key, entry)
+
+    def invalidate(self, key):
+        if key not in self.store.entries:
+            return False
+        self.weight -= self.store.pop(key)[2]
+        return True
+
+    def clear(self):
+        self.store.clear()
+        self.weight = self.hits = self.misses = self.evictions = 0
+
+    def memory(self):
+        """
+        Returns the shallow size in bytes of the cached keys and results.
+        """
+        return sum(
+            sys.getsizeof(key) + sys.getsizeof(entry[0])
+            for key, entry in self.store.entries.items()
+        )
+
+    def _evicted(self, key, entry):
+        self.weight -= entry[2]
+        self.evictions += 1
+        if self.on_evict is not None:
+            self.on_evict(key, entry[0])
+
+
+class _CountingCache(_Cache):
+    """
+    A _Cache that counts hits and misses. It is a separate class, so that a
+    cache without statistics does not pay for them.
+    """
+
+    def get(self, key):
+        result = _Cache.get(self, key)
+        if result is _MISSING:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+
+class DiskCache:
+    """
+    Persistent second tier for cached: results stored in a SQLite database
+    file. Every process and thread that opens the same file shares it, so
+    results survive restarts and are computed once per deployment. A file on
+    a tmpfs such as /dev/shm makes it a shared-memory tier.
+
+    Results are stored per function under a digest of the call arguments
+    (see content_key). Errors of the database or of the serializer are
+    logged and treated as a miss, so the tier never fails a call.
+
+    Attributes:
+        path (str): Path of the database file.
+        serializer: Object with dumps() and loads() (pickle by default).
+    """
+
+    def __init__(self, path, serializer=pickle, timeout=30.0):
+        """
+        Initialize the tier and create the database if it does not exist.
+
+        Args:
+            path (str): Path of the database file.
+            serializer: Object with dumps(value) and loads(data), e.g. pickle
+                or json. Results that it cannot serialize are not stored.
+            timeout (float): Seconds to wait for a lock held by another
+                process.
+        """
+        self.path = os.fspath(path)
+        self.serializer = serializer
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key BLOB, "
+            "value BLOB, expires REAL, PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+
+    def _connect(self):
+        """
+        Returns the connection of the current thread. Connections are not
+        shared between threads or inherited by forked processes.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None
+            )
+            # Readers do not block the writer and a commit does not fsync.
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, namespace, key):
+        """
+        Returns the stored result, or _MISSING if there is none or it expired.
+        """
+        try:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT value FROM cache WHERE namespace = ? AND key = ? "
+                    "AND (expires IS NULL OR expires > ?)",
+                    (namespace, key, time.time()),
+                )
+                .fetchone()
+            )
+            return _MISSING if row is None else self.serializer.loads(row[0])
+        except Exception:
+            logger.exception("Cannot read a result from %s", self.path)
+            return _MISSING
+
+    def set(self, namespace, key, value, ttl=None):
+        """
+        Stores a result that expires after ``ttl`` seconds (never if None).
+        """
+        expires = time.time() + ttl if ttl is not None else None
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                (namespace, key, self.serializer.dumps(value), expires),
+            )
+        except Exception:
+            logger.exception("Cannot store a result in %s", self.path)
+
+    def delete(self, namespace, key):
+        """
+        Removes a stored result.
+        """
+        self._write(
+            "DELETE FROM cache WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+
+    def clear(self, namespace=None):
+        """
+        Removes the results of one function (of all functions if None).
+        """
+        if namespace is None:
+            self._write("DELETE FROM cache")
+        else:
+            self._write("DELETE FROM cache WHERE namespace = ?", (namespace,))
+
+    def purge(self):
+        """
+        Removes the expired results.
+        """
+        self._write("DELETE FROM cache WHERE expires <= ?", (time.time(),))
+
+    def _write(self, statement, parameters=()):
+        """
+        Executes a statement, logging database errors like get() and set().
+        """
+        try:
+            self._connect().execute(statement, parameters)
+        except Exception:
+            logger.exception("Cannot update %s", self.path)
+
+    def close(self):
+        """
+        Closes the connection of the current thread.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class _Shard:
+    """
+    One stripe of a thread-safe cache: a part of the entries, the lock that
+    guards them and the results being computed for missing keys.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.flights = {}
+
+
+def _split(total, parts, index):
+    """
+    Returns the share of a cache bound that belongs to one stripe.
+    """
+    if total is None:
+        return None
+    if isinstance(total, int):
+        return total // parts + (index < total % parts)
+    return total / parts
+
+
+def cached(
+    max_size=None,
+    policy="lru",
+    ttl=None,
+    max_weight=None,
+    weigher=sys.getsizeof,
+    thread_safe=False,
+    stripes=16,
+    key=None,
+    stats=False,
+    on_evict=None,
+    persist=None,
+):
     """
     Decorator for caching function results.
 
@@ -12,30 +485,249 @@ def cached(max_size=None):
 
     Args:
         max_size (int, optional):
-            Maximum size of the cache. If None, the cache is unlimited. If specified, the oldest items are removed when the cache size is exceeded.
+            Maximum number of cached results. If None, the number is unlimited.
+        policy (str):
+            Which entry is evicted when the cache is full: "lru" (least
+            recently used), "lfu" (least frequently used) or "fifo" (oldest).
+        ttl (float, optional):
+            Seconds after which a cached result expires. If None, results
+            never expire.
+        max_weight (float, optional):
+            Maximum total weight of the cached results, e.g. bytes. Results
+            heavier than this are not cached. If None, the weight is unlimited.
+        weigher (callable):
+            Function that returns the weight of a result (sys.getsizeof by
+            default). Only used if max_weight is set.
+        thread_safe (bool):
+            Whether the function is called from several threads. The cache is
+            then split into ``stripes`` parts, each with its own lock and an
+            equal share of max_size and max_weight (the policy applies per
+            part). Concurrent calls that miss on the same key are computed
+            once: the first caller runs the function, the others wait for its
+            result or error.
+        stripes (int):
+            Number of independently locked parts of a thread-safe cache (at
+            most max_size).
+        key (callable, optional):
+            Function called with the arguments of a call that returns its
+            hashable cache key. Use content_key to cache functions of lists or
+            dicts. By default the arguments themselves are the key.
+        stats (bool):
+            Whether to count hits and misses for cache_info(). Without it the
+            counters stay 0 and a call does no extra work.
+        on_evict (callable, optional):
+            Called with the key and the result of every entry removed by the
+            policy, a size bound or expiry (not by cache_clear() or
+            cache_invalidate()). In a thread-safe cache it runs under the
+            stripe lock, so it should be quick.
+        persist (DiskCache, optional):
+            Persistent second tier. Calls that miss in memory are looked up
+            there before the function is called, and computed results are
+            stored there (with the same ttl). Its keys are content_key
+            digests of the arguments (of the result of ``key`` if given),
+            namespaced by the module and qualified name of the function.
+
+    The decorated function has these methods:
+
+    - ``cache_info()``: CacheInfo(hits, misses, evictions, size, max_size,
+      memory), where memory is the shallow size of the entries in bytes.
+    - ``cache_clear()``: removes all results and resets the statistics.
+    - ``cache_invalidate(*args, **kwargs)``: removes the result of one call.
+
+    With ``persist`` the last two also remove the results from the tier, and
+    cache_invalidate() returns whether the result was cached in memory.
 
     Returns:
         Callable:
             Decorated function with caching support.
+
+    Raises:
+        ValueError: If the policy is unknown or stripes is less than 1.
     """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown cache policy: {policy!r}")
+    if stripes < 1:
+        raise ValueError("stripes must be at least 1")
+    if key is None:
+        make_key = _make_key
+    else:
+
+        def make_key(args, kwargs):
+            return key(*args, **kwargs)
+
+    def new_cache(count, index):
+        return (_CountingCache if stats else _Cache)(
+            policy,
+            _split(max_size, count, index),
+            ttl,
+            _split(max_weight, count, index),
+            weigher,
+            on_evict,
+        )
+
+    def disk_key(args, kwargs):
+        """
+        Returns the key of a call in the persistent tier, or None if the
+        arguments cannot be encoded (the call then bypasses the tier).
+        """
+        try:
+            if key is None:
+                return content_key(*args, **kwargs)
+            return content_key(key(*args, **kwargs))
+        except Exception:
+            logger.exception("Cannot build the persistent key of a call")
+            return None
 
     def decorator(func):
-        cache = OrderedDict()
+        load = func
+        namespace = f"{func.__module__}.{func.__qualname__}"
+        if persist is not None:
+            load = wraps(func)(_read_through(func, persist, namespace, disk_key, ttl))
+        if thread_safe:
+            count = stripes if max_size is None else max(1, min(stripes, max_size))
+            shards = [_Shard(new_cache(count, index)) for index in range(count)]
+            wrapper = _thread_safe(load, shards, make_key)
+        else:
+            cache = new_cache(1, 0)
+            shards = [_Shard(cache)]
 
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            key = (args, frozenset(kwargs.items()))
-            if key in cache:
-                return cache[key]
-            result = func(*args, **kwargs)
-            if max_size is not None:
-                if len(cache) >= max_size:
-                    cache.popitem(last=False)
-                cache[key] = result
-            else:
-                cache[key] = result
-            return result
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                cache_key = make_key(args, kwargs)
+                result = cache.get(cache_key)
+                if result is _MISSING:
+                    result = load(*args, **kwargs)
+                    cache.put(cache_key, result)
+                return result
 
+        _add_introspection(wrapper, shards, make_key, max_size)
+        if persist is not None:
+            _add_persistence(wrapper, persist, namespace, disk_key)
         return wrapper
 
     return decorator
+
+
+def _read_through(func, persist, namespace, disk_key, ttl):
+    """
+    Returns a function that looks a call up in the persistent tier and
+    calls ``func`` (and stores its result there) only if it is missing.
+    """
+
+    def load(*args, **kwargs):
+        stored_key = disk_key(args, kwargs)
+        if stored_key is None:
+            return func(*args, **kwargs)
+        result = persist.get(namespace, stored_key)
+        if result is _MISSING:
+            result = func(*args, **kwargs)
+            persist.set(namespace, stored_key, result, ttl)
+        return result
+
+    return load
+
+
+def _add_introspection(wrapper, shards, make_key, max_size):
+    """
+    Adds cache_info(), cache_clear() and cache_invalidate() to a wrapper.
+    """
+
+    def cache_info():
+        """
+        Returns the statistics of the cache as a CacheInfo. Hits and misses
+        are only counted if the cache was created with ``stats=True``;
+        evictions include expired results. ``memory`` is the shallow size in
+        bytes of the cached keys and results.
+        """
+        hits = misses = evictions = size = memory = 0
+        for shard in shards:
+            with shard.lock:
+                hits += shard.cache.hits
+                misses += shard.cache.misses
+                evictions += shard.cache.evictions
+                size += len(shard.cache.store)
+                memory += shard.cache.memory()
+        return CacheInfo(hits, misses, evictions, size, max_size, memory)
+
+    def cache_clear():
+        """
+        Removes all cached results and resets the statistics.
+        """
+        for shard in shards:
+            with shard.lock:
+                shard.cache.clear()
+
+    def cache_invalidate(*args, **kwargs):
+        """
+        Removes the cached result of a call with these arguments.
+
+        Returns:
+            bool: Whether a result was cached.
+        """
+        cache_key = make_key(args, kwargs)
+        shard = shards[hash(cache_key) % len(shards)]
+        with shard.lock:
+            return shard.cache.invalidate(cache_key)
+
+    wrapper.cache_info = cache_info
+    wrapper.cache_clear = cache_clear
+    wrapper.cache_invalidate = cache_invalidate
+
+
+def _add_persistence(wrapper, persist, namespace, disk_key):
+    """
+    Makes cache_clear() and cache_invalidate() also remove the results of the
+    function from the persistent tier.
+    """
+    clear_memory = wrapper.cache_clear
+    invalidate_memory = wrapper.cache_invalidate
+
+    @wraps(clear_memory)
+    def cache_clear():
+        clear_memory()
+        persist.clear(namespace)
+
+    @wraps(invalidate_memory)
+    def cache_invalidate(*args, **kwargs):
+        stored_key = disk_key(args, kwargs)
+        if stored_key is not None:
+            persist.delete(namespace, stored_key)
+        return invalidate_memory(*args, **kwargs)
+
+    wrapper.cache_clear = cache_clear
+    wrapper.cache_invalidate = cache_invalidate
+
+
+def _thread_safe(func, shards, make_key):
+    """
+    Wraps a function with a striped cache and single-flight misses.
+    """
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        cache_key = make_key(args, kwargs)
+        shard = shards[hash(cache_key) % len(shards)]
+        with shard.lock:
+            result = shard.cache.get(cache_key)
+            if result is not _MISSING:
+                return result
+            flight = shard.flights.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = shard.flights[cache_key] = ResultWrapper()
+        if not leader:
+            return flight.result()
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as e:
+            with shard.lock:
+                del shard.flights[cache_key]
+            flight.set_error(e)
+            raise
+        with shard.lock:
+            shard.cache.put(cache_key, result)
+            del shard.flights[cache_key]
+        flight.set_result(result)
+        return result
+
+    return wrapper
@@ -0,0 +1,113 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Union, cast
+
+from project.thread_pool.thread_pool import ThreadPool
+
+
+class AsyncPool:
+    """
+    An asyncio front end that runs coroutines and sync callables with
+    bounded concurrency. Sync callables are executed by a ThreadPool and
+    awaited through the awaitable ResultWrapper, so no thread is blocked
+    per pending result.
+
+    Attributes:
+        max_concurrency (int): Maximum number of tasks running at a time.
+        pool (ThreadPool): Pool that executes the sync callables.
+    """
+
+    def __init__(self, max_concurrency: int, pool: Optional[Any] = None) -> None:
+        """
+        Initialize the pool.
+
+        Args:
+            max_concurrency (int): Maximum number of tasks running at a time.
+            pool (Optional[ThreadPool]): Pool for the sync callables (any pool
+                with the enqueue contract). A ThreadPool with
+                ``max_concurrency`` threads is created and owned if None.
+
+        Raises:
+            ValueError: If max_concurrency is less than 1.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self._owns_pool = pool is None
+        self.pool = ThreadPool(max_concurrency) if pool is None else pool
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def submit(
+        self, task: Union[Callable, Awaitable], *args: Any, **kwargs: Any
+    ) -> Any:
+        """
+        Run a task once a concurrency slot is free and return its result.
+
+        Args:
+            task (Union[Callable, Awaitable]): A coroutine, a coroutine
+                function or a sync callable (executed by the pool).
+            *args: Positional arguments for the task function.
+            **kwargs: Keyword arguments for the task function.
+
+        Returns:
+            Any: The result of the task.
+
+        Raises:
+            Exception: If an error occurred during task execution.
+        """
+        if self._semaphore is None:
+            # Created here so that it belongs to the running event loop.
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            if asyncio.iscoroutine(task):
+                return await task
+            function = cast(Callable, task)
+            if asyncio.iscoroutinefunction(function):
+                return await function(*args, **kwargs)
+            return await self.pool.enqueue(function, *args, **kwargs)
+
+    def spawn(
+        self, task: Union[Callable, Awaitable], *args: Any, **kwargs: Any
+    ) -> "asyncio.Task[Any]":
+        """
+        Schedule submit() as an asyncio task without waiting for it.
+
+        Returns:
+            asyncio.Task: The scheduled task.
+        """
+        return asyncio.ensure_future(self.submit(task, *args, **kwargs))
+
+    async def map(self, task: Callable, iterable: Iterable[Any]) -> List[Any]:
+        """
+        Apply a task to every item with bounded concurrency.
+
+        Returns:
+            List[Any]: The results in the order of the items.
+
+        Raises:
+            Exception: The first error raised by the task.
+        """
+        tasks = [self.spawn(task, item) for item in iterable]
+        return list(await asyncio.gather(*tasks))
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Dispose the thread pool if it was created by this AsyncPool.
+
+        Args:
+            wait (bool): Whether to wait for all threads to finish.
+        """
+        if self._owns_pool:
+            self.pool.dispose(wait)
+
+    async def __aenter__(self) -> "AsyncPool":
+        return self
+
+    async def aclose(self) -> None:
+        """
+        Like close(), but waits for the threads in an executor, so the event
+        loop keeps running while the last sync tasks finish.
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
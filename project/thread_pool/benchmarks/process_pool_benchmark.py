@@ -0,0 +1,70 @@
+"""
+CPU-bound throughput of ProcessPool against ThreadPool (prime counting and
+matrix_multiplication), and the cost of handing a large argument to a worker
+through the pipe versus shared memory. Run from the repository root:
+
+    python -m project.thread_pool.benchmarks.process_pool_benchmark [workers]
+"""
+
+import sys
+import time
+from array import array
+
+from project.thread_pool.process_pool import ProcessPool
+from project.thread_pool.thread_pool import ThreadPool
+from project.vector_and_matrix.matrix import matrix_multiplication
+
+TASKS = 16
+
+
+def count_primes(lo, hi):
+    return sum(
+        all(n % d for d in range(2, int(n**0.5) + 1)) for n in range(max(lo, 2), hi)
+    )
+
+
+def total(values):
+    return len(values)
+
+
+def elapsed(pool, task, *args):
+    """
+    Returns the wall time of TASKS copies of the task.
+    """
+    start = time.perf_counter()
+    results = [pool.enqueue(task, *args) for _ in range(TASKS)]
+    for result in results:
+        result.result()
+    return time.perf_counter() - start
+
+
+def main(workers=4):
+    matrix = [[float(i * j % 7) for j in range(60)] for i in range(60)]
+    workloads = [
+        ("primes", count_primes, (0, 30_000)),
+        ("matmul 60x60", matrix_multiplication, (matrix, matrix)),
+    ]
+    print(f"workers = {workers}, tasks = {TASKS}")
+    print(f"{'':<16}{'ThreadPool, s':>16}{'ProcessPool, s':>16}")
+    threads = ThreadPool(workers)
+    processes = ProcessPool(workers)
+    for label, task, args in workloads:
+        old = elapsed(threads, task, *args)
+        new = elapsed(processes, task, *args)
+        print(f"{label:<16}{old:>16.3f}{new:>16.3f} ({old / new:.1f}x)")
+    threads.dispose()
+    processes.dispose()
+
+    values = array("d", range(1_000_000))
+    print(f"\n{'':<16}{'pipe, s':>16}{'shared, s':>16}")
+    piped = ProcessPool(workers, shm_threshold=sys.maxsize)
+    shared = ProcessPool(workers)
+    old = elapsed(piped, total, values)
+    new = elapsed(shared, total, values)
+    print(f"{'array 1M floats':<16}{old:>16.3f}{new:>16.3f} ({old / new:.1f}x)")
+    piped.dispose()
+    shared.dispose()
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,207 @@
+"""
+Latency and throughput of ThreadPool against the original polling pool, which
+ran every task under the queue lock. Workloads: empty tasks (dispatch
+overhead), sleeping tasks (I/O-bound) and hashing large buffers (hashlib
+releases the GIL). The fan-out workload compares the shared queue with
+work-stealing mode on recursively spawned tasks, and the map workload compares
+one enqueue per item with chunked map(). The last table shows the cost of
+the built-in statistics. Run from the repository root:
+
+    python -m project.thread_pool.benchmarks.thread_pool_benchmark [threads]
+"""
+
+import hashlib
+import statistics
+import sys
+import threading
+import time
+
+from project.thread_pool.thread_pool import ResultWrapper, ThreadPool
+
+PAYLOAD = bytes(1 << 20)
+
+
+class PollingThreadPool:
+    """
+    The original implementation (the baseline): tasks run while the worker
+    holds the lock, idle workers poll every 100 ms and dequeue with pop(0).
+    """
+
+    def __init__(self, num_threads):
+        self.tasks = []
+        self.lock = threading.Lock()
+        self.stop_signal = threading.Event()
+        self.threads = [
+            threading.Thread(target=self.worker) for _ in range(num_threads)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def worker(self):
+        while not self.stop_signal.is_set():
+            flag = False
+            with self.lock:
+                if self.tasks:
+                    flag = True
+                    task = self.tasks.pop(0)
+                    try:
+                        task[3].set_result(task[0](*task[1], **task[2]))
+                    except Exception as e:
+                        task[3].set_error(e)
+            if not flag:
+                threading.Event().wait(0.1)
+
+    def enqueue(self, task, *args, **kwargs):
+        result_wrapper = ResultWrapper()
+        with self.lock:
+            self.tasks.append((task, args, kwargs, result_wrapper))
+        return result_wrapper
+
+    def dispose(self, wait=True):
+        self.stop_signal.set()
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+
+def noop():
+    pass
+
+
+def io_task():
+    time.sleep(0.005)
+
+
+def hash_task():
+    return hashlib.sha256(PAYLOAD).digest()
+
+
+def latency(pool, rounds=20):
+    """
+    Returns the median submit-to-result time of one task on an idle pool.
+    """
+    samples = []
+    for _ in range(rounds):
+        time.sleep(0.01)  # let the workers go idle
+        start = time.perf_counter()
+        pool.enqueue(noop).result()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def throughput(pool, task, count):
+    """
+    Returns tasks per second for ``count`` tasks submitted at once.
+    """
+    start = time.perf_counter()
+    results = [pool.enqueue(task) for _ in range(count)]
+    for result in results:
+        result.result()
+    return count / (time.perf_counter() - start)
+
+
+def fan_out(pool, size=1 << 16, grain=16):
+    """
+    Returns tasks per second for a recursive range split: every task above
+    ``grain`` items enqueues its two halves from inside the pool.
+    """
+    lock = threading.Lock()
+    done = threading.Event()
+    pending = [1]
+
+    def split(lo, hi):
+        if hi - lo > grain:
+            mid = (lo + hi) // 2
+            with lock:
+                pending[0] += 1
+            pool.enqueue(split, lo, mid)
+            pool.enqueue(split, mid, hi)
+            return
+        sum(range(lo, hi))
+        with lock:
+            pending[0] -= 1
+            if not pending[0]:
+                done.set()
+
+    start = time.perf_counter()
+    pool.enqueue(split, 0, size)
+    done.wait()
+    return (2 * size // grain - 1) / (time.perf_counter() - start)
+
+
+def square(x):
+    return x * x
+
+
+def map_items(pool, count=200_000, chunksize=None):
+    """
+    Returns items per second for ``count`` tiny tasks, submitted one by one
+    (chunksize None) or through map().
+    """
+    start = time.perf_counter()
+    if chunksize is None:
+        results = [pool.enqueue(square, i) for i in range(count)]
+        for result in results:
+            result.result()
+    else:
+        pool.map(square, range(count), chunksize)
+    return count / (time.perf_counter() - start)
+
+
+def main(num_threads=8):
+    workloads = [
+        ("empty", noop, 20_000),
+        ("sleep 5 ms", io_task, 400),
+        ("sha256 1 MiB", hash_task, 200),
+    ]
+    print(f"threads = {num_threads}")
+    print(f"{'':<16}{'polling':>16}{'ThreadPool':>16}")
+    rows = {}
+    for name, pool_class in (("polling", PollingThreadPool), ("new", ThreadPool)):
+        pool = pool_class(num_threads)
+        rows.setdefault("latency", []).append(latency(pool) * 1e3)
+        for label, task, count in workloads:
+            rows.setdefault(label, []).append(throughput(pool, task, count))
+        pool.dispose()
+    old, new = rows.pop("latency")
+    print(f"{'latency, ms':<16}{old:>16.3f}{new:>16.3f}")
+    for label, (old, new) in rows.items():
+        print(f"{label + ', 1/s':<16}{old:>16,.0f}{new:>16,.0f} ({new / old:.1f}x)")
+
+    print(f"\n{'':<16}{'shared queue':>16}{'work stealing':>16}")
+    rates = []
+    for work_stealing in (False, True):
+        pool = ThreadPool(num_threads, work_stealing=work_stealing)
+        rates.append(fan_out(pool))
+        pool.dispose()
+    shared, stealing = rates
+    print(
+        f"{'fan-out, 1/s':<16}{shared:>16,.0f}{stealing:>16,.0f}"
+        f" ({stealing / shared:.1f}x)"
+    )
+
+    pool = ThreadPool(num_threads)
+    single = map_items(pool)
+    print(f"\n{'enqueue, 1/s':<24}{single:>14,.0f}")
+    for chunksize in (1, 16, 256):
+        rate = map_items(pool, chunksize=chunksize)
+        label = f"map chunksize={chunksize}"
+        print(f"{label + ', 1/s':<24}{rate:>14,.0f} ({rate / single:.1f}x)")
+    pool.dispose()
+
+    print(f"\n{'':<16}{'no metrics':>16}{'metrics':>16}")
+    for label, measure in (
+        ("empty, 1/s", lambda pool: throughput(pool, noop, 20_000)),
+        ("sleep 5 ms, 1/s", lambda pool: throughput(pool, io_task, 400)),
+    ):
+        rates = []
+        for metrics in (False, True):
+            pool = ThreadPool(num_threads, metrics=metrics)
+            rates.append(max(measure(pool) for _ in range(3)))
+            pool.dispose()
+        off, on = rates
+        print(f"{label:<16}{off:>16,.0f}{on:>16,.0f} ({on / off - 1:+.1%})")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,233 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from project.thread_pool.thread_pool import ResultWrapper, ThreadPool
+
+
+class TaskGraph:
+    """
+    A dependency graph of tasks executed on a ThreadPool.
+
+    Every task receives the results of its dependencies as positional
+    arguments (in the order they were declared) and is submitted as soon as
+    the last of them completes, so independent branches overlap. Results are
+    passed by reference, without copying.
+
+    Attributes:
+        tasks (dict): The task function and dependencies by task name.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initialize an empty graph.
+        """
+        self.tasks: Dict[Hashable, Tuple[Callable, Tuple[Hashable, ...]]] = {}
+
+    def add(
+        self, name: Hashable, task: Callable, deps: Iterable[Hashable] = ()
+    ) -> None:
+        """
+        Add a task to the graph.
+
+        Args:
+            name (Hashable): Unique name of the task.
+            task (Callable): Function called with the results of ``deps``.
+            deps (Iterable[Hashable]): Names of the tasks it depends on (they
+                may be added later).
+
+        Raises:
+            ValueError: If a task with this name already exists.
+        """
+        if name in self.tasks:
+            raise ValueError(f"Task {name!r} is already in the graph")
+        self.tasks[name] = (task, tuple(deps))
+
+    def order(self) -> List[Hashable]:
+        """
+        Return the task names in a topological order.
+
+        Raises:
+            ValueError: If a dependency is unknown or the graph has a cycle.
+        """
+        waiting = {}
+        dependents: Dict[Hashable, List[Hashable]] = {name: [] for name in self.tasks}
+        for name, (_, deps) in self.tasks.items():
+            for dep in deps:
+                if dep not in self.tasks:
+                    raise ValueError(f"Task {name!r} depends on unknown {dep!r}")
+                dependents[dep].append(name)
+            waiting[name] = len(deps)
+        order = [name for name, count in waiting.items() if not count]
+        for name in order:
+            for dependent in dependents[name]:
+                waiting[dependent] -= 1
+                if not waiting[dependent]:
+                    order.append(dependent)
+        if len(order) != len(self.tasks):
+            raise ValueError("The task graph has a cycle")
+        return order
+
+    def run(self, pool: ThreadPool, timeout: Optional[float] = None) -> "GraphRun":
+        """
+        Execute the graph on a pool and wait for it to finish.
+
+        Args:
+            pool (ThreadPool): The pool that runs the tasks.
+            timeout (Optional[float]): Maximum time to wait.
+
+        Returns:
+            GraphRun: Results and timings of the tasks.
+
+        Raises:
+            ValueError: If the graph is invalid.
+            TimeoutError: If the graph does not finish within the timeout.
+            Exception: The first error raised by a task; the tasks that
+                depend on it are not run.
+        """
+        graph_run = GraphRun(self, self.order(), pool)
+        graph_run.start()
+        if not graph_run.finished.wait(timeout):
+            raise TimeoutError("The task graph did not finish within the timeout")
+        if graph_run.errors:
+            raise next(iter(graph_run.errors.values()))
+        return graph_run
+
+
+class GraphRun:
+    """
+    State and outcome of one execution of a TaskGraph.
+
+    Attributes:
+        results (dict): Result of every completed task.
+        errors (dict): Error of every failed task (in the order they failed).
+        timings (dict): (start, end) ``perf_counter()`` values of every task.
+        started (float): ``perf_counter()`` value when the run started.
+        ended (float): ``perf_counter()`` value when the last task settled.
+        finished (threading.Event): Set when every task has completed,
+            failed or been skipped because a dependency failed.
+    """
+
+    def __init__(
+        self, graph: TaskGraph, order: List[Hashable], pool: ThreadPool
+    ) -> None:
+        self._graph = graph
+        self._order = order
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._waiting = {name: len(graph.tasks[name][1]) for name in order}
+        self._dependents: Dict[Hashable, List[Hashable]] = {name: [] for name in order}
+        for name in order:
+            for dep in graph.tasks[name][1]:
+                self._dependents[dep].append(name)
+        self._skipped: set = set()
+        self._settled = 0
+        self.results: Dict[Hashable, Any] = {}
+        self.errors: Dict[Hashable, Exception] = {}
+        self.timings: Dict[Hashable, Tuple[float, float]] = {}
+        self.started = time.perf_counter()
+        self.ended = self.started
+        self.finished = threading.Event()
+
+    def start(self) -> None:
+        """
+        Submits the tasks without dependencies.
+        """
+        if not self._order:
+            self.finished.set()
+        for name in self._order:
+            if not self._waiting[name]:
+                self._submit(name)
+
+    def _submit(self, name: Hashable) -> None:
+        result_wrapper = self._pool.enqueue(self._call, name)
+        result_wrapper.add_done_callback(lambda done: self._settle(name, done))
+
+    def _call(self, name: Hashable) -> Any:
+        """
+        Runs a task with the results of its dependencies (in a worker).
+        """
+        task, deps = self._graph.tasks[name]
+        start = time.perf_counter()
+        try:
+            return task(*[self.results[dep] for dep in deps])
+        finally:
+            self.timings[name] = (start, time.perf_counter())
+
+    def _settle(self, name: Hashable, result_wrapper: ResultWrapper) -> None:
+        """
+        Records the outcome of a task and submits the dependents that are
+        ready (or skips them if the task failed).
+        """
+        ready = []
+        with self._lock:
+            try:
+                self.results[name] = result_wrapper.result()
+            except Exception as e:
+                self.errors[name] = e
+                self._settled += 1 + self._skip_dependents(name)
+            else:
+                self._settled += 1
+                for dependent in self._dependents[name]:
+                    self._waiting[dependent] -= 1
+                    if not self._waiting[dependent] and dependent not in self._skipped:
+                        ready.append(dependent)
+            if self._settled == len(self._order):
+                self.ended = time.perf_counter()
+                self.finished.set()
+        for dependent in ready:
+            self._submit(dependent)
+
+    def _skip_dependents(self, name: Hashable) -> int:
+        """
+        Marks all tasks that depend on a failed one as skipped.
+
+        Returns:
+            int: The number of newly skipped tasks.
+        """
+        stack = list(self._dependents[name])
+        count = 0
+        while stack:
+            dependent = stack.pop()
+            if dependent not in self._skipped:
+                self._skipped.add(dependent)
+                count += 1
+                stack.extend(self._dependents[dependent])
+        return count
+
+    @property
+    def wall_time(self) -> float:
+        """
+        Time from the start of the run until the last task settled.
+        """
+        return self.ended - self.started
+
+    def critical_path(self) -> Tuple[List[Hashable], float]:
+        """
+        Return the chain of dependent tasks with the largest total run time,
+        which bounds the wall time of the graph however many threads run it.
+
+        Returns:
+            Tuple[List[Hashable], float]: The task names along the path and
+                the sum of their run times in seconds.
+        """
+        best: Dict[Hashable, Tuple[float, Optional[Hashable]]] = {}
+        for name in self._order:
+            if name not in self.timings:
+                continue
+            start, end = self.timings[name]
+            length, previous = 0.0, None
+            for dep in self._graph.tasks[name][1]:
+                if best[dep][0] > length:
+                    length, previous = best[dep][0], dep
+            best[name] = (length + end - start, previous)
+        if not best:
+            return [], 0.0
+        last = max(best, key=lambda name: best[name][0])
+        total = best[last][0]
+        path = []
+        node: Optional[Hashable] = last
+        while node is not None:
+            path.append(node)
+            node = best[node][1]
+        return path[::-1], total
@@ -0,0 +1,191 @@
+import time
+from typing import Any, Dict, List, Optional
+
+# Every power of two of microseconds is split into four linear buckets,
+# so a percentile is reported with at most 25% relative error. Bucket
+# indexes come from int.bit_length(), which is much cheaper than a log.
+_BUCKETS = 4 * 40
+
+
+class LatencyHistogram:
+    """
+    Log-scale histogram of durations in seconds.
+
+    Attributes:
+        counts (list): Number of samples per bucket.
+        count (int): Total number of samples.
+        total (float): Sum of the samples.
+        max (float): Largest sample.
+    """
+
+    def __init__(self) -> None:
+        self.counts = [0] * _BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        """
+        Records a duration.
+        """
+        self.counts[_bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        """
+        Adds the samples of another histogram.
+        """
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, p: float) -> float:
+        """
+        Returns the upper bound of the bucket holding the p-th percentile
+        (0 if there are no samples).
+        """
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(_upper_bound(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Returns the count, mean, p50, p90, p99 and max in seconds.
+        """
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+def _bucket(seconds: float) -> int:
+    """
+    Returns the histogram bucket of a duration.
+    """
+    micros = int(seconds * 4e6)  # quarters of a microsecond
+    bits = micros.bit_length()
+    if bits <= 3:
+        return micros
+    index = 4 * (bits - 2) + ((micros >> (bits - 3)) & 3)
+    return index if index < _BUCKETS else _BUCKETS - 1
+
+
+def _upper_bound(index: int) -> float:
+    """
+    Returns the largest duration in seconds that falls into a bucket.
+    """
+    if index < 8:
+        return (index + 1) / 4e6
+    bits = index // 4 + 2
+    return ((4 + index % 4 + 1) << (bits - 3)) / 4e6
+
+
+class WorkerStats:
+    """
+    Counters of one worker thread. Only the worker updates them, so no lock
+    is needed; readers may see a snapshot that is one task behind.
+
+    Attributes:
+        name (str): Name of the worker thread.
+        started (float): perf_counter() value when the worker started.
+        busy (float): Total time spent running tasks.
+        completed (int): Number of tasks that returned a result.
+        failed (int): Number of tasks that raised or expired.
+        wait_time (LatencyHistogram): Time from enqueue to start.
+        run_time (LatencyHistogram): Time spent running.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.started = time.perf_counter()
+        self.busy = 0.0
+        self.completed = 0
+        self.failed = 0
+        self.wait_time = LatencyHistogram()
+        self.run_time = LatencyHistogram()
+
+    def record(self, wait_time: float, run_time: float, failed: bool) -> None:
+        """
+        Records one executed task.
+        """
+        self.wait_time.add(wait_time)
+        self.run_time.add(run_time)
+        self.busy += run_time
+        if failed:
+            self.failed += 1
+        else:
+            self.completed += 1
+
+    def merge(self, other: "WorkerStats") -> None:
+        """
+        Adds the counters and histograms of another worker.
+        """
+        self.busy += other.busy
+        self.completed += other.completed
+        self.failed += other.failed
+        self.wait_time.merge(other.wait_time)
+        self.run_time.merge(other.run_time)
+
+    def busy_ratio(self) -> float:
+        """
+        Returns the fraction of the worker's lifetime spent running tasks.
+        """
+        lifetime = time.perf_counter() - self.started
+        return self.busy / lifetime if lifetime > 0 else 0.0
+
+
+class TaskHooks:
+    """
+    Base class for instrumentation hooks of a ThreadPool. Override the
+    methods you need; they are called in the worker thread, so they should
+    be cheap. Exceptions raised by hooks are logged and ignored.
+    """
+
+    def task_started(self, wait_time: float) -> None:
+        """
+        Called before a task runs with the time it spent in the queue.
+        """
+
+    def task_finished(self, run_time: float, error: Optional[Exception]) -> None:
+        """
+        Called after a task ran with its run time and error (or None).
+        """
+
+
+def merge_stats(workers: List[WorkerStats], retired: WorkerStats) -> Dict[str, Any]:
+    """
+    Returns the pool-wide counters and histograms of the workers.
+    """
+    total = WorkerStats("total")
+    total.merge(retired)
+    for stats in workers:
+        total.merge(stats)
+    return {
+        "completed": total.completed,
+        "failed": total.failed,
+        "wait_time": total.wait_time.summary(),
+        "run_time": total.run_time.summary(),
+        "workers": [
+            {
+                "name": stats.name,
+                "tasks": stats.completed + stats.failed,
+                "busy_ratio": stats.busy_ratio(),
+            }
+            for stats in workers
+        ],
+    }
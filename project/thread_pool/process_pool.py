@@ -0,0 +1,402 @@
+import itertools
+import multiprocessing
+import pickle
+import threading
+from array import array
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, List, Optional, Tuple, cast
+
+from project.thread_pool.thread_pool import ResultWrapper
+
+_EXIT = -1
+
+
+class _SharedArg:
+    """
+    Handle of a large buffer argument copied into a shared memory block. Only
+    the handle is pickled; the worker rebuilds the argument from the block.
+
+    Attributes:
+        name (str): Name of the shared memory block.
+        kind (type): Type of the argument: bytes, bytearray or array.
+        typecode (str): Array typecode of the items.
+        nbytes (int): Size of the argument in bytes.
+    """
+
+    def __init__(self, name: str, kind: type, typecode: str, nbytes: int) -> None:
+        self.name = name
+        self.kind = kind
+        self.typecode = typecode
+        self.nbytes = nbytes
+
+    def load(self) -> Any:
+        """
+        Rebuilds the argument from the shared memory block.
+        """
+        block = shared_memory.SharedMemory(self.name)
+        buf = cast(memoryview, block.buf)  # only None after close()
+        try:
+            with buf[: self.nbytes] as view:
+                if self.kind is array:
+                    value = array(self.typecode)
+                    value.frombytes(view)
+                else:
+                    value = self.kind(view)
+        finally:
+            block.close()
+        return value
+
+
+def _share(value: Any, threshold: int, blocks: List[shared_memory.SharedMemory]) -> Any:
+    """
+    Moves a large bytes, bytearray or array.array argument to shared memory
+    and returns its handle. Other arguments are returned unchanged.
+    """
+    kind = type(value)
+    if kind not in (bytes, bytearray, array):
+        return value
+    view = memoryview(value).cast("B")
+    if view.nbytes < threshold or not view.nbytes:
+        return value
+    block = shared_memory.SharedMemory(create=True, size=view.nbytes)
+    blocks.append(block)
+    cast(memoryview, block.buf)[: view.nbytes] = view
+    typecode = value.typecode if kind is array else "B"
+    return _SharedArg(block.name, kind, typecode, view.nbytes)
+
+
+def _load(value: Any) -> Any:
+    return value.load() if isinstance(value, _SharedArg) else value
+
+
+def _dump_error(error: BaseException) -> bytes:
+    """
+    Pickles an exception, replacing it with a RuntimeError if it cannot be
+    transported back to the parent.
+    """
+    try:
+        data = pickle.dumps(error)
+        pickle.loads(data)
+    except Exception:
+        data = pickle.dumps(RuntimeError(f"{type(error).__name__}: {error}"))
+    return data
+
+
+def _worker(
+    tasks: Any,
+    results: Any,
+    stop: Any,
+    worker_id: int,
+    max_tasks: Optional[int],
+    current: Any,
+) -> None:
+    """
+    Worker process loop: runs tasks until a stop signal is received or
+    ``max_tasks`` tasks are done, then reports its exit. The id of the
+    running task is kept in ``current`` (-1 while the worker is using the
+    queues), so that the parent knows what a dead worker was doing.
+    """
+    done = 0
+    recycled = True
+    while max_tasks is None or done < max_tasks:
+        message = tasks.get()
+        if message is None or stop.is_set():
+            recycled = False
+            break
+        task_id, data = message
+        current.value = task_id
+        try:
+            task, args, kwargs = pickle.loads(data)
+            args = [_load(arg) for arg in args]
+            kwargs = {key: _load(value) for key, value in kwargs.items()}
+            reply = (task_id, True, pickle.dumps(task(*args, **kwargs)))
+        except Exception as e:
+            reply = (task_id, False, _dump_error(e))
+        current.value = -1
+        results.put(reply)
+        done += 1
+    results.put((_EXIT, worker_id, recycled))
+
+
+class ProcessPool:
+    """
+    A process pool with the same contract as ThreadPool, so CPU-bound tasks
+    are not serialized by the GIL.
+
+    Tasks and their arguments are pickled in the parent; large bytes,
+    bytearray and array.array arguments are handed over through shared memory
+    instead of the pipe. A worker process is replaced
+    after ``max_tasks_per_child`` tasks to contain memory growth, or when it
+    dies in a task, which then raises BrokenProcessPool. A worker that dies
+    outside a task breaks the pool: all pending and later tasks raise
+    BrokenProcessPool.
+
+    Attributes:
+        num_processes (int): Number of worker processes in the pool.
+        max_tasks_per_child (Optional[int]): Tasks after which a worker is
+            replaced by a fresh process (None means never).
+        shm_threshold (int): Minimum argument size in bytes for shared memory.
+        processes (dict): Live worker processes by worker id.
+        stop_signal (multiprocessing.Event): Event to signal workers to stop.
+    """
+
+    def __init__(
+        self,
+        num_processes: int,
+        max_tasks_per_child: Optional[int] = None,
+        shm_threshold: int = 1 << 20,
+        mp_context: Optional[Any] = None,
+    ) -> None:
+        """
+        Initialize the process pool.
+
+        Args:
+            num_processes (int): Number of processes to create in the pool.
+            max_tasks_per_child (Optional[int]): Tasks after which a worker is
+                replaced by a fresh process.
+            shm_threshold (int): Minimum argument size in bytes for shared memory.
+            mp_context: multiprocessing context (the default one if None).
+
+        Raises:
+            ValueError: If max_tasks_per_child is less than 1.
+        """
+        if max_tasks_per_child is not None and max_tasks_per_child < 1:
+            raise ValueError("max_tasks_per_child must be at least 1")
+        self._context = mp_context or multiprocessing.get_context()
+        self.num_processes = num_processes
+        self.max_tasks_per_child = max_tasks_per_child
+        self.shm_threshold = shm_threshold
+        self.stop_signal = self._context.Event()
+        self.processes: Dict[int, Any] = {}
+        self._current: Dict[int, Any] = {}
+        self._tasks = self._context.SimpleQueue()
+        self._results = self._context.SimpleQueue()
+        self._pending: Dict[
+            int, Tuple[ResultWrapper, List[shared_memory.SharedMemory]]
+        ] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._worker_ids = itertools.count()
+        self._stopping = False
+        self._draining = False
+        self._broken: Optional[BrokenProcessPool] = None
+
+        # Workers that attach to a block register it with the resource
+        # tracker; sharing the parent's tracker keeps that registration
+        # balanced by the parent's unlink.
+        resource_tracker.ensure_running()
+        with self._lock:
+            for _ in range(num_processes):
+                self._spawn()
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def _spawn(self) -> None:
+        """
+        Starts a worker process (called with the lock held).
+        """
+        worker_id = next(self._worker_ids)
+        current = self._context.Value("q", -1, lock=False)
+        process = self._context.Process(
+            target=_worker,
+            args=(
+                self._tasks,
+                self._results,
+                self.stop_signal,
+                worker_id,
+                self.max_tasks_per_child,
+                current,
+            ),
+            daemon=True,
+        )
+        process.start()
+        self.processes[worker_id] = process
+        self._current[worker_id] = current
+
+    def _collect(self) -> None:
+        """
+        Parent thread that resolves ResultWrappers from the workers' replies
+        and replaces workers that exited after ``max_tasks_per_child`` tasks
+        or died. Once every worker has stopped, it cancels the tasks that were
+        never run.
+        """
+        # The pipe end behind the results queue, as concurrent.futures does.
+        reader = self._results._reader  # type: ignore[union-attr]
+        while True:
+            with self._lock:
+                sentinels = {
+                    process.sentinel: worker_id
+                    for worker_id, process in self.processes.items()
+                }
+            ready = wait([reader, *sentinels])
+            if reader in ready:
+                # Replies and exit messages are handled first: a worker that
+                # exited normally has already sent them.
+                if self._handle(*self._results.get()):
+                    break
+                continue
+            if any(self._lost(sentinels[sentinel]) for sentinel in ready):
+                break
+        # Whether or not dispose() waits for this thread, the tasks left in
+        # the queue will never run.
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+        for result_wrapper, blocks in pending:
+            _release(blocks)
+            result_wrapper.cancel()
+
+    def _handle(self, task_id: int, ok: Any, data: Any) -> bool:
+        """
+        Handles a reply or an exit message of a worker.
+
+        Returns:
+            bool: Whether the pool has stopped and the collector must exit.
+        """
+        if task_id == _EXIT:
+            with self._lock:
+                self.processes.pop(ok).join()
+                del self._current[ok]
+                return self._replace(data)
+        with self._lock:
+            result_wrapper, blocks = self._pending.pop(task_id)
+        _release(blocks)
+        try:
+            value = pickle.loads(data)
+        except Exception as e:
+            result_wrapper.set_error(e)
+            return False
+        if ok:
+            result_wrapper.set_result(value)
+        else:
+            result_wrapper.set_error(value)
+        return False
+
+    def _lost(self, worker_id: int) -> bool:
+        """
+        Handles a worker process that died. If it died in a task, the task
+        fails and the worker is replaced. Otherwise it may have died holding
+        a lock of the queues, so the pool is broken: every pending task fails
+        and the other workers are terminated, as in concurrent.futures.
+
+        Returns:
+            bool: Whether the pool has stopped and the collector must exit.
+        """
+        with self._lock:
+            process = self.processes.pop(worker_id)
+            process.join()
+            task_id = self._current.pop(worker_id).value
+            error = BrokenProcessPool(
+                f"A worker process died (exit code {process.exitcode})"
+            )
+            if task_id == -1:
+                self._broken = error
+                self._stopping = True
+                pending = list(self._pending.values())
+                self._pending.clear()
+                survivors = list(self.processes.values())
+                self.processes.clear()
+                self._current.clear()
+                stopped = True
+            else:
+                entry = self._pending.pop(task_id, None)
+                pending = [] if entry is None else [entry]
+                survivors = []
+                stopped = self._replace(True)
+        for survivor in survivors:
+            survivor.terminate()
+            survivor.join()
+        for result_wrapper, blocks in pending:
+            _release(blocks)
+            result_wrapper.set_error(error)
+        return stopped
+
+    def _replace(self, recycled: bool) -> bool:
+        """
+        Spawns a replacement for a worker that exited (called with the lock
+        held).
+
+        Returns:
+            bool: Whether the pool has stopped and the collector must exit.
+        """
+        if recycled and (not self._stopping or self._draining):
+            self._spawn()
+        return self._stopping and not self.processes
+
+    def enqueue(self, task: Callable, *args: Any, **kwargs: Any) -> ResultWrapper:
+        """
+        Submit a task to the process pool.
+
+        Args:
+            task (Callable): The task (a picklable function) to be executed.
+            *args: Positional arguments for the task function.
+            **kwargs: Keyword arguments for the task function.
+
+        Returns:
+            ResultWrapper: A wrapper to obtain the result of the task execution.
+                If the task cannot be pickled or the pool is broken, the error
+                is raised by result(). Tasks submitted after dispose() are
+                cancelled.
+        """
+        result_wrapper = ResultWrapper()
+        blocks: List[shared_memory.SharedMemory] = []
+        try:
+            shared_args = [_share(arg, self.shm_threshold, blocks) for arg in args]
+            shared_kwargs = {
+                key: _share(value, self.shm_threshold, blocks)
+                for key, value in kwargs.items()
+            }
+            data = pickle.dumps((task, shared_args, shared_kwargs))
+        except Exception as e:
+            _release(blocks)
+            result_wrapper.set_error(e)
+            return result_wrapper
+        task_id = next(self._ids)
+        with self._lock:
+            broken = self._broken
+            stopping = self._stopping
+            if not stopping:
+                self._pending[task_id] = (result_wrapper, blocks)
+        if stopping:
+            _release(blocks)
+            if broken is not None:
+                result_wrapper.set_error(broken)
+            else:
+                result_wrapper.cancel()
+            return result_wrapper
+        self._tasks.put((task_id, data))
+        return result_wrapper
+
+    def dispose(self, wait: bool = True, drain: bool = False) -> None:
+        """
+        Stop all processes and shut down the pool.
+
+        Args:
+            wait (bool): Whether to wait for all processes to finish.
+            drain (bool): Whether to run the queued tasks before stopping.
+                Otherwise they are cancelled once the workers have stopped
+                and raise CancelledError.
+        """
+        with self._lock:
+            if self._stopping:
+                return
+            self._stopping = True
+            self._draining = drain
+            if not drain:
+                self.stop_signal.set()
+            count = len(self.processes)
+        for _ in range(count):
+            self._tasks.put(None)
+        if wait:
+            self._collector.join()
+
+
+def _release(blocks: List[shared_memory.SharedMemory]) -> None:
+    """
+    Frees the shared memory blocks of a finished task.
+    """
+    for block in blocks:
+        block.close()
+        block.unlink()
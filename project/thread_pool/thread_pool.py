@@ -1,57 +1,378 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import queue
 import threading
-from typing import Callable, Any, Tuple, Optional, List, Dict
+import time
+from collections import deque
+from concurrent.futures import CancelledError
+from itertools import islice
+from typing import Callable, Any, Deque, Dict, Generator, Iterable, Iterator, List
+from typing import Optional, Sequence, Tuple, Union
+
+from project.thread_pool.metrics import TaskHooks, WorkerStats, merge_stats
+
+# (function, args, kwargs, result wrapper, deadline, perf_counter() at enqueue)
+Task = Tuple[
+    Callable,
+    Tuple[Any, ...],
+    Dict[str, Any],
+    "ResultWrapper",
+    Optional[float],
+    float,
+]
+
+FULL_POLICIES = ("block", "reject")
+
+logger = logging.getLogger(__name__)
 
 
 class ThreadPool:
     """
     A simple thread pool implementation using the threading module.
 
+    In work-stealing mode every worker owns a deque. Tasks enqueued from inside
+    a running task go to the worker's own deque (taken back LIFO without any
+    lock), tasks from other threads go to the shared queue, and an idle worker
+    steals the oldest task from the other end of a busy worker's deque.
+
+    The shared queue can be bounded: when it holds ``max_queue_size`` tasks,
+    submission blocks (optionally up to a timeout) or is rejected with
+    ``queue.Full``. With ``priorities`` the queue is a heap and tasks with a
+    lower priority value run first. A task whose deadline has passed before
+    a worker picks it up is not run and fails with TimeoutError.
+
+    With ``min_threads`` below ``num_threads`` the pool is elastic: it starts
+    ``min_threads`` workers, spawns more (up to ``num_threads``) when tasks
+    queue up faster than idle workers take them, and retires workers that
+    stay idle for ``idle_timeout`` seconds.
+
+    With ``metrics`` enabled, every worker records queue wait and run times
+    and its busy time; stats() merges them into a snapshot, and ``hooks``
+    receive the same measurements as tasks start and finish. Metrics are off
+    by default because recording costs about 1-2 us per task.
+
     Attributes:
-        num_threads (int): Number of threads in the pool.
-        tasks (list): List of tasks to be executed by threads.
-        lock (threading.Lock): Lock to synchronize access to the tasks list.
-        threads (list): List of threads in the pool.
+        num_threads (int): Maximum number of threads in the pool.
+        min_threads (int): Number of threads that are never retired.
+        idle_timeout (float): Idle time after which extra threads exit.
+        tasks (deque): Queue of tasks to be executed by threads (a heap of
+            (priority, sequence number, task) with ``priorities``).
+        lock (threading.Lock): Lock to synchronize access to the tasks queue.
+        not_empty (threading.Condition): Condition on ``lock`` that idle
+            workers wait on until a task is enqueued or the pool is disposed.
+        not_full (threading.Condition): Condition on ``lock`` that blocked
+            producers wait on until the bounded queue has room.
+        threads (list): List of live threads in the pool.
         stop_signal (threading.Event): Event to signal threads to stop working.
+        work_stealing (bool): Whether workers use per-worker deques.
+        local_tasks (list): Per-worker deques (work-stealing mode only).
+        max_queue_size (Optional[int]): Capacity of the shared queue.
+        full_policy (str): What submission does when the queue is full:
+            "block" (up to ``queue_timeout``) or "reject".
+        queue_timeout (Optional[float]): Default time to wait for room.
+        priorities (bool): Whether the shared queue is a priority heap.
+        metrics (bool): Whether workers record latency statistics.
+        hooks (list): TaskHooks called by the workers.
     """
 
-    def __init__(self, num_threads: int) -> None:
+    def __init__(
+        self,
+        num_threads: int,
+        work_stealing: bool = False,
+        max_queue_size: Optional[int] = None,
+        full_policy: str = "block",
+        queue_timeout: Optional[float] = None,
+        priorities: bool = False,
+        min_threads: Optional[int] = None,
+        idle_timeout: float = 10.0,
+        metrics: bool = False,
+        hooks: Sequence[TaskHooks] = (),
+    ) -> None:
         """
         Initialize the thread pool.
 
         Args:
-            num_threads (int): Number of threads to create in the pool.
+            num_threads (int): Number of threads to create in the pool (the
+                maximum number in an elastic pool).
+            work_stealing (bool): Whether to schedule tasks with per-worker
+                deques and work stealing instead of the shared queue only.
+            max_queue_size (Optional[int]): Maximum number of queued tasks
+                (unbounded if None). Tasks that running tasks put on their
+                own deque in work-stealing mode are not counted.
+            full_policy (str): "block" to wait for room (at most
+                ``queue_timeout`` seconds), "reject" to raise queue.Full.
+            queue_timeout (Optional[float]): Default time to wait for room.
+            priorities (bool): Whether to order the queue by task priority.
+            min_threads (Optional[int]): Number of threads started up front
+                and never retired (``num_threads`` if None).
+            idle_timeout (float): Idle time after which threads above
+                ``min_threads`` exit.
+            metrics (bool): Whether workers record latency statistics
+                (off by default).
+            hooks (Sequence[TaskHooks]): Hooks called as tasks start and
+                finish (they get measurements even without ``metrics``).
+
+        Raises:
+            ValueError: If the queue or sizing options are invalid.
         """
-        self.tasks: List[
-            Tuple[Callable, Tuple[Any, ...], Dict[str, Any], "ResultWrapper"]
-        ] = []
+        if min_threads is None:
+            min_threads = num_threads
+        if not 0 <= min_threads <= num_threads:
+            raise ValueError("min_threads must be between 0 and num_threads")
+        if full_policy not in FULL_POLICIES:
+            raise ValueError(f"full_policy must be one of {FULL_POLICIES}")
+        if max_queue_size is not None and max_queue_size < 1:
+            raise ValueError("max_queue_size must be at least 1")
+        if priorities and work_stealing:
+            raise ValueError("Priorities are not supported with work stealing")
+        # The queue is one of these two; they are separate so that each has
+        # its own type, and ``tasks`` refers to the one in use.
+        self._fifo: Deque[Task] = deque()
+        self._heap: List[Tuple[int, int, Task]] = []
+        self.tasks: Union[Deque[Task], List[Tuple[int, int, Task]]] = (
+            self._heap if priorities else self._fifo
+        )
         self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.max_queue_size = max_queue_size
+        self.full_policy = full_policy
+        self.queue_timeout = queue_timeout
+        self.priorities = priorities
+        self._sequence = itertools.count()
         self.threads: List[threading.Thread] = []
         self.num_threads = num_threads
         self.stop_signal = threading.Event()
+        self.work_stealing = work_stealing
+        self.local_tasks: List[Deque[Task]] = [
+            deque() for _ in range(num_threads if work_stealing else 0)
+        ]
+        self.min_threads = min_threads
+        self.idle_timeout = idle_timeout
+        self._idle_wait = idle_timeout if min_threads < num_threads else None
+        self._free_slots = list(range(num_threads - 1, -1, -1))
+        self._idle = 0
+        self._drain = False
+        self._current = threading.local()
+        self.metrics = metrics
+        self.hooks = list(hooks)
+        self._worker_stats: List[WorkerStats] = []
+        self._retired_stats = WorkerStats("retired")
+
+        with self.lock:
+            for _ in range(min_threads):
+                self._spawn()
 
-        for _ in range(num_threads):
+    def _spawn(self) -> None:
+        """
+        Starts a worker thread (called with the lock held).
+        """
+        if self.work_stealing:
+            index = self._free_slots.pop()
+            thread = threading.Thread(target=self.stealing_worker, args=(index,))
+        else:
             thread = threading.Thread(target=self.worker)
-            thread.start()
-            self.threads.append(thread)
+        self.threads.append(thread)
+        thread.start()
+
+    def _grow(self) -> None:
+        """
+        Starts one more worker if the pool is below its maximum size
+        (called with the lock held).
+        """
+        if len(self.threads) < self.num_threads and not self.stop_signal.is_set():
+            self._spawn()
+
+    def _retire(
+        self, stats: Optional[WorkerStats], index: Optional[int] = None
+    ) -> bool:
+        """
+        Removes the calling idle worker if the pool is above its minimum size
+        (called with the lock held).
+
+        Returns:
+            bool: Whether the worker should exit.
+        """
+        if len(self.threads) <= self.min_threads or self.stop_signal.is_set():
+            return False
+        self.threads.remove(threading.current_thread())
+        if index is not None:
+            self._free_slots.append(index)
+        if stats is not None:
+            self._worker_stats.remove(stats)
+            self._retired_stats.merge(stats)
+        return True
+
+    def _register(self) -> Optional[WorkerStats]:
+        """
+        Creates the statistics of the calling worker (None without metrics).
+        """
+        if not self.metrics:
+            return None
+        stats = WorkerStats(threading.current_thread().name)
+        with self.lock:
+            self._worker_stats.append(stats)
+        return stats
 
     def worker(self) -> None:
         """
         Worker function that each thread runs to execute tasks from the pool.
-        Continuously checks for new tasks until a stop signal is received.
-        """
-        while not self.stop_signal.is_set():
-            flag: bool = False
-            with self.lock:
-                if self.tasks:
-                    flag = True
-                    task = self.tasks.pop(0)
-                    try:
-                        result = task[0](*task[1], **task[2])
-                        task[3].set_result(result)
-                    except Exception as e:
-                        task[3].set_error(e)
-            if not flag:
-                threading.Event().wait(0.1)  # Sleep a little to avoid busy-waiting
+        Sleeps on the condition until a task arrives and runs it outside the
+        lock, so tasks execute in parallel. Exits when a stop signal is received
+        and, if the pool is drained, the queue is empty (or after
+        ``idle_timeout`` without tasks in an elastic pool).
+        """
+        stats = self._register()
+        while True:
+            with self.not_empty:
+                while not self.tasks and not self.stop_signal.is_set():
+                    self._idle += 1
+                    woken = self.not_empty.wait(self._idle_wait)
+                    self._idle -= 1
+                    if not woken and not self.tasks and self._retire(stats):
+                        return
+                if self.stop_signal.is_set() and not (self._drain and self.tasks):
+                    return
+                if self.priorities:
+                    item = heapq.heappop(self._heap)[2]
+                else:
+                    item = self._fifo.popleft()
+                if self.max_queue_size is not None:
+                    self.not_full.notify()
+            self._run(item, stats)
+
+    def stealing_worker(self, index: int) -> None:
+        """
+        Worker function for work-stealing mode. Takes tasks from its own deque,
+        then from the shared queue, then steals from the other workers, and
+        only sleeps on the condition when all of them are empty.
+
+        Args:
+            index (int): Index of the worker's deque in ``local_tasks``.
+        """
+        self._current.index = index
+        stats = self._register()
+        while not self.stop_signal.is_set() or self._drain:
+            item = self._next_task(index)
+            if item is None:
+                with self.not_empty:
+                    # Producers notify only when they see an idle worker, so
+                    # register first and look again before going to sleep.
+                    self._idle += 1
+                    item = self._next_task(index)
+                    while item is None and not self.stop_signal.is_set():
+                        woken = self.not_empty.wait(self._idle_wait)
+                        item = self._next_task(index)
+                        if item is None and not woken and self._retire(stats, index):
+                            break
+                    self._idle -= 1
+                if item is None:
+                    return
+            if self.max_queue_size is not None:
+                with self.not_full:
+                    self.not_full.notify()
+            self._run(item, stats)
+
+    def _next_task(self, index: int) -> Optional[Task]:
+        """
+        Returns the next task for the worker (or None if there is no work).
+        Single deque operations are atomic, so no lock is needed.
+        """
+        try:
+            return self.local_tasks[index].pop()
+        except IndexError:
+            pass
+        try:
+            return self._fifo.popleft()
+        except IndexError:
+            pass
+        for offset in range(1, self.num_threads):
+            victim = self.local_tasks[(index + offset) % self.num_threads]
+            try:
+                return victim.popleft()
+            except IndexError:
+                pass
+        return None
+
+    def _run(self, item: Task, stats: Optional[WorkerStats]) -> None:
+        """
+        Runs a task and stores its result or error in the wrapper.
+        Tasks past their deadline fail with TimeoutError without running.
+        """
+        task, args, kwargs, result_wrapper, deadline, enqueued = item
+        if not result_wrapper.set_running():
+            return
+        if deadline is not None and time.monotonic() > deadline:
+            if stats is not None:
+                stats.failed += 1
+            result_wrapper.set_error(TimeoutError("The task deadline has expired"))
+            return
+        if not self.hooks:
+            # The common cases, without the bookkeeping for hooks.
+            if stats is None:
+                try:
+                    result = task(*args, **kwargs)
+                except Exception as e:
+                    result_wrapper.set_error(e)
+                else:
+                    result_wrapper.set_result(result)
+                return
+            start = time.perf_counter()
+            try:
+                result = task(*args, **kwargs)
+            except Exception as e:
+                stats.record(start - enqueued, time.perf_counter() - start, True)
+                result_wrapper.set_error(e)
+            else:
+                stats.record(start - enqueued, time.perf_counter() - start, False)
+                result_wrapper.set_result(result)
+            return
+        start = time.perf_counter()
+        for hook in self.hooks:
+            self._call_hook(hook.task_started, start - enqueued)
+        error: Optional[Exception] = None
+        try:
+            result = task(*args, **kwargs)
+        except Exception as e:
+            error = e
+        run_time = time.perf_counter() - start
+        if stats is not None:
+            stats.record(start - enqueued, run_time, error is not None)
+        for hook in self.hooks:
+            self._call_hook(hook.task_finished, run_time, error)
+        if error is None:
+            result_wrapper.set_result(result)
+        else:
+            result_wrapper.set_error(error)
+
+    @staticmethod
+    def _call_hook(hook: Callable, *args: Any) -> None:
+        try:
+            hook(*args)
+        except Exception:
+            logger.exception("Exception in a ThreadPool hook")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return a snapshot of the pool's statistics.
+
+        Returns:
+            Dict[str, Any]: ``queue_depth`` and ``threads`` (current values),
+                ``completed`` and ``failed`` task counts, ``wait_time`` (from
+                enqueue to start) and ``run_time`` summaries in seconds
+                (count, mean, p50, p90, p99, max) and, per live worker, the
+                number of tasks and the busy ratio.
+        """
+        with self.lock:
+            workers = list(self._worker_stats)
+            depth = len(self.tasks) + sum(len(tasks) for tasks in self.local_tasks)
+            threads = len(self.threads)
+        snapshot = merge_stats(workers, self._retired_stats)
+        snapshot["queue_depth"] = depth
+        snapshot["threads"] = threads
+        return snapshot
 
     def enqueue(self, task: Callable, *args: Any, **kwargs: Any) -> "ResultWrapper":
         """
@@ -66,31 +387,328 @@ class ThreadPool:
             ResultWrapper: A wrapper to obtain the result of the task execution.
         """
         result_wrapper = ResultWrapper()
-        with self.lock:
-            self.tasks.append((task, args, kwargs, result_wrapper))
+        self._put((task, args, kwargs, result_wrapper, None, time.perf_counter()))
         return result_wrapper
 
-    def dispose(self, wait: bool = True) -> None:
+    def submit(
+        self,
+        task: Callable,
+        args: Tuple[Any, ...] = (),
+        kwargs: Optional[Dict[str, Any]] = None,
+        priority: int = 0,
+        deadline: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ) -> "ResultWrapper":
+        """
+        Submit a task with scheduling options.
+
+        Args:
+            task (Callable): The task (function) to be executed.
+            args (Tuple[Any, ...]): Positional arguments for the task function.
+            kwargs (Optional[Dict[str, Any]]): Keyword arguments for the task.
+            priority (int): Lower values run first (with ``priorities``).
+            deadline (Optional[float]): ``time.monotonic()`` value after which
+                the task is dropped instead of run.
+            timeout (Optional[float]): Time to wait for room in a full queue
+                (``queue_timeout`` by default).
+
+        Returns:
+            ResultWrapper: A wrapper to obtain the result of the task execution.
+                A dropped task fails with TimeoutError.
+
+        Raises:
+            queue.Full: If the queue is full and the task was rejected or
+                there was no room within the timeout.
+        """
+        result_wrapper = ResultWrapper()
+        item = (
+            task,
+            tuple(args),
+            kwargs or {},
+            result_wrapper,
+            deadline,
+            time.perf_counter(),
+        )
+        self._put(item, priority, timeout)
+        return result_wrapper
+
+    def _put(
+        self, item: Task, priority: int = 0, timeout: Optional[float] = None
+    ) -> None:
+        """
+        Adds a task to the queue and wakes an idle worker. Tasks submitted
+        after dispose() are cancelled unless the pool is being drained.
+        """
+        self._put_task(item, priority, timeout)
+        if self.stop_signal.is_set() and not self._drain:
+            # Either dispose() has already cancelled the queue or it will
+            # find the task there; cancelling twice is harmless.
+            item[3].cancel()
+
+    def _put_task(self, item: Task, priority: int, timeout: Optional[float]) -> None:
+        """
+        Puts a task on the local deque or the shared queue.
+        """
+        if self.work_stealing:
+            index = getattr(self._current, "index", None)
+            if index is not None or self.max_queue_size is None:
+                if index is None:
+                    self._fifo.append(item)
+                else:
+                    self.local_tasks[index].append(item)
+                if self._idle:
+                    with self.not_empty:
+                        self.not_empty.notify()
+                elif len(self.threads) < self.num_threads:
+                    with self.not_empty:
+                        self._grow()
+                return
+        with self.not_empty:
+            if self.max_queue_size is not None:
+                self._wait_for_room(self.max_queue_size, timeout)
+            if self.priorities:
+                entry = (priority, next(self._sequence), item)
+                heapq.heappush(self._heap, entry)
+            else:
+                self._fifo.append(item)
+            if len(self.tasks) > self._idle:
+                self._grow()
+            self.not_empty.notify()
+
+    def _wait_for_room(self, capacity: int, timeout: Optional[float]) -> None:
+        """
+        Applies the full-queue policy (called with the lock held).
+        """
+        if len(self.tasks) < capacity:
+            return
+        if self.full_policy == "reject":
+            raise queue.Full("The task queue is full")
+        if timeout is None:
+            timeout = self.queue_timeout
+        has_room = lambda: len(self.tasks) < capacity or self.stop_signal.is_set()
+        if not self.not_full.wait_for(has_room, timeout):
+            raise queue.Full("No room in the task queue within the timeout")
+
+    def map(
+        self,
+        fn: Callable,
+        iterable: Iterable[Any],
+        chunksize: int = 1,
+        max_pending: Optional[int] = None,
+    ) -> List[Any]:
+        """
+        Apply a function to every item in parallel and collect the results.
+
+        Args:
+            fn (Callable): The function to apply.
+            iterable (Iterable): The items.
+            chunksize (int): Number of items submitted as one task.
+            max_pending (Optional[int]): Maximum number of chunks in flight
+                (twice the number of threads by default).
+
+        Returns:
+            List[Any]: The results in the order of the items.
+
+        Raises:
+            Exception: The first error raised by ``fn``.
+        """
+        return list(self.imap(fn, iterable, chunksize, max_pending))
+
+    def imap(
+        self,
+        fn: Callable,
+        iterable: Iterable[Any],
+        chunksize: int = 1,
+        max_pending: Optional[int] = None,
+    ) -> Iterator[Any]:
+        """
+        Lazy version of map(): yields the results in the order of the items.
+        Only ``max_pending`` chunks are in flight at a time, so the input is
+        consumed as the results are read.
+
+        Args:
+            fn (Callable): The function to apply.
+            iterable (Iterable): The items.
+            chunksize (int): Number of items submitted as one task.
+            max_pending (Optional[int]): Maximum number of chunks in flight
+                (twice the number of threads by default).
+
+        Returns:
+            Iterator[Any]: The results in the order of the items.
+
+        Raises:
+            ValueError: If chunksize or max_pending is less than 1.
+            Exception: The first error raised by ``fn``.
+        """
+        return self._imap(fn, iterable, chunksize, max_pending, ordered=True)
+
+    def imap_unordered(
+        self,
+        fn: Callable,
+        iterable: Iterable[Any],
+        chunksize: int = 1,
+        max_pending: Optional[int] = None,
+    ) -> Iterator[Any]:
+        """
+        Like imap(), but yields the results of every chunk as soon as it
+        is done.
+
+        Args:
+            fn (Callable): The function to apply.
+            iterable (Iterable): The items.
+            chunksize (int): Number of items submitted as one task.
+            max_pending (Optional[int]): Maximum number of chunks in flight
+                (twice the number of threads by default).
+
+        Returns:
+            Iterator[Any]: The results in the order of completion.
+
+        Raises:
+            ValueError: If chunksize or max_pending is less than 1.
+            Exception: The first error raised by ``fn``.
+        """
+        return self._imap(fn, iterable, chunksize, max_pending, ordered=False)
+
+    def _imap(
+        self,
+        fn: Callable,
+        iterable: Iterable[Any],
+        chunksize: int,
+        max_pending: Optional[int],
+        ordered: bool,
+    ) -> Iterator[Any]:
+        """
+        Validates the arguments eagerly and returns the result generator.
+        """
+        if max_pending is None:
+            max_pending = 2 * self.num_threads
+        if chunksize < 1 or max_pending < 1:
+            raise ValueError("chunksize and max_pending must be at least 1")
+        items = iter(iterable)
+        chunks = enumerate(iter(lambda: list(islice(items, chunksize)), []))
+        return self._chunk_results(fn, chunks, max_pending, ordered)
+
+    def _chunk_results(
+        self,
+        fn: Callable,
+        chunks: Iterator[Tuple[int, List[Any]]],
+        max_pending: int,
+        ordered: bool,
+    ) -> Iterator[Any]:
+        """
+        Keeps up to ``max_pending`` chunks in flight and yields their results.
+        All chunks report to one queue instead of a ResultWrapper each.
+
+        In ordered mode the error of a failed chunk is raised only after the
+        results of all the chunks before it, like multiprocessing.Pool.imap.
+        """
+        done: "queue.SimpleQueue[Tuple[int, bool, Any]]" = queue.SimpleQueue()
+        in_flight = 0
+        ready: Dict[int, Tuple[bool, Any]] = {}
+        expected = 0
+        batch: List[List[Any]] = []
+        error: Optional[BaseException] = None
+        while True:
+            # Chunks buffered for an unfinished head chunk count against
+            # max_pending too, so a slow chunk does not pull in the input.
+            while error is None and in_flight + len(ready) < max_pending:
+                next_chunk = next(chunks, None)
+                if next_chunk is None:
+                    break
+                chunk_result = _ChunkResult(done, next_chunk[0])
+                enqueued = time.perf_counter()
+                self._put(
+                    (_run_chunk, (fn, next_chunk[1]), {}, chunk_result, None, enqueued)
+                )
+                in_flight += 1
+            for payload in batch:
+                yield from payload
+            if error is not None:
+                raise error
+            if not in_flight:
+                return
+            index, ok, payload = done.get()
+            in_flight -= 1
+            if not ordered:
+                if not ok:
+                    raise payload
+                batch = [payload]
+                continue
+            ready[index] = (ok, payload)
+            batch = []
+            while expected in ready:
+                ok, payload = ready.pop(expected)
+                if not ok:
+                    error = payload
+                    break
+                batch.append(payload)
+                expected += 1
+
+    def dispose(self, wait: bool = True, drain: bool = False) -> None:
         """
         Stop all threads and shut down the pool.
 
         Args:
             wait (bool): Whether to wait for all threads to finish.
+            drain (bool): Whether to run the queued tasks before stopping.
+                Otherwise they are cancelled and raise CancelledError.
         """
-        self.stop_signal.set()
+        pending: List[Task] = []
+        with self.not_empty:
+            self._drain = drain
+            self.stop_signal.set()
+            if not drain:
+                pending = self._take_queued()
+            self.not_empty.notify_all()
+            self.not_full.notify_all()
+        for item in pending:
+            item[3].cancel()
         if wait:
-            for thread in self.threads:
+            for thread in list(self.threads):
                 thread.join()
 
+    def _take_queued(self) -> List[Task]:
+        """
+        Removes all queued tasks (called with the lock held).
+        """
+        if self.priorities:
+            taken = [entry[2] for entry in self._heap]
+            self._heap.clear()
+            return taken
+        taken = []
+        for tasks in [self._fifo, *self.local_tasks]:
+            while True:
+                try:
+                    taken.append(tasks.popleft())
+                except IndexError:
+                    break
+        return taken
+
+
+def _run_chunk(fn: Callable, chunk: List[Any]) -> List[Any]:
+    """
+    Applies the function to every item of a chunk.
+    """
+    return [fn(item) for item in chunk]
+
 
 class ResultWrapper:
     """
     A wrapper class to handle the result of a task executed by a thread.
 
+    A task that has not started yet can be cancelled. Callbacks registered
+    with add_done_callback() run once the task is done, which is also how
+    the wrapper is awaitable: ``await wrapper`` suspends the coroutine
+    without blocking a thread and is resolved through the event loop's
+    ``call_soon_threadsafe``.
+
     Attributes:
         _result (Any): The result of the executed task.
         _error (Optional[Exception]): An exception raised during task execution, if any.
         _completed (threading.Event): An event to indicate task completion.
+        _lock (threading.Lock): Lock protecting the state and the callbacks.
+        _running (bool): Whether a worker has started the task.
+        _callbacks (list): Functions to call with the wrapper when it is done.
     """
 
     def __init__(self) -> None:
@@ -100,6 +718,9 @@ class ResultWrapper:
         self._result: Optional[Any] = None
         self._error: Optional[Exception] = None
         self._completed = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+        self._callbacks: List[Callable[["ResultWrapper"], Any]] = []
 
     def set_result(self, result: Any) -> None:
         """
@@ -108,8 +729,7 @@ class ResultWrapper:
         Args:
             result (Any): The result to set.
         """
-        self._result = result
-        self._completed.set()
+        self._complete(result, None)
 
     def set_error(self, error: Exception) -> None:
         """
@@ -118,8 +738,129 @@ class ResultWrapper:
         Args:
             error (Exception): The exception raised during task execution.
         """
+        self._complete(None, error)
+
+    def _complete(self, result: Any, error: Optional[Exception]) -> None:
+        """
+        Stores the outcome (unless the task is already done, e.g. cancelled)
+        and runs the callbacks.
+        """
+        with self._lock:
+            if self._completed.is_set():
+                return
+            callbacks = self._settle(result, error)
+        for callback in callbacks:
+            self._call(callback)
+
+    def _settle(
+        self, result: Any, error: Optional[Exception]
+    ) -> List[Callable[["ResultWrapper"], Any]]:
+        """
+        Stores the outcome and returns the callbacks to run (called with the
+        lock held).
+        """
+        self._result = result
         self._error = error
         self._completed.set()
+        callbacks, self._callbacks = self._callbacks, []
+        return callbacks
+
+    def _call(self, callback: Callable[["ResultWrapper"], Any]) -> None:
+        try:
+            callback(self)
+        except Exception:
+            logger.exception("Exception in a ResultWrapper callback")
+
+    def set_running(self) -> bool:
+        """
+        Mark the task as started (called by the worker before running it).
+
+        Returns:
+            bool: False if the task was cancelled and must not run.
+        """
+        with self._lock:
+            if self._completed.is_set():
+                return False
+            self._running = True
+            return True
+
+    def cancel(self) -> bool:
+        """
+        Cancel the task if it has not started yet. The result then raises
+        CancelledError.
+
+        Returns:
+            bool: Whether the task was cancelled.
+        """
+        with self._lock:
+            # Checked and settled under one lock, so that a worker cannot
+            # start the task in between.
+            if self._running or self._completed.is_set():
+                return False
+            callbacks = self._settle(None, CancelledError())
+        for callback in callbacks:
+            self._call(callback)
+        return True
+
+    def cancelled(self) -> bool:
+        """
+        Returns whether the task was cancelled.
+        """
+        return isinstance(self._error, CancelledError)
+
+    def done(self) -> bool:
+        """
+        Returns whether the task has completed or was cancelled.
+        """
+        return self._completed.is_set()
+
+    def add_done_callback(self, callback: Callable[["ResultWrapper"], Any]) -> None:
+        """
+        Call a function with the wrapper once the task is done. The function
+        runs in the thread that completes the task, or immediately if the
+        task is already done. Exceptions raised by it are logged.
+
+        Args:
+            callback (Callable): The function to call.
+        """
+        with self._lock:
+            if not self._completed.is_set():
+                self._callbacks.append(callback)
+                return
+        self._call(callback)
+
+    def _resolve(self, future: asyncio.Future) -> None:
+        """
+        Copies the outcome to a future (runs in the future's event loop).
+        """
+        if future.done():
+            return
+        if self._error is not None:
+            future.set_exception(self._error)
+        else:
+            future.set_result(self._result)
+
+    def __await__(self) -> Generator[Any, None, Any]:
+        """
+        Wait for the result in a coroutine without blocking the event loop.
+
+        Returns:
+            Any: The result of the executed task.
+
+        Raises:
+            Exception: If an error occurred during task execution.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake(_: "ResultWrapper") -> None:
+            try:
+                loop.call_soon_threadsafe(self._resolve, future)
+            except RuntimeError:  # the event loop is closed
+                pass
+
+        self.add_done_callback(wake)
+        return (yield from future)
 
     def result(self, timeout: Optional[float] = None) -> Any:
         """
@@ -132,9 +873,106 @@ class ResultWrapper:
             Any: The result of the executed task.
 
         Raises:
+            TimeoutError: If the task is not done within the timeout.
+            CancelledError: If the task was cancelled.
             Exception: If an error occurred during task execution.
         """
-        self._completed.wait(timeout)
-        if self._error:
+        if not self._completed.wait(timeout):
+            raise TimeoutError("The task is not done within the timeout")
+        if self._error is not None:
             raise self._error
         return self._result
+
+
+def as_completed(
+    results: Iterable[ResultWrapper], timeout: Optional[float] = None
+) -> Iterator[ResultWrapper]:
+    """
+    Yield the wrappers as their tasks complete.
+
+    Args:
+        results (Iterable[ResultWrapper]): The wrappers to wait for.
+        timeout (Optional[float]): Maximum total time to wait.
+
+    Returns:
+        Iterator[ResultWrapper]: The wrappers in the order of completion.
+
+    Raises:
+        TimeoutError: If not all tasks are done within the timeout.
+    """
+    results = list(results)
+    done: "queue.SimpleQueue[ResultWrapper]" = queue.SimpleQueue()
+    for result_wrapper in results:
+        result_wrapper.add_done_callback(done.put)
+    return _drain(done, len(results), timeout)
+
+
+def _drain(
+    done: "queue.SimpleQueue[ResultWrapper]", count: int, timeout: Optional[float]
+) -> Iterator[ResultWrapper]:
+    end = None if timeout is None else time.monotonic() + timeout
+    for _ in range(count):
+        remaining = None if end is None else max(end - time.monotonic(), 0)
+        try:
+            yield done.get(timeout=remaining)
+        except queue.Empty:
+            raise TimeoutError("Not all tasks are done within the timeout")
+
+
+def wait_any(
+    results: Iterable[ResultWrapper], timeout: Optional[float] = None
+) -> ResultWrapper:
+    """
+    Wait until one of the tasks is done.
+
+    Args:
+        results (Iterable[ResultWrapper]): The wrappers to wait for.
+        timeout (Optional[float]): Maximum time to wait.
+
+    Returns:
+        ResultWrapper: The first completed wrapper.
+
+    Raises:
+        TimeoutError: If no task is done within the timeout.
+        ValueError: If there are no wrappers.
+    """
+    for result_wrapper in as_completed(results, timeout):
+        return result_wrapper
+    raise ValueError("wait_any() needs at least one ResultWrapper")
+
+
+def wait_all(results: Iterable[ResultWrapper], timeout: Optional[float] = None) -> None:
+    """
+    Wait until all tasks are done (successfully or not).
+
+    Args:
+        results (Iterable[ResultWrapper]): The wrappers to wait for.
+        timeout (Optional[float]): Maximum total time to wait.
+
+    Raises:
+        TimeoutError: If not all tasks are done within the timeout.
+    """
+    for _ in as_completed(results, timeout):
+        pass
+
+
+class _ChunkResult(ResultWrapper):
+    """
+    Result of a map chunk: a regular ResultWrapper that also forwards its
+    outcome to the queue shared by all chunks of one map call, so the map
+    generator waits on one queue instead of every chunk.
+    """
+
+    def __init__(
+        self, done: "queue.SimpleQueue[Tuple[int, bool, Any]]", index: int
+    ) -> None:
+        super().__init__()
+        self._done = done
+        self._index = index
+        self._callbacks.append(self._forward)
+
+    def _forward(self, _: ResultWrapper) -> None:
+        if self._error is not None:
+            self._done.put((self._index, False, self._error))
+        else:
+            self._done.put((self._index, True, self._result))
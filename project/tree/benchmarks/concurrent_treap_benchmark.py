@@ -0,0 +1,83 @@
+"""
+Multi-threaded throughput of ConcurrentTreap against a Treap behind one
+global lock. Tasks are submitted to ThreadPool; every task performs mixed
+reads and writes on its own key range. Run from the repository root:
+
+    python -m project.tree.benchmarks.concurrent_treap_benchmark [threads]
+"""
+
+import random
+import sys
+import threading
+import time
+
+from project.thread_pool.thread_pool import ThreadPool
+from project.tree.cartesian_tree import Treap
+from project.tree.concurrent_treap import ConcurrentTreap
+
+KEYS = 100_000
+TASKS = 64
+OPS_PER_TASK = 5_000
+
+
+class LockedTreap:
+    """
+    Treap with a single lock around every operation (the baseline).
+    """
+
+    def __init__(self):
+        self._tree = Treap()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._tree.get(key, default)
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._tree[key] = value
+
+
+def work(tree, seed, lo, hi):
+    """
+    Performs OPS_PER_TASK operations (one write per four reads) on [lo, hi).
+    """
+    rng = random.Random(seed)
+    for _ in range(OPS_PER_TASK):
+        key = rng.randrange(lo, hi)
+        if rng.random() < 0.2:
+            tree[key] = seed
+        else:
+            tree.get(key)
+
+
+def run(tree, num_threads, shards):
+    """
+    Returns operations per second for TASKS tasks spread over the shards.
+    """
+    width = KEYS // shards
+    pool = ThreadPool(num_threads)
+    start = time.perf_counter()
+    results = []
+    for seed in range(TASKS):
+        lo = seed % shards * width
+        results.append(pool.enqueue(work, tree, seed, lo, lo + width))
+    for result in results:
+        result.result()
+    elapsed = time.perf_counter() - start
+    pool.dispose()
+    return TASKS * OPS_PER_TASK / elapsed
+
+
+def main(num_threads=8):
+    shards = num_threads
+    boundaries = [KEYS // shards * i for i in range(1, shards)]
+    locked = run(LockedTreap(), num_threads, shards)
+    sharded = run(ConcurrentTreap(boundaries), num_threads, shards)
+    print(f"threads = {num_threads}, shards = {shards}")
+    print(f"{'global lock':<16}{locked:>14,.0f} ops/s")
+    print(f"{'ConcurrentTreap':<16}{sharded:>14,.0f} ops/s ({sharded / locked:.2f}x)")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
@@ -0,0 +1,377 @@
+"""
+Benchmarks for the Cartesian tree.
+
+Compares the iterative Treap with the previous recursive implementation,
+which is kept here as a reference, and measures the memory taken by Treap
+and CompactTreap. Run from the repository root:
+
+    python -m project.tree.benchmarks.treap_benchmark [n]
+    python -m project.tree.benchmarks.treap_benchmark memory [n]
+"""
+
+import gc
+import operator
+import random
+import sys
+import time
+import tracemalloc
+
+from project.tree import cartesian_tree
+from project.tree.cartesian_tree import _MISSING, Aggregate, Treap, TreapNode
+from project.tree.compact_treap import CompactTreap
+
+
+def _recursive_merge(left, right):
+    if not left or not right:
+        return left or right
+    if left.priority > right.priority:
+        left.right = _recursive_merge(left.right, right)
+        return left
+    right.left = _recursive_merge(left, right.left)
+    return right
+
+
+class RecursiveTreap:
+    """
+    The recursive Treap engine the iterative one replaced (reference only).
+    """
+
+    def __init__(self):
+        self.root = None
+        self._size = 0
+
+    def __setitem__(self, key, value):
+        if key in self:
+            self._replace(self.root, key, value)
+        else:
+            self.root = self._insert(self.root, TreapNode(key, value))
+            self._size += 1
+
+    def _insert(self, root, node):
+        if root is None:
+            return node
+        if node.key < root.key:
+            root.left = self._insert(root.left, node)
+            if root.left.priority > root.priority:
+                left = root.left
+                root.left = left.right
+                left.right = root
+                root = left
+        else:
+            root.right = self._insert(root.right, node)
+            if root.right.priority > root.priority:
+                right = root.right
+                root.right = right.left
+                right.left = root
+                root = right
+        return root
+
+    def _replace(self, root, key, value):
+        if root is None:
+            return
+        if key < root.key:
+            self._replace(root.left, key, value)
+        elif key > root.key:
+            self._replace(root.right, key, value)
+        else:
+            root.value = value
+
+    def _get_node(self, root, key):
+        if root is None:
+            return None
+        if key < root.key:
+            return self._get_node(root.left, key)
+        elif key > root.key:
+            return self._get_node(root.right, key)
+        return root
+
+    def __getitem__(self, key):
+        node = self._get_node(self.root, key)
+        if node is None:
+            raise KeyError(key)
+        return node.value
+
+    def __contains__(self, key):
+        return self._get_node(self.root, key) is not None
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.root = self._delete(self.root, key)
+        self._size -= 1
+
+    def _delete(self, root, key):
+        if root is None:
+            return None
+        if key < root.key:
+            root.left = self._delete(root.left, key)
+        elif key > root.key:
+            root.right = self._delete(root.right, key)
+        else:
+            root = _recursive_merge(root.left, root.right)
+        return root
+
+    def __iter__(self):
+        yield from self._inorder(self.root)
+
+    def _inorder(self, root):
+        if root:
+            yield from self._inorder(root.left)
+            yield root.key
+            yield from self._inorder(root.right)
+
+
+def _timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run_operations(factory, keys):
+    """
+    Times insertion, update, lookup, iteration and deletion on a fresh tree.
+
+    Returns:
+        dict: Seconds spent in every phase.
+    """
+    tree = factory()
+
+    def insert():
+        for key in keys:
+            tree[key] = key
+
+    def update():
+        for key in keys:
+            tree[key] = -key
+
+    def lookup():
+        for key in keys:
+            tree[key]
+
+    def iterate():
+        for _ in tree:
+            pass
+
+    def delete():
+        for key in keys:
+            del tree[key]
+
+    return {
+        "insert": _timed(insert),
+        "update": _timed(update),
+        "lookup": _timed(lookup),
+        "iterate": _timed(iterate),
+        "delete": _timed(delete),
+    }
+
+
+def run_bulk(n):
+    """
+    Times building a tree from sorted pairs and merging sorted batches
+    (appended after the existing keys and interleaved with them), against
+    the same work done with per-key __setitem__ calls.
+
+    Returns:
+        dict: Seconds (per-key, bulk) for every scenario.
+    """
+    items = [(key, key) for key in range(0, 2 * n, 2)]
+    batches = {
+        "append": [(key, key) for key in range(2 * n, 3 * n)],
+        "interleave": [(key, key) for key in range(1, 2 * n, 4)],
+    }
+
+    def per_key(base, extra):
+        tree = Treap.from_sorted(base)
+        start = time.perf_counter()
+        for key, value in extra:
+            tree[key] = value
+        return time.perf_counter() - start
+
+    def bulk(base, extra):
+        tree = Treap.from_sorted(base)
+        return _timed(lambda: tree.update(extra))
+
+    build = _timed(lambda: Treap.from_sorted(items))
+    results = {"build": (per_key([], items), build)}
+    for name, batch in batches.items():
+        results[name] = (per_key(items, batch), bulk(items, batch))
+    return results
+
+
+def run_batch_sizes(n, fractions=(8, 4, 2, 1)):
+    """
+    Times update() against per-key inserts for batches of n / fraction keys
+    interleaved with a tree of n keys, with update() forced to take the bulk
+    path. This is what _SMALL_BATCH_RATIO is tuned from.
+
+    Returns:
+        dict: Seconds (per-key, bulk) for every fraction.
+    """
+    items = [(key, key) for key in range(0, 4 * n, 4)]
+    ratio = cartesian_tree._SMALL_BATCH_RATIO
+    results = {}
+    for fraction in fractions:
+        step = 4 * fraction
+        batch = [(key, key) for key in range(1, 4 * n, step)]
+        tree = Treap.from_sorted(items)
+        start = time.perf_counter()
+        for key, value in batch:
+            tree[key] = value
+        per_key = time.perf_counter() - start
+        tree = Treap.from_sorted(items)
+        cartesian_tree._SMALL_BATCH_RATIO = float("inf")
+        try:
+            bulk = _timed(lambda: tree.update(batch))
+        finally:
+            cartesian_tree._SMALL_BATCH_RATIO = ratio
+        results[fraction] = (per_key, bulk)
+    return results
+
+
+def run_reduce(n, queries=100):
+    """
+    Times range sums with Treap.reduce against summing irange_items.
+
+    Returns:
+        tuple: Seconds (scan, reduce) for all queries.
+    """
+    tree = Treap.from_sorted(
+        ((key, key) for key in range(n)), Aggregate(operator.add, 0)
+    )
+    random.seed(7)
+    bounds = [sorted(random.sample(range(n), 2)) for _ in range(queries)]
+
+    def scan():
+        for lo, hi in bounds:
+            sum(value for _, value in tree.irange_items(lo, hi))
+
+    def reduce():
+        for lo, hi in bounds:
+            tree.reduce(lo, hi)
+
+    return _timed(scan), _timed(reduce)
+
+
+def run_set_algebra(n, ratio=10):
+    """
+    Times in-place union, intersection and difference of a tree with n keys
+    and a tree with n / ratio keys against per-key loops over the smaller one.
+
+    Returns:
+        dict: Seconds (per-key, operator) for every operation.
+    """
+    random.seed(11)
+    big = sorted(random.sample(range(4 * n), n))
+    small = sorted(random.sample(range(4 * n), n // ratio))
+    first = Treap.from_sorted((key, key) for key in big)
+    second = Treap.from_sorted((key, -key) for key in small)
+
+    def per_key_union():
+        tree = first.copy()
+        start = time.perf_counter()
+        for key, value in second.items():
+            tree[key] = value
+        return time.perf_counter() - start
+
+    def per_key_intersection():
+        tree = first.copy()
+        start = time.perf_counter()
+        result = Treap()
+        for key in second:
+            value = tree.get(key, _MISSING)
+            if value is not _MISSING:
+                result[key] = value
+        return time.perf_counter() - start
+
+    def per_key_difference():
+        tree = first.copy()
+        start = time.perf_counter()
+        for key in second:
+            tree.pop(key, None)
+        return time.perf_counter() - start
+
+    def in_place(operation):
+        tree = first.copy()
+        start = time.perf_counter()
+        operation(tree, second)
+        return time.perf_counter() - start
+
+    return {
+        "union": (per_key_union(), in_place(Treap.__ior__)),
+        "intersect": (per_key_intersection(), in_place(Treap.__iand__)),
+        "difference": (per_key_difference(), in_place(Treap.__isub__)),
+    }
+
+
+def measure_memory(factory, keys):
+    """
+    Measures the memory taken by the tree structure itself.
+
+    Keys are allocated before tracing starts and are used as values too,
+    so only nodes and pools are counted.
+
+    Returns:
+        tuple: Bytes per entry and seconds of a full gc.collect() pass.
+    """
+    gc.collect()
+    tracemalloc.start()
+    tree = factory()
+    for key in keys:
+        tree[key] = key
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    collect = _timed(gc.collect)
+    return used / len(keys), collect
+
+
+def memory_main(n=1_000_000):
+    keys = list(range(n))
+    random.seed(42)
+    random.shuffle(keys)
+    print(f"n = {n}")
+    print(f"{'tree':<14}{'bytes/entry':>14}{'gc.collect, s':>16}")
+    for factory in (Treap, CompactTreap):
+        per_entry, collect = measure_memory(factory, keys)
+        print(f"{factory.__name__:<14}{per_entry:>14.1f}{collect:>16.3f}")
+
+
+def main(n=200_000):
+    keys = list(range(n))
+    random.seed(42)
+    random.shuffle(keys)
+    results = {
+        "recursive": run_operations(RecursiveTreap, keys),
+        "iterative": run_operations(Treap, keys),
+    }
+    print(f"n = {n}")
+    print(f"{'phase':<10}{'recursive, s':>16}{'iterative, s':>16}{'speedup':>10}")
+    for phase in results["recursive"]:
+        old = results["recursive"][phase]
+        new = results["iterative"][phase]
+        print(f"{phase:<10}{old:>16.3f}{new:>16.3f}{old / new:>9.2f}x")
+    print()
+    print(f"{'bulk':<10}{'per-key, s':>16}{'bulk, s':>16}{'speedup':>10}")
+    for phase, (old, new) in run_bulk(n).items():
+        print(f"{phase:<10}{old:>16.3f}{new:>16.3f}{old / new:>9.2f}x")
+    print()
+    print(f"{'batch':<10}{'per-key, s':>16}{'bulk, s':>16}{'speedup':>10}")
+    for fraction, (old, new) in run_batch_sizes(n).items():
+        label = f"n / {fraction}"
+        print(f"{label:<10}{old:>16.3f}{new:>16.3f}{old / new:>9.2f}x")
+    print()
+    for ratio in (1, 10):
+        label = f"n / {ratio}"
+        print(f"{label:<10}{'per-key, s':>16}{'operator, s':>16}{'speedup':>10}")
+        for phase, (old, new) in run_set_algebra(n, ratio).items():
+            print(f"{phase:<10}{old:>16.3f}{new:>16.3f}{old / new:>9.2f}x")
+    print()
+    old, new = run_reduce(n)
+    print(f"{'range sum':<10}{'scan, s':>16}{'reduce, s':>16}{'speedup':>10}")
+    print(f"{'100 qs':<10}{old:>16.3f}{new:>16.3f}{old / new:>9.2f}x")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["memory"]:
+        memory_main(*(int(arg) for arg in sys.argv[2:3]))
+    else:
+        main(*(int(arg) for arg in sys.argv[1:2]))
@@ -1,5 +1,23 @@
+import mmap as mmap_module
+import pickle
 import random
-from collections.abc import MutableMapping
+import struct
+from collections.abc import Mapping, MutableMapping
+
+_MISSING = object()
+
+# A batch this many times smaller than the tree is inserted key by key:
+# below that size single-descent inserts beat rebuilding the whole tree.
+_SMALL_BATCH_RATIO = 2
+
+# Binary file layout written by Treap.dump:
+# header (magic, number of nodes, offset of the records), then the pickled
+# keys and values, then one record per node in key order: offsets of the
+# pickled key, the pickled value and the end of the value, and the priority.
+# The tree structure is implied by the key order and the priorities.
+_MAGIC = b"TREAP\x00\x00\x01"
+_HEADER = struct.Struct("<8sQQ")
+_RECORD = struct.Struct("<QQQd")
 
 
 class TreapNode:
@@ -12,47 +30,406 @@ class TreapNode:
     priority: The node's priority for maintaining the heap (random by default).
     left: The left child.
     right: The right child.
+    size: The number of nodes in the subtree rooted at this node.
+
+    Nodes are slotted: there is no per-node ``__dict__``. A plain node has
+    no owner (see _OwnedNode): it belongs to the only tree that holds it.
     """
 
+    __slots__ = (
+        "key",
+        "value",
+        "priority",
+        "left",
+        "right",
+        "size",
+    )
+
+    owner = None
+
     def __init__(self, key, value, priority=None):
         self.key = key
         self.value = value
         self.priority = priority if priority is not None else random.random()
         self.left = None
         self.right = None
+        self.size = 1
 
     def __repr__(self):
         return f"({self.key}: {self.value}, prio={self.priority:.2f})"
 
 
-def split(root, key):
+class AggregateNode(TreapNode):
     """
-    Splits the tree into two by key.
+    Node of a Treap with an Aggregate.
+
+    Attributes:
+    agg: The aggregate of the subtree values.
+
+    Trees without an aggregate use plain TreapNode objects, which do not
+    carry this slot.
+    """
+
+    __slots__ = ("agg",)
+
+    def __init__(self, key, value, priority=None):
+        super().__init__(key, value, priority)
+        self.agg = value
+
+
+class _OwnedNode(TreapNode):
+    """
+    Node created by a tree that has shared its nodes (see Treap._share).
+
+    Attributes:
+    owner: The token of the tree allowed to modify the node in place.
+    """
+
+    __slots__ = ("owner",)
+
+    def __init__(self, key, value, priority=None, owner=None):
+        super().__init__(key, value, priority)
+        self.owner = owner
+
+
+class _OwnedAggregateNode(AggregateNode):
+    """
+    AggregateNode created by a tree that has shared its nodes.
+    """
+
+    __slots__ = ("owner",)
+
+    def __init__(self, key, value, priority=None, owner=None):
+        super().__init__(key, value, priority)
+        self.owner = owner
+
+
+# The type of the owned copy of a node of every type.
+_OWNED_TYPES = {
+    TreapNode: _OwnedNode,
+    AggregateNode: _OwnedAggregateNode,
+    _OwnedNode: _OwnedNode,
+    _OwnedAggregateNode: _OwnedAggregateNode,
+}
+
+
+class Aggregate:
+    """
+    Associative reduction of values cached in the nodes of a Treap.
+
+    Attributes:
+    combine: Associative function of two values, e.g. operator.add or min.
+    identity: Neutral element of ``combine``, e.g. 0 for addition.
     """
-    if root is None:
-        return (None, None)
-    elif key < root.key:
-        left, right = split(root.left, key)
-        root.left = right
-        return (left, root)
+
+    __slots__ = ("combine", "identity")
+
+    def __init__(self, combine, identity):
+        self.combine = combine
+        self.identity = identity
+
+    def __repr__(self):
+        return f"Aggregate({self.combine!r}, {self.identity!r})"
+
+
+def _own(node, owner):
+    """
+    Returns a node that ``owner`` may modify in place.
+
+    That is the node itself if it belongs to ``owner`` (or if ``owner`` is
+    None, which disables copy-on-write), otherwise a copy of it owned by
+    ``owner``. Copying the nodes of a path is what keeps snapshots intact.
+    """
+    if owner is None or node.owner is owner:
+        return node
+    copy = _OWNED_TYPES[type(node)](node.key, node.value, node.priority, owner)
+    copy.left = node.left
+    copy.right = node.right
+    copy.size = node.size
+    if isinstance(node, AggregateNode):
+        copy.agg = node.agg
+    return copy
+
+
+def _size(node):
+    """
+    Returns the size of a subtree (0 for an empty one).
+    """
+    return node.size if node is not None else 0
+
+
+def _update(node, combine=None):
+    """
+    Recomputes the subtree size of a node from its children, and the
+    subtree aggregate (left, own value, right) if ``combine`` is given.
+    """
+    left = node.left
+    right = node.right
+    size = 1
+    if combine is None:
+        if left is not None:
+            size += left.size
+        if right is not None:
+            size += right.size
     else:
-        left, right = split(root.right, key)
-        root.right = left
-        return (root, right)
+        agg = node.value
+        if left is not None:
+            size += left.size
+            agg = combine(left.agg, agg)
+        if right is not None:
+            size += right.size
+            agg = combine(agg, right.agg)
+        node.agg = agg
+    node.size = size
+
+
+def split(root, key, combine=None, owner=None):
+    """
+    Splits the tree into two by key.
 
+    The left tree receives the keys less than or equal to ``key``, the right
+    tree receives the greater ones. Walks a single root-to-leaf path in a loop,
+    so the depth of the tree is not limited by the recursion limit. Subtree
+    sizes (and aggregates, if ``combine`` is given) of the visited nodes are
+    recomputed bottom-up afterwards. Visited nodes not belonging to ``owner``
+    are copied instead of being modified (see _own).
+    """
+    left = right = None
+    left_tail = right_tail = None
+    path = []
+    node = root
+    while node is not None:
+        if node.owner is not owner:
+            node = _own(node, owner)
+        path.append(node)
+        if key < node.key:
+            if right_tail is None:
+                right = node
+            else:
+                right_tail.left = node
+            right_tail = node
+            node = node.left
+        else:
+            if left_tail is None:
+                left = node
+            else:
+                left_tail.right = node
+            left_tail = node
+            node = node.right
+    if left_tail is not None:
+        left_tail.right = None
+    if right_tail is not None:
+        right_tail.left = None
+    for node in reversed(path):
+        _update(node, combine)
+    return (left, right)
 
-def merge(left, right):
+
+def merge(left, right, combine=None, owner=None):
     """
     Combines two Cartesian trees.
+
+    All keys of ``left`` must be less than the keys of ``right``. Walks the
+    right spine of ``left`` and the left spine of ``right`` in a loop and
+    recomputes the visited nodes like split does.
     """
-    if not left or not right:
-        return left or right
-    if left.priority > right.priority:
-        left.right = merge(left.right, right)
-        return left
+    root = parent = None
+    attach_left = False
+    path = []
+    while left is not None and right is not None:
+        if left.priority > right.priority:
+            node = left if left.owner is owner else _own(left, owner)
+            left = node.right
+            next_left = False
+        else:
+            node = right if right.owner is owner else _own(right, owner)
+            right = node.left
+            next_left = True
+        if parent is None:
+            root = node
+        elif attach_left:
+            parent.left = node
+        else:
+            parent.right = node
+        parent, attach_left = node, next_left
+        path.append(node)
+    rest = left if left is not None else right
+    if parent is None:
+        return rest
+    if attach_left:
+        parent.left = rest
     else:
-        right.left = merge(left, right.left)
-        return right
+        parent.right = rest
+    for node in reversed(path):
+        _update(node, combine)
+    return root
+
+
+def _split_out(root, key, combine=None, owner=None):
+    """
+    Splits the tree into the keys less than ``key``, the node with ``key``
+    (or None) and the keys greater than ``key``.
+    """
+    left = right = found = None
+    left_tail = right_tail = None
+    left_rest = right_rest = None
+    path = []
+    node = root
+    while node is not None:
+        if key < node.key:
+            node = _own(node, owner)
+            path.append(node)
+            if right_tail is None:
+                right = node
+            else:
+                right_tail.left = node
+            right_tail = node
+            node = node.left
+        elif key > node.key:
+            node = _own(node, owner)
+            path.append(node)
+            if left_tail is None:
+                left = node
+            else:
+                left_tail.right = node
+            left_tail = node
+            node = node.right
+        else:
+            found = node
+            left_rest, right_rest = node.left, node.right
+            break
+    if left_tail is None:
+        left = left_rest
+    else:
+        left_tail.right = left_rest
+    if right_tail is None:
+        right = right_rest
+    else:
+        right_tail.left = right_rest
+    for node in reversed(path):
+        _update(node, combine)
+    return (left, found, right)
+
+
+def _build(nodes, combine=None, owner=None):
+    """
+    Builds a Cartesian tree from nodes sorted by key in linear time.
+
+    Keeps the right spine of the tree on a stack: every new node becomes the
+    right child of the last spine node with a not lower priority and adopts
+    the popped part of the spine as its left subtree. A popped node is final,
+    so its size is computed at that moment. Nodes not belonging to ``owner``
+    are copied.
+
+    Raises:
+        ValueError: If the keys are not strictly increasing.
+    """
+    spine = []
+    for node in nodes:
+        node = _own(node, owner)
+        if spine and not spine[-1].key < node.key:
+            raise ValueError("Keys must be sorted in strictly increasing order")
+        last = None
+        while spine and spine[-1].priority < node.priority:
+            last = spine.pop()
+            _update(last, combine)
+        node.left = last
+        node.right = None
+        if spine:
+            spine[-1].right = node
+        spine.append(node)
+    for node in reversed(spine):
+        _update(node, combine)
+    return spine[0] if spine else None
+
+
+def _union(first, second, combine=None, owner=None):
+    """
+    Combines two Cartesian trees with arbitrary key sets.
+
+    For equal keys the node of ``second`` wins. The tree with the higher root
+    priority stays on top, the other one is split by its key and both halves
+    are united with the corresponding subtrees. Pending pairs are kept on an
+    explicit stack; every parent is taken before its children, so the sizes
+    are recomputed in the reverse order afterwards.
+    """
+    root = None
+    path = []
+    stack = [(None, False, first, second)]
+    while stack:
+        parent, is_left, first, second = stack.pop()
+        if first is None or second is None:
+            node = first if second is None else second
+        elif first.priority < second.priority:
+            node = _own(second, owner)
+            left, found, right = _split_out(first, node.key, combine, owner)
+            path.append(node)
+            stack.append((node, True, left, node.left))
+            stack.append((node, False, right, node.right))
+        else:
+            node = _own(first, owner)
+            left, found, right = _split_out(second, node.key, combine, owner)
+            if found is not None:
+                node.value = found.value
+            path.append(node)
+            stack.append((node, True, node.left, left))
+            stack.append((node, False, node.right, right))
+        if parent is None:
+            root = node
+        elif is_left:
+            parent.left = node
+        else:
+            parent.right = node
+    for node in reversed(path):
+        _update(node, combine)
+    return root
+
+
+def _merge_items(nodes, items, make, owner=None):
+    """
+    Merges the nodes of a tree (in key order) with sorted (key, value) pairs
+    into one list of nodes in key order.
+
+    A pair with the key of an existing node replaces the value of that node
+    (or of its copy owned by ``owner``); other pairs get new nodes created
+    by ``make(key, value)``.
+    """
+    result = []
+    nodes = iter(nodes)
+    node = next(nodes, None)
+    for key, value in items:
+        while node is not None and node.key < key:
+            result.append(node)
+            node = next(nodes, None)
+        if node is not None and not key < node.key:
+            node = _own(node, owner)
+            node.value = value
+            result.append(node)
+            node = next(nodes, None)
+        else:
+            result.append(make(key, value))
+    if node is not None:
+        result.append(node)
+        result.extend(nodes)
+    return result
+
+
+def _sorted_items(items):
+    """
+    Returns the (key, value) pairs sorted by key with the last value kept
+    for repeated keys. Already sorted input is detected in one pass.
+    """
+    items = list(items)
+    if any(not a[0] < b[0] for a, b in zip(items, items[1:])):
+        items.sort(key=lambda item: item[0])
+        unique = []
+        for item in items:
+            if unique and not unique[-1][0] < item[0]:
+                unique[-1] = item
+            else:
+                unique.append(item)
+        items = unique
+    return items
 
 
 class Treap(MutableMapping):
@@ -64,40 +441,260 @@ class Treap(MutableMapping):
     - Delete by key.
     - Check for presence.
     - Forward and reverse iterator.
+
+    Nodes carry subtree sizes, which gives order statistics and range
+    queries in O(log n + output): select, rank, irange, count_range.
+    With an Aggregate, nodes also cache the reduction of their subtree
+    values, and reduce answers range reductions in O(log n).
+
+    Trees are combined key-wise with the ``|``, ``&`` and ``-`` operators
+    and their in-place forms. For ``|`` the values of the right operand win
+    and the trees are united by split/merge in O(m log(n/m + 1)); ``&`` and
+    ``-`` keep the values of the left operand and look up the keys of the
+    smaller tree in the larger one, then build the result in linear time.
+
+    Trees are persistent: snapshot() and copy() take O(1) and share all
+    nodes. A tree takes an owner token the first time it shares its nodes;
+    from then on a write copies the nodes on its path that belong to another
+    token (path copying), so shared nodes are never modified and a
+    TreapSnapshot can be read without locks while the tree is being changed.
+    Until then the nodes carry no token and are modified in place.
     """
 
-    def __init__(self):
+    def __init__(self, aggregate=None):
         """
         Creates an empty Cartesian tree.
+
+        Args:
+            aggregate (Aggregate, optional): Reduction cached in the nodes.
         """
         self.root = None
-        self._size = 0
+        self.aggregate = aggregate
+        self._combine = aggregate.combine if aggregate is not None else None
+        self._owner = None
+
+    @classmethod
+    def from_sorted(cls, items, aggregate=None):
+        """
+        Builds a tree from (key, value) pairs in linear time.
+
+        Args:
+            items: Pairs sorted by key in strictly increasing order.
+            aggregate (Aggregate, optional): Reduction cached in the nodes.
+
+        Raises:
+            ValueError: If the keys are not strictly increasing.
+        """
+        tree = cls(aggregate)
+        nodes = (tree._node(key, value) for key, value in items)
+        tree.root = _build(nodes, tree._combine)
+        return tree
+
+    def dump(self, path):
+        """
+        Writes the tree to a file in a compact binary format.
+
+        Keys and values are pickled one by one and followed by a table of
+        fixed-size records in key order, which keeps the priorities, so
+        load() restores exactly the same tree.
+        """
+        records = bytearray()
+        with open(path, "wb") as file:
+            file.write(_HEADER.pack(_MAGIC, 0, 0))
+            offset = _HEADER.size
+            for node in self._range_nodes(None, None):
+                key = pickle.dumps(node.key, pickle.HIGHEST_PROTOCOL)
+                value = pickle.dumps(node.value, pickle.HIGHEST_PROTOCOL)
+                file.write(key)
+                file.write(value)
+                end = offset + len(key) + len(value)
+                records += _RECORD.pack(offset, offset + len(key), end, node.priority)
+                offset = end
+            file.write(records)
+            file.seek(0)
+            file.write(_HEADER.pack(_MAGIC, len(self), offset))
+
+    @classmethod
+    def load(cls, path, mmap=True, aggregate=None):
+        """
+        Reads a tree written by dump().
+
+        Args:
+            path: The file to read.
+            mmap (bool): If True, returns a read-only MappedTreap that answers
+                queries straight from the memory-mapped file, without creating
+                nodes. Otherwise builds an ordinary tree in linear time.
+            aggregate (Aggregate, optional): Reduction cached in the nodes
+                (only for ``mmap=False``).
+
+        Raises:
+            ValueError: If the file is not a dumped tree.
+        """
+        if mmap:
+            if aggregate is not None:
+                raise ValueError("A memory-mapped tree does not support aggregates")
+            return MappedTreap(path)
+        with MappedTreap(path) as mapped:
+            tree = cls(aggregate)
+            nodes = (
+                tree._node(key, value, mapped._priority(index))
+                for index, (key, value) in enumerate(mapped.items())
+            )
+            tree.root = _build(nodes, tree._combine)
+        return tree
+
+    def update(self, other=(), /, **kwargs):
+        """
+        Adds or updates elements from a mapping or an iterable of pairs.
+
+        A batch at least half the size of the tree is sorted (unless it
+        already is), merged with the nodes of the tree in key order and
+        rebuilt into a tree in linear time. Smaller batches are inserted key
+        by key: for them the O(n) rebuild costs more than the inserts.
+        """
+        if isinstance(other, Mapping):
+            items = list(other.items())
+        elif hasattr(other, "keys"):
+            items = [(key, other[key]) for key in other.keys()]
+        else:
+            items = list(other)
+        items.extend(kwargs.items())
+        if len(items) * _SMALL_BATCH_RATIO < len(self):
+            for key, value in items:
+                self[key] = value
+            return
+        owner = self._owner
+        nodes = self._range_nodes(None, None)
+        nodes = _merge_items(nodes, _sorted_items(items), self._node, owner)
+        self.root = _build(nodes, self._combine, owner)
 
     def __setitem__(self, key, value):
         """
         Adds or updates an element by key.
+
+        Takes a single descent: the value is replaced in place if the key is
+        found, otherwise a new node is attached at the end of the same path.
         """
-        if self.__contains__(key):
-            self._replace(self.root, key, value)
-        else:
-            self.root = self._insert(self.root, TreapNode(key, value))
-            self._size += 1
+        path = []
+        node = self.root
+        while node is not None:
+            if key < node.key:
+                path.append(node)
+                node = node.left
+            elif key > node.key:
+                path.append(node)
+                node = node.right
+            else:
+                path.append(node)
+                self._own_path(path)
+                path[-1].value = value
+                if self._combine is not None:
+                    self._refresh(path)
+                return
+        self._insert(path, self._node(key, value))
+
+    def setdefault(self, key, default=None):
+        """
+        Returns the value by key, inserting ``default`` if the key is absent.
+        """
+        path = []
+        node = self.root
+        while node is not None:
+            if key < node.key:
+                path.append(node)
+                node = node.left
+            elif key > node.key:
+                path.append(node)
+                node = node.right
+            else:
+                return node.value
+        self._insert(path, self._node(key, default))
+        return default
 
-    def _insert(self, root, node):
+    def _node(self, key, value, priority=None):
+        """
+        Returns a new node owned by this tree: an AggregateNode if the tree
+        has an aggregate, a plain TreapNode otherwise.
+        """
+        node_type = TreapNode if self._combine is None else AggregateNode
+        if self._owner is None:
+            return node_type(key, value, priority)
+        return _OWNED_TYPES[node_type](key, value, priority, self._owner)
+
+    def _insert(self, path, node):
         """
         Inserts a node into the tree.
+
+        ``path`` is the descent from the root to the future parent of the
+        node. The node is attached as a leaf and then lifted by rotations
+        while its priority is higher than the priority of its parent. Every
+        node on the path gains one descendant; a rotation recomputes the two
+        nodes it moves. With an aggregate the rest of the path is recomputed.
         """
-        if root is None:
-            return node
-        if node.key < root.key:
-            root.left = self._insert(root.left, node)
-            if root.left.priority > root.priority:
-                root = self._rotate_right(root)
+        combine = self._combine
+        if combine is not None:
+            _update(node, combine)
+        if not path:
+            self.root = node
+            return
+        self._own_path(path)
+        if combine is None:
+            for parent in path:
+                parent.size += 1
+        parent = path[-1]
+        if node.key < parent.key:
+            parent.left = node
         else:
-            root.right = self._insert(root.right, node)
-            if root.right.priority > root.priority:
-                root = self._rotate_left(root)
-        return root
+            parent.right = node
+        while path:
+            parent = path[-1]
+            if node.priority <= parent.priority:
+                break
+            path.pop()
+            if parent.left is node:
+                self._rotate_right(parent)
+            else:
+                self._rotate_left(parent)
+            if not path:
+                self.root = node
+            elif path[-1].left is parent:
+                path[-1].left = node
+            else:
+                path[-1].right = node
+        if combine is not None:
+            self._refresh(path)
+
+    def _own_path(self, path):
+        """
+        Makes every node of a descent path owned by this tree.
+
+        Shared nodes are replaced by copies relinked to their (already owned)
+        parents. An owned node only has owned ancestors, so in the common case
+        the check of the deepest node is enough.
+        """
+        owner = self._owner
+        if not path or path[-1].owner is owner:
+            return
+        parent = None
+        for index, node in enumerate(path):
+            if node.owner is not owner:
+                copy = _own(node, owner)
+                if parent is None:
+                    self.root = copy
+                elif parent.left is node:
+                    parent.left = copy
+                else:
+                    parent.right = copy
+                path[index] = node = copy
+            parent = node
+
+    def _refresh(self, path):
+        """
+        Recomputes the nodes of a descent path bottom-up.
+        """
+        combine = self._combine
+        for node in reversed(path):
+            _update(node, combine)
 
     def _rotate_right(self, root):
         """
@@ -106,6 +703,8 @@ class Treap(MutableMapping):
         left = root.left
         root.left = left.right
         left.right = root
+        _update(root, self._combine)
+        _update(left, self._combine)
         return left
 
     def _rotate_left(self, root):
@@ -115,21 +714,10 @@ class Treap(MutableMapping):
         right = root.right
         root.right = right.left
         right.left = root
+        _update(root, self._combine)
+        _update(right, self._combine)
         return right
 
-    def _replace(self, root, key, value):
-        """
-        Replaces the value by key.
-        """
-        if root is None:
-            return
-        if key < root.key:
-            self._replace(root.left, key, value)
-        elif key > root.key:
-            self._replace(root.right, key, value)
-        else:
-            root.value = value
-
     def __getitem__(self, key):
         """
         Returns the value by key.
@@ -143,37 +731,81 @@ class Treap(MutableMapping):
         """
         Returns a node by key (or None).
         """
-        if root is None:
-            return None
-        if key < root.key:
-            return self._get_node(root.left, key)
-        elif key > root.key:
-            return self._get_node(root.right, key)
-        else:
-            return root
+        node = root
+        while node is not None:
+            if key < node.key:
+                node = node.left
+            elif key > node.key:
+                node = node.right
+            else:
+                return node
+        return None
+
+    def get(self, key, default=None):
+        """
+        Returns the value by key, or ``default`` if the key is absent.
+        """
+        node = self._get_node(self.root, key)
+        if node is None:
+            return default
+        return node.value
 
     def __delitem__(self, key):
         """
         Removes an element by key.
         """
-        if not self.__contains__(key):
+        if self._delete(key) is None:
             raise KeyError(key)
-        self.root = self._delete(self.root, key)
-        self._size -= 1
 
-    def _delete(self, root, key):
+    def pop(self, key, default=_MISSING):
+        """
+        Removes an element by key and returns its value.
+
+        Returns ``default`` if the key is absent and it is given,
+        otherwise raises KeyError.
         """
-        Removes a node from the tree.
+        node = self._delete(key)
+        if node is not None:
+            return node.value
+        if default is _MISSING:
+            raise KeyError(key)
+        return default
+
+    def _delete(self, key):
         """
-        if root is None:
+        Removes a node from the tree and returns it (or None).
+
+        The found node is replaced by the merge of its subtrees and every
+        node on the descent path loses one descendant (or is recomputed, if the
+        tree has an aggregate).
+        """
+        path = []
+        node = self.root
+        while node is not None:
+            if key < node.key:
+                path.append(node)
+                node = node.left
+            elif key > node.key:
+                path.append(node)
+                node = node.right
+            else:
+                break
+        else:
             return None
-        if key < root.key:
-            root.left = self._delete(root.left, key)
-        elif key > root.key:
-            root.right = self._delete(root.right, key)
+        self._own_path(path)
+        subtree = merge(node.left, node.right, self._combine, self._owner)
+        if not path:
+            self.root = subtree
+        elif path[-1].left is node:
+            path[-1].left = subtree
+        else:
+            path[-1].right = subtree
+        if self._combine is None:
+            for parent in path:
+                parent.size -= 1
         else:
-            root = merge(root.left, root.right)
-        return root
+            self._refresh(path)
+        return node
 
     def __contains__(self, key):
         """
@@ -185,49 +817,208 @@ class Treap(MutableMapping):
         """
         Returns the number of elements in the tree.
         """
-        return self._size
+        return _size(self.root)
+
+    def select(self, index):
+        """
+        Returns the key with the given position in the sorted order.
+
+        Negative positions count from the end, as for lists.
+
+        Raises:
+            IndexError: If the position is out of range.
+        """
+        size = _size(self.root)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("Treap index out of range")
+        node = self.root
+        while True:
+            left_size = _size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index > left_size:
+                index -= left_size + 1
+                node = node.right
+            else:
+                return node.key
+
+    def rank(self, key):
+        """
+        Returns the number of keys less than ``key``.
+
+        The key does not have to be present in the tree.
+        """
+        rank = 0
+        node = self.root
+        while node is not None:
+            if node.key < key:
+                rank += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return rank
+
+    def count_range(self, lo=None, hi=None):
+        """
+        Returns the number of keys in [lo, hi).
+
+        A bound set to None is not applied.
+        """
+        upper = len(self) if hi is None else self.rank(hi)
+        lower = 0 if lo is None else self.rank(lo)
+        return max(upper - lower, 0)
+
+    def reduce(self, lo=None, hi=None):
+        """
+        Returns the aggregate of the values with keys in [lo, hi).
+
+        A bound set to None is not applied. Descends to the topmost node
+        inside the range and combines the cached aggregates along the two
+        boundary paths below it, so the answer takes O(log n).
+
+        Raises:
+            TypeError: If the tree was created without an aggregate.
+        """
+        if self.aggregate is None:
+            raise TypeError("Treap has no aggregate to reduce with")
+        combine = self._combine
+        identity = self.aggregate.identity
+        node = self.root
+        while node is not None:
+            if lo is not None and node.key < lo:
+                node = node.right
+            elif hi is not None and not node.key < hi:
+                node = node.left
+            else:
+                break
+        if node is None:
+            return identity
+        result = identity
+        current = node.left
+        while current is not None:
+            if lo is not None and current.key < lo:
+                current = current.right
+            else:
+                part = current.value
+                if current.right is not None:
+                    part = combine(part, current.right.agg)
+                result = combine(part, result)
+                current = current.left
+        result = combine(result, node.value)
+        current = node.right
+        while current is not None:
+            if hi is not None and not current.key < hi:
+                current = current.left
+            else:
+                if current.left is not None:
+                    result = combine(result, current.left.agg)
+                result = combine(result, current.value)
+                current = current.right
+        return result
+
+    def irange(self, lo=None, hi=None):
+        """
+        Returns a lazy iterator over the keys in [lo, hi).
+
+        A bound set to None is not applied.
+        """
+        for node in self._range_nodes(lo, hi):
+            yield node.key
+
+    def irange_items(self, lo=None, hi=None):
+        """
+        Returns a lazy iterator over (key, value) pairs with keys in [lo, hi).
+        """
+        for node in self._range_nodes(lo, hi):
+            yield (node.key, node.value)
+
+    def _range_nodes(self, lo, hi):
+        """
+        Yields the nodes with keys in [lo, hi) in order.
+
+        The stack is seeded with the ancestors of the first key not less than
+        ``lo``, which takes one descent; the walk stops at the first key not
+        less than ``hi``.
+        """
+        stack = []
+        node = self.root
+        while node is not None:
+            if lo is not None and node.key < lo:
+                node = node.right
+            else:
+                stack.append(node)
+                node = node.left
+        while stack:
+            node = stack.pop()
+            if hi is not None and not node.key < hi:
+                return
+            yield node
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
 
     def __iter__(self):
         """
         Returns a forward iterator over the keys (in-order).
         """
-        yield from self._inorder(self.root)
+        return self._inorder(self.root)
 
     def _inorder(self, root):
         """
         Direct bypass.
+
+        Uses an explicit stack of the pending ancestors, so every key is
+        yielded in amortized O(1) regardless of the depth of the tree.
         """
-        if root:
-            yield from self._inorder(root.left)
-            yield root.key
-            yield from self._inorder(root.right)
+        stack = []
+        node = root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.key
+            node = node.right
 
     def __reversed__(self):
         """
         Returns a reversed in-order iterator over the keys.
         """
-        yield from self._reversed_inorder(self.root)
+        return self._reversed_inorder(self.root)
 
     def _reversed_inorder(self, root):
         """
         Reverse bypass.
         """
-        if root:
-            yield from self._reversed_inorder(root.right)
-            yield root.key
-            yield from self._reversed_inorder(root.left)
+        stack = []
+        node = root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.right
+            node = stack.pop()
+            yield node.key
+            node = node.left
 
     def items(self):
         """
         Returns an iterator over (key, value) pairs.
         """
-        yield from self._items(self.root)
+        return self._items(self.root)
 
     def _items(self, root):
-        if root:
-            yield from self._items(root.left)
-            yield (root.key, root.value)
-            yield from self._items(root.right)
+        stack = []
+        node = root
+        while stack or node is not None:
+            while node is not None:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield (node.key, node.value)
+            node = node.right
 
     def keys(self):
         """
@@ -242,6 +1033,349 @@ class Treap(MutableMapping):
         for _, value in self.items():
             yield value
 
+    def copy(self):
+        """
+        Returns a shallow copy of the tree in O(1).
+
+        Both trees share the nodes and copy them on write.
+        """
+        tree = self._empty()
+        tree.root = self._share()
+        tree._owner = object()
+        return tree
+
+    def snapshot(self):
+        """
+        Returns an immutable view of the current contents in O(1).
+
+        The view shares the nodes with the tree; later writes to the tree
+        copy the nodes they touch, so the view can be read from other
+        threads without locks. Call it from the writer (or under the lock
+        that serializes the writers).
+        """
+        view = TreapSnapshot(self.aggregate)
+        view.root = self._share()
+        return view
+
+    def _share(self):
+        """
+        Returns the root for sharing with another tree.
+
+        The tree switches to a fresh owner token, so from now on it copies
+        every current node before modifying it.
+        """
+        self._owner = object()
+        return self.root
+
+    def _empty(self):
+        """
+        Returns an empty mutable tree with the same aggregate.
+        """
+        return type(self)(self.aggregate)
+
+    def __or__(self, other):
+        """
+        Returns the union of two trees; values of ``other`` win.
+        """
+        if not isinstance(other, Treap):
+            return NotImplemented
+        result = self.copy()
+        result |= other
+        return result
+
+    def __ior__(self, other):
+        """
+        Adds or updates the elements of ``other`` (a Treap or any argument
+        accepted by update) in place.
+        """
+        if not isinstance(other, Treap):
+            self.update(other)
+        elif len(other) * _SMALL_BATCH_RATIO < len(self):
+            for key, value in other.items():
+                self[key] = value
+        else:
+            if other.aggregate is self.aggregate:
+                batch = other._share()
+                if self._owner is None:
+                    # The shared nodes must be copied before being relinked.
+                    self._owner = object()
+            else:
+                # Cached aggregates of ``other`` are not ours: rebuild them.
+                nodes = [
+                    self._node(node.key, node.value, node.priority)
+                    for node in other._range_nodes(None, None)
+                ]
+                batch = _build(nodes, self._combine)
+            self.root = _union(self.root, batch, self._combine, self._owner)
+        return self
+
+    def __and__(self, other):
+        """
+        Returns the elements whose keys are present in both trees.
+        """
+        if not isinstance(other, Treap):
+            return NotImplemented
+        tree = self._empty()
+        nodes = [
+            tree._node(node.key, node.value, node.priority)
+            for node in self._common_nodes(other)
+        ]
+        tree.root = _build(nodes, self._combine)
+        return tree
+
+    def __iand__(self, other):
+        """
+        Keeps only the elements whose keys are present in ``other``.
+        """
+        if not isinstance(other, Treap):
+            return NotImplemented
+        nodes = list(self._common_nodes(other))
+        self.root = _build(nodes, self._combine, self._owner)
+        return self
+
+    def _common_nodes(self, other):
+        """
+        Yields the nodes of this tree whose keys are present in ``other``,
+        in key order, walking the smaller of the two trees.
+        """
+        if len(self) <= len(other):
+            for node in self._range_nodes(None, None):
+                if other._get_node(other.root, node.key) is not None:
+                    yield node
+        else:
+            for key in other:
+                node = self._get_node(self.root, key)
+                if node is not None:
+                    yield node
+
+    def __sub__(self, other):
+        """
+        Returns the elements whose keys are absent from ``other``.
+        """
+        if not isinstance(other, Treap):
+            return NotImplemented
+        if len(other) < len(self):
+            result = self.copy()
+            result -= other
+            return result
+        tree = self._empty()
+        nodes = [
+            tree._node(node.key, node.value, node.priority)
+            for node in self._range_nodes(None, None)
+            if other._get_node(other.root, node.key) is None
+        ]
+        tree.root = _build(nodes, self._combine)
+        return tree
+
+    def __isub__(self, other):
+        """
+        Removes the elements whose keys are present in ``other``.
+        """
+        if not isinstance(other, Treap):
+            return NotImplemented
+        if len(other) < len(self):
+            for key in other:
+                self._delete(key)
+        else:
+            nodes = [
+                node
+                for node in self._range_nodes(None, None)
+                if other._get_node(other.root, node.key) is None
+            ]
+            self.root = _build(nodes, self._combine, self._owner)
+        return self
+
+    def __repr__(self):
+        """
+        String representation of a tree.
+        """
+        return "{" + ", ".join(f"{k}: {v}" for k, v in self.items()) + "}"
+
+
+class TreapSnapshot(Treap):
+    """
+    Immutable view of a Treap returned by Treap.snapshot().
+
+    Supports every read operation of Treap; operations that would modify
+    the view raise TypeError. copy() and the set operators return ordinary
+    mutable trees.
+    """
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("TreapSnapshot is read-only")
+
+    __setitem__ = _read_only
+    __delitem__ = _read_only
+    setdefault = _read_only
+    pop = _read_only
+    popitem = _read_only
+    clear = _read_only
+    update = _read_only
+    __ior__ = _read_only
+    __iand__ = _read_only
+    __isub__ = _read_only
+
+    def snapshot(self):
+        """
+        Returns the view itself: it never changes.
+        """
+        return self
+
+    def _empty(self):
+        return Treap(self.aggregate)
+
+
+class MappedTreap(Mapping):
+    """
+    Read-only tree backed by a memory-mapped file written by Treap.dump().
+
+    Lookups binary-search the record table and unpickle only the keys they
+    compare, iteration walks the records in order, so neither start-up time
+    nor resident memory depends on the size of the tree.
+    """
+
+    def __init__(self, path):
+        """
+        Maps the file into memory.
+
+        Raises:
+            ValueError: If the file is not a dumped tree.
+        """
+        with open(path, "rb") as file:
+            self._mmap = mmap_module.mmap(
+                file.fileno(), 0, access=mmap_module.ACCESS_READ
+            )
+        self._buffer = memoryview(self._mmap)
+        if len(self._buffer) < _HEADER.size:
+            self.close()
+            raise ValueError(f"{path} is not a dumped Treap")
+        magic, self._size, self._records = _HEADER.unpack_from(self._buffer)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a dumped Treap")
+
+    def close(self):
+        """
+        Unmaps the file.
+        """
+        self._buffer.release()
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _record(self, index):
+        return _RECORD.unpack_from(self._buffer, self._records + index * _RECORD.size)
+
+    def _key(self, index):
+        key_start, value_start, _, _ = self._record(index)
+        return pickle.loads(self._buffer[key_start:value_start])
+
+    def _value(self, index):
+        _, value_start, value_end, _ = self._record(index)
+        return pickle.loads(self._buffer[value_start:value_end])
+
+    def _priority(self, index):
+        return self._record(index)[3]
+
+    def _bisect(self, key):
+        """
+        Returns the index of the first key not less than ``key``.
+        """
+        lo, hi = 0, self._size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _find(self, key):
+        """
+        Returns the index of the key (or -1).
+        """
+        index = self._bisect(key)
+        if index < self._size and not key < self._key(index):
+            return index
+        return -1
+
+    def __getitem__(self, key):
+        """
+        Returns the value by key.
+        """
+        index = self._find(key)
+        if index < 0:
+            raise KeyError(key)
+        return self._value(index)
+
+    def __contains__(self, key):
+        """
+        Checks if a key exists in a tree.
+        """
+        return self._find(key) >= 0
+
+    def __len__(self):
+        """
+        Returns the number of elements in the tree.
+        """
+        return self._size
+
+    def __iter__(self):
+        """
+        Returns a forward iterator over the keys (in-order).
+        """
+        for index in range(self._size):
+            yield self._key(index)
+
+    def __reversed__(self):
+        """
+        Returns a reversed in-order iterator over the keys.
+        """
+        for index in reversed(range(self._size)):
+            yield self._key(index)
+
+    def items(self):
+        """
+        Returns an iterator over (key, value) pairs.
+        """
+        return self.irange_items()
+
+    def select(self, index):
+        """
+        Returns the key with the given position in the sorted order.
+        """
+        return self._key(range(self._size)[index])
+
+    def rank(self, key):
+        """
+        Returns the number of keys less than ``key``.
+        """
+        return self._bisect(key)
+
+    def irange(self, lo=None, hi=None):
+        """
+        Returns a lazy iterator over the keys in [lo, hi).
+        """
+        for key, _ in self.irange_items(lo, hi):
+            yield key
+
+    def irange_items(self, lo=None, hi=None):
+        """
+        Returns a lazy iterator over (key, value) pairs with keys in [lo, hi).
+        """
+        index = 0 if lo is None else self._bisect(lo)
+        while index < self._size:
+            key_start, value_start, value_end, _ = self._record(index)
+            key = pickle.loads(self._buffer[key_start:value_start])
+            if hi is not None and not key < hi:
+                return
+            yield (key, pickle.loads(self._buffer[value_start:value_end]))
+            index += 1
+
     def __repr__(self):
         """
         String representation of a tree.
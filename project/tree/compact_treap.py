@@ -0,0 +1,316 @@
+import random
+from array import array
+from collections.abc import MutableMapping
+
+from project.tree.cartesian_tree import _MISSING
+
+NIL = -1
+
+
+class CompactTreap(MutableMapping):
+    """
+    Cartesian tree with struct-of-arrays node storage.
+
+    Has the same mapping interface as Treap, but keeps no node objects:
+    a node is an index into parallel pools. Child links are stored in
+    ``array('i')``, priorities in ``array('d')``, keys and values in two
+    plain lists. Slots of removed nodes are reused through a free list
+    threaded through the left links.
+
+    Attributes:
+    root: Index of the root node (NIL for an empty tree).
+    """
+
+    def __init__(self):
+        """
+        Creates an empty compact Cartesian tree.
+        """
+        self.root = NIL
+        self._size = 0
+        self._keys = []
+        self._values = []
+        self._left = array("i")
+        self._right = array("i")
+        self._priority = array("d")
+        self._free = NIL
+
+    def _new_node(self, key, value):
+        """
+        Allocates a node slot and returns its index.
+        """
+        priority = random.random()
+        index = self._free
+        if index == NIL:
+            index = len(self._keys)
+            self._keys.append(key)
+            self._values.append(value)
+            self._left.append(NIL)
+            self._right.append(NIL)
+            self._priority.append(priority)
+        else:
+            self._free = self._left[index]
+            self._keys[index] = key
+            self._values[index] = value
+            self._left[index] = NIL
+            self._right[index] = NIL
+            self._priority[index] = priority
+        return index
+
+    def _release(self, index):
+        """
+        Returns a node slot to the free list.
+        """
+        self._keys[index] = None
+        self._values[index] = None
+        self._left[index] = self._free
+        self._right[index] = NIL
+        self._free = index
+
+    def _find(self, key):
+        """
+        Returns the index of the node with the key (or NIL).
+        """
+        keys = self._keys
+        left = self._left
+        right = self._right
+        node = self.root
+        while node != NIL:
+            node_key = keys[node]
+            if key < node_key:
+                node = left[node]
+            elif key > node_key:
+                node = right[node]
+            else:
+                return node
+        return NIL
+
+    def _descend(self, key):
+        """
+        Returns the descent path to the key and the node found (or NIL).
+        """
+        keys = self._keys
+        left = self._left
+        right = self._right
+        path = []
+        node = self.root
+        while node != NIL:
+            node_key = keys[node]
+            if key < node_key:
+                path.append(node)
+                node = left[node]
+            elif key > node_key:
+                path.append(node)
+                node = right[node]
+            else:
+                break
+        return path, node
+
+    def _insert(self, path, node):
+        """
+        Attaches a node below the end of the path and lifts it by rotations.
+        """
+        self._size += 1
+        if not path:
+            self.root = node
+            return
+        keys = self._keys
+        left = self._left
+        right = self._right
+        priority = self._priority
+        parent = path[-1]
+        if keys[node] < keys[parent]:
+            left[parent] = node
+        else:
+            right[parent] = node
+        node_priority = priority[node]
+        while path:
+            parent = path.pop()
+            if node_priority <= priority[parent]:
+                break
+            if left[parent] == node:
+                left[parent] = right[node]
+                right[node] = parent
+            else:
+                right[parent] = left[node]
+                left[node] = parent
+            if not path:
+                self.root = node
+            elif left[path[-1]] == parent:
+                left[path[-1]] = node
+            else:
+                right[path[-1]] = node
+
+    def _merge(self, first, second):
+        """
+        Combines two subtrees given by root indices.
+        """
+        left = self._left
+        right = self._right
+        priority = self._priority
+        root = parent = NIL
+        attach_left = False
+        while first != NIL and second != NIL:
+            if priority[first] > priority[second]:
+                node, first = first, right[first]
+                next_left = False
+            else:
+                node, second = second, left[second]
+                next_left = True
+            if parent == NIL:
+                root = node
+            elif attach_left:
+                left[parent] = node
+            else:
+                right[parent] = node
+            parent, attach_left = node, next_left
+        rest = first if first != NIL else second
+        if parent == NIL:
+            return rest
+        if attach_left:
+            left[parent] = rest
+        else:
+            right[parent] = rest
+        return root
+
+    def _delete(self, key):
+        """
+        Unlinks the node with the key and returns its value.
+        """
+        path, node = self._descend(key)
+        if node == NIL:
+            return _MISSING
+        subtree = self._merge(self._left[node], self._right[node])
+        if not path:
+            self.root = subtree
+        elif self._left[path[-1]] == node:
+            self._left[path[-1]] = subtree
+        else:
+            self._right[path[-1]] = subtree
+        value = self._values[node]
+        self._release(node)
+        self._size -= 1
+        return value
+
+    def __setitem__(self, key, value):
+        """
+        Adds or updates an element by key.
+        """
+        path, node = self._descend(key)
+        if node != NIL:
+            self._values[node] = value
+        else:
+            self._insert(path, self._new_node(key, value))
+
+    def setdefault(self, key, default=None):
+        """
+        Returns the value by key, inserting ``default`` if the key is absent.
+        """
+        path, node = self._descend(key)
+        if node != NIL:
+            return self._values[node]
+        self._insert(path, self._new_node(key, default))
+        return default
+
+    def __getitem__(self, key):
+        """
+        Returns the value by key.
+        """
+        node = self._find(key)
+        if node == NIL:
+            raise KeyError(key)
+        return self._values[node]
+
+    def get(self, key, default=None):
+        """
+        Returns the value by key, or ``default`` if the key is absent.
+        """
+        node = self._find(key)
+        if node == NIL:
+            return default
+        return self._values[node]
+
+    def __delitem__(self, key):
+        """
+        Removes an element by key.
+        """
+        if self._delete(key) is _MISSING:
+            raise KeyError(key)
+
+    def pop(self, key, default=_MISSING):
+        """
+        Removes an element by key and returns its value.
+        """
+        value = self._delete(key)
+        if value is not _MISSING:
+            return value
+        if default is _MISSING:
+            raise KeyError(key)
+        return default
+
+    def __contains__(self, key):
+        """
+        Checks if a key exists in a tree.
+        """
+        return self._find(key) != NIL
+
+    def __len__(self):
+        """
+        Returns the number of elements in the tree.
+        """
+        return self._size
+
+    def _inorder(self, reverse=False):
+        """
+        Yields node indices in key order using an explicit stack.
+        """
+        first, second = self._left, self._right
+        if reverse:
+            first, second = second, first
+        stack = []
+        node = self.root
+        while stack or node != NIL:
+            while node != NIL:
+                stack.append(node)
+                node = first[node]
+            node = stack.pop()
+            yield node
+            node = second[node]
+
+    def __iter__(self):
+        """
+        Returns a forward iterator over the keys (in-order).
+        """
+        keys = self._keys
+        for node in self._inorder():
+            yield keys[node]
+
+    def __reversed__(self):
+        """
+        Returns a reversed in-order iterator over the keys.
+        """
+        keys = self._keys
+        for node in self._inorder(reverse=True):
+            yield keys[node]
+
+    def items(self):
+        """
+        Returns an iterator over (key, value) pairs.
+        """
+        keys = self._keys
+        values = self._values
+        for node in self._inorder():
+            yield (keys[node], values[node])
+
+    def values(self):
+        """
+        Returns an iterator over values.
+        """
+        values = self._values
+        for node in self._inorder():
+            yield values[node]
+
+    def __repr__(self):
+        """
+        String representation of a tree.
+        """
+        return "{" + ", ".join(f"{k}: {v}" for k, v in self.items()) + "}"
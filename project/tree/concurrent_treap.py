@@ -0,0 +1,202 @@
+import threading
+from bisect import bisect_right
+from collections.abc import MutableMapping
+
+from project.tree.cartesian_tree import _MISSING, Treap, TreapSnapshot, merge
+
+
+class ConcurrentTreap(MutableMapping):
+    """
+    Thread-safe Cartesian tree sharded by key range.
+
+    Keys are distributed over shards by sorted ``boundaries``: shard i holds
+    the keys in [boundaries[i - 1], boundaries[i]). Every shard is a Treap
+    guarded by its own lock, so operations on keys of different shards do
+    not wait for each other. Iteration and range queries read Treap
+    snapshots taken under the locks, so they never see a torn tree and do
+    not block writers while walking.
+
+    Attributes:
+    boundaries: Sorted keys separating the shards.
+    aggregate: Reduction cached in the nodes of every shard (or None).
+    """
+
+    def __init__(self, boundaries=(), aggregate=None):
+        """
+        Creates an empty sharded tree.
+
+        Args:
+            boundaries: Keys in strictly increasing order; n boundaries give
+                n + 1 shards.
+            aggregate (Aggregate, optional): Reduction cached in the nodes.
+
+        Raises:
+            ValueError: If the boundaries are not strictly increasing.
+        """
+        self.boundaries = list(boundaries)
+        if any(not a < b for a, b in zip(self.boundaries, self.boundaries[1:])):
+            raise ValueError("Boundaries must be sorted in strictly increasing order")
+        self.aggregate = aggregate
+        self._shards = [Treap(aggregate) for _ in range(len(self.boundaries) + 1)]
+        self._locks = [threading.Lock() for _ in self._shards]
+
+    def _index(self, key):
+        """
+        Returns the index of the shard responsible for the key.
+        """
+        return bisect_right(self.boundaries, key)
+
+    def __getitem__(self, key):
+        """
+        Returns the value by key.
+        """
+        index = self._index(key)
+        with self._locks[index]:
+            return self._shards[index][key]
+
+    def get(self, key, default=None):
+        """
+        Returns the value by key, or ``default`` if the key is absent.
+        """
+        index = self._index(key)
+        with self._locks[index]:
+            return self._shards[index].get(key, default)
+
+    def __contains__(self, key):
+        """
+        Checks if a key exists in the tree.
+        """
+        index = self._index(key)
+        with self._locks[index]:
+            return key in self._shards[index]
+
+    def __setitem__(self, key, value):
+        """
+        Adds or updates an element by key.
+        """
+        index = self._index(key)
+        with self._locks[index]:
+            self._shards[index][key] = value
+
+    def setdefault(self, key, default=None):
+        """
+        Returns the value by key, inserting ``default`` if the key is absent.
+        """
+        index = self._index(key)
+        with self._locks[index]:
+            return self._shards[index].setdefault(key, default)
+
+    def __delitem__(self, key):
+        """
+        Removes an element by key.
+        """
+        index = self._index(key)
+        with self._locks[index]:
+            del self._shards[index][key]
+
+    def pop(self, key, default=_MISSING):
+        """
+        Removes an element by key and returns its value.
+        """
+        index = self._index(key)
+        with self._locks[index]:
+            if default is _MISSING:
+                return self._shards[index].pop(key)
+            return self._shards[index].pop(key, default)
+
+    def update(self, other=(), /, **kwargs):
+        """
+        Adds or updates elements, taking every shard lock once per batch.
+        """
+        items = other.items() if hasattr(other, "items") else other
+        batches = [[] for _ in self._shards]
+        for key, value in items:
+            batches[self._index(key)].append((key, value))
+        for key, value in kwargs.items():
+            batches[self._index(key)].append((key, value))
+        for index, batch in enumerate(batches):
+            if batch:
+                with self._locks[index]:
+                    self._shards[index].update(batch)
+
+    def __len__(self):
+        """
+        Returns the number of elements (shards are counted one by one).
+        """
+        total = 0
+        for lock, shard in zip(self._locks, self._shards):
+            with lock:
+                total += len(shard)
+        return total
+
+    def _views(self, first=0, last=None):
+        """
+        Returns snapshots of the shards first..last taken under their locks.
+
+        The locks are acquired in shard order and held together, so the
+        views are consistent with each other.
+        """
+        if last is None:
+            last = len(self._shards) - 1
+        locks = self._locks[first : last + 1]
+        for lock in locks:
+            lock.acquire()
+        try:
+            return [shard.snapshot() for shard in self._shards[first : last + 1]]
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+    def snapshot(self):
+        """
+        Returns a consistent immutable view of the whole tree.
+
+        The shard snapshots are merged along their spines into one
+        TreapSnapshot; merging copies the spine nodes instead of modifying
+        the shards.
+        """
+        view = TreapSnapshot(self.aggregate)
+        owner = object()
+        root = None
+        for shard in self._views():
+            root = merge(root, shard.root, view._combine, owner)
+        view.root = root
+        return view
+
+    def __iter__(self):
+        """
+        Returns a forward iterator over the keys (in-order).
+        """
+        for view in self._views():
+            yield from view
+
+    def items(self):
+        """
+        Returns an iterator over (key, value) pairs.
+        """
+        for view in self._views():
+            yield from view.items()
+
+    def values(self):
+        """
+        Returns an iterator over values.
+        """
+        for view in self._views():
+            yield from view.values()
+
+    def irange(self, lo=None, hi=None):
+        """
+        Returns a lazy iterator over the keys in [lo, hi).
+
+        Only the shards overlapping the range are locked and snapshotted.
+        """
+        first = 0 if lo is None else self._index(lo)
+        last = len(self._shards) - 1 if hi is None else self._index(hi)
+        for view in self._views(first, last):
+            yield from view.irange(lo, hi)
+
+    def __repr__(self):
+        """
+        String representation of a tree.
+        """
+        return "{" + ", ".join(f"{k}: {v}" for k, v in self.items()) + "}"
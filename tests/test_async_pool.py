@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+import pytest
+from project.thread_pool.async_pool import AsyncPool
+from project.thread_pool.thread_pool import ThreadPool
+
+
+def test_await_result_wrapper():
+    pool = ThreadPool(2)
+
+    async def main():
+        first = pool.enqueue(lambda: time.sleep(0.05) or "slow")
+        second = pool.enqueue(lambda: "fast")
+        await asyncio.sleep(0.01)
+        return await first, await second
+
+    assert asyncio.run(main()) == ("slow", "fast")
+    pool.dispose()
+
+
+def test_await_error():
+    pool = ThreadPool(2)
+
+    async def main():
+        return await pool.enqueue(divmod, 1, 0)
+
+    with pytest.raises(ZeroDivisionError):
+        asyncio.run(main())
+    pool.dispose()
+
+
+def test_many_awaits_do_not_block_threads():
+    pool = ThreadPool(2)
+    release = threading.Event()
+
+    async def main():
+        blocked = [pool.enqueue(release.wait, 2) for _ in range(2)]
+        waiting = [pool.enqueue(abs, -i) for i in range(1000)]
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(*blocked)
+        return await asyncio.gather(*waiting)
+
+    assert asyncio.run(main()) == list(range(1000))
+    pool.dispose()
+
+
+def test_async_pool_bounded_concurrency():
+    running = []
+    peak = []
+
+    async def job(x):
+        running.append(x)
+        peak.append(len(running))
+        await asyncio.sleep(0.01)
+        running.remove(x)
+        return x * 2
+
+    async def main():
+        async with AsyncPool(3) as pool:
+            results = await pool.map(job, range(10))
+            sync = await pool.submit(sum, [1, 2, 3])
+            coroutine = await pool.submit(job(5))
+        return results, sync, coroutine
+
+    results, sync, coroutine = asyncio.run(main())
+    assert results == [x * 2 for x in range(10)]
+    assert sync == 6
+    assert coroutine == 10
+    assert max(peak) == 3
+
+
+def test_async_pool_invalid_size():
+    with pytest.raises(ValueError):
+        AsyncPool(0)
+
+
+def test_async_pool_exit_does_not_block_loop():
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        ticker = asyncio.ensure_future(tick())
+        async with AsyncPool(1) as pool:
+            pool.pool.enqueue(time.sleep, 0.3)
+        ticker.cancel()
+        return pool
+
+    started = time.perf_counter()
+    pool = asyncio.run(main())
+    assert time.perf_counter() - started >= 0.3
+    assert len(ticks) >= 10, "The loop must keep running while the pool closes"
+    assert not any(thread.is_alive() for thread in pool.pool.threads)
@@ -0,0 +1,82 @@
+import time
+import pytest
+from project.thread_pool.dag import TaskGraph
+from project.thread_pool.thread_pool import ThreadPool
+
+
+@pytest.fixture
+def pool():
+    pool = ThreadPool(4)
+    yield pool
+    pool.dispose()
+
+
+def sleeping(seconds, value):
+    def task(*_):
+        time.sleep(seconds)
+        return value
+
+    return task
+
+
+def test_diamond(pool):
+    data = list(range(10))
+    graph = TaskGraph()
+    graph.add("sum", lambda left, right: left + right, deps=["left", "right"])
+    graph.add("source", lambda: data)
+    graph.add("left", lambda items: sum(items[:5]), deps=["source"])
+    graph.add("right", lambda items: sum(items[5:]), deps=["source"])
+    graph.add("same", lambda items: items, deps=["source"])
+
+    run = graph.run(pool, timeout=2)
+
+    assert run.results["sum"] == sum(data)
+    assert run.results["same"] is data, "Results must be passed without copying"
+    assert graph.order().index("source") == 0
+
+
+def test_independent_branches_overlap(pool):
+    graph = TaskGraph()
+    graph.add("a", sleeping(0.1, 1))
+    graph.add("b", sleeping(0.1, 2))
+    graph.add("c", sleeping(0.05, 3), deps=["a"])
+    graph.add("d", lambda a, b, c: a + b + c, deps=["a", "b", "c"])
+
+    run = graph.run(pool, timeout=2)
+
+    assert run.results["d"] == 6
+    assert run.wall_time < 0.2
+    path, length = run.critical_path()
+    assert path == ["a", "c", "d"]
+    assert 0.15 <= length < run.wall_time + 0.01
+
+
+def test_failure_skips_dependents(pool):
+    graph = TaskGraph()
+    graph.add("ok", lambda: 1)
+    graph.add("bad", lambda: 1 / 0)
+    graph.add("child", lambda ok, bad: ok + bad, deps=["ok", "bad"])
+    graph.add("grandchild", lambda child: child, deps=["child"])
+
+    with pytest.raises(ZeroDivisionError):
+        graph.run(pool, timeout=2)
+
+
+def test_invalid_graphs(pool):
+    graph = TaskGraph()
+    graph.add("a", lambda b: b, deps=["b"])
+    with pytest.raises(ValueError):
+        graph.run(pool)
+    graph.add("b", lambda a: a, deps=["a"])
+    with pytest.raises(ValueError):
+        graph.order()
+    with pytest.raises(ValueError):
+        graph.add("a", lambda: None)
+    assert TaskGraph().run(pool).results == {}
+
+
+def test_timeout(pool):
+    graph = TaskGraph()
+    graph.add("slow", sleeping(0.3, None))
+    with pytest.raises(TimeoutError):
+        graph.run(pool, timeout=0.05)
@@ -1,5 +1,13 @@
+import json
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
-from project.Decorators.cache import cached
+from project.Decorators import cache as cache_module
+from project.Decorators.cache import CacheInfo, DiskCache, cached, content_key
+from project.vector_and_matrix.matrix import matrix_multiplication
 
 
 def test_cached_decorator():
@@ -128,3 +136,497 @@ def test_cached_no_args():
 
     assert get_value() == 42
     assert call_count == 1
+
+
+def counting(calls, **options):
+    """
+    Returns a cached identity function that records its calls.
+    """
+
+    @cached(**options)
+    def identity(x):
+        calls.append(x)
+        return x
+
+    return identity
+
+
+def test_cached_lru_keeps_recently_used():
+    """
+    Checks that a hit protects the entry from eviction.
+    """
+    calls = []
+    identity = counting(calls, max_size=2)
+    identity(1)
+    identity(2)
+    identity(1)
+    identity(3)
+    identity(1)
+    assert calls == [1, 2, 3]
+    identity(2)
+    assert calls == [1, 2, 3, 2]
+
+
+def test_cached_fifo_evicts_oldest():
+    """
+    Checks that the fifo policy ignores hits.
+    """
+    calls = []
+    identity = counting(calls, max_size=2, policy="fifo")
+    identity(1)
+    identity(2)
+    identity(1)
+    identity(3)
+    identity(1)
+    assert calls == [1, 2, 3, 1]
+
+
+def test_cached_lfu_keeps_frequently_used():
+    """
+    Checks that the least frequently used entry is evicted first and that
+    ties are broken by recency.
+    """
+    calls = []
+    identity = counting(calls, max_size=2, policy="lfu")
+    for x in (1, 1, 1, 2, 2, 3):
+        identity(x)
+    assert calls == [1, 2, 3]
+    identity(1)
+    identity(2)
+    assert calls == [1, 2, 3, 2]
+    identity(4)
+    identity(2)
+    identity(1)
+    assert calls == [1, 2, 3, 2, 4, 2]
+
+
+def test_cached_ttl(monkeypatch):
+    """
+    Checks that results expire after ttl seconds.
+    """
+    now = [100.0]
+    monkeypatch.setattr(cache_module, "monotonic", lambda: now[0])
+    calls = []
+    identity = counting(calls, ttl=10)
+    identity(1)
+    now[0] += 9
+    identity(1)
+    assert calls == [1]
+    now[0] += 1
+    identity(1)
+    assert calls == [1, 1]
+
+
+def test_cached_max_weight():
+    """
+    Checks that the total weight of the results is bounded and that results
+    heavier than the bound are not cached.
+    """
+    calls = []
+    identity = counting(calls, max_weight=10, weigher=len)
+    identity("aaaa")
+    identity("bbbb")
+    identity("cccc")
+    identity("bbbb")
+    identity("cccc")
+    assert calls == ["aaaa", "bbbb", "cccc"]
+    identity("aaaa")
+    assert calls == ["aaaa", "bbbb", "cccc", "aaaa"]
+    identity("x" * 11)
+    identity("x" * 11)
+    assert calls[-2:] == ["x" * 11, "x" * 11]
+
+
+def test_cached_unknown_policy():
+    with pytest.raises(ValueError):
+        cached(policy="random")
+
+
+def test_cached_thread_safe_single_flight():
+    """
+    Checks that concurrent misses on the same key call the function once and
+    that every caller gets its result.
+    """
+    calls = []
+    release = threading.Event()
+
+    @cached(thread_safe=True)
+    def slow(x):
+        calls.append(x)
+        release.wait(5)
+        return x * 2
+
+    with ThreadPoolExecutor(8) as executor:
+        futures = [executor.submit(slow, 21) for _ in range(8)]
+        time.sleep(0.1)
+        release.set()
+        assert [future.result() for future in futures] == [42] * 8
+    assert calls == [21]
+
+
+def test_cached_thread_safe_shares_error():
+    """
+    Checks that waiting callers get the error of the computing one and that
+    the error is not cached.
+    """
+    calls = []
+    release = threading.Event()
+
+    @cached(thread_safe=True)
+    def failing(x):
+        calls.append(x)
+        release.wait(5)
+        if len(calls) == 1:
+            raise ValueError("boom")
+        return x
+
+    with ThreadPoolExecutor(4) as executor:
+        futures = [executor.submit(failing, 1) for _ in range(4)]
+        time.sleep(0.1)
+        release.set()
+        for future in futures:
+            with pytest.raises(ValueError):
+                future.result()
+    assert failing(1) == 1
+    assert calls == [1, 1]
+
+
+def test_cached_thread_safe_bounds():
+    """
+    Checks that the stripes together hold at most max_size results under
+    concurrent use (so at most 10 of the last calls are hits).
+    """
+    calls = []
+
+    @cached(max_size=10, thread_safe=True, stripes=4)
+    def identity(x):
+        calls.append(x)
+        return x
+
+    with ThreadPoolExecutor(4) as executor:
+        assert list(executor.map(identity, range(1000))) == list(range(1000))
+    calls.clear()
+    for x in range(1000):
+        identity(x)
+    assert 990 <= len(calls) <= 1000
+
+
+def test_cached_invalid_stripes():
+    with pytest.raises(ValueError):
+        cached(thread_safe=True, stripes=0)
+
+
+def test_cached_kwargs_order_and_positional_keys():
+    """
+    Checks that the order of keyword arguments does not matter and that
+    keyword and positional calls do not share entries.
+    """
+    calls = []
+
+    @cached()
+    def pair(a=0, b=0):
+        calls.append((a, b))
+        return (a, b)
+
+    assert pair(a=1, b=2) == (1, 2)
+    assert pair(b=2, a=1) == (1, 2)
+    assert len(calls) == 1
+    assert pair(1, 2) == (1, 2)
+    assert pair(1) == (1, 0)
+    assert pair(a=1) == (1, 0)
+    assert len(calls) == 4
+
+
+def test_cached_unhashable_arguments():
+    """
+    Checks that unhashable arguments need a key function.
+    """
+
+    @cached()
+    def total(values):
+        return sum(values)
+
+    with pytest.raises(TypeError):
+        total([1, 2])
+
+
+def test_cached_content_key_matrices():
+    """
+    Checks that content_key caches functions of nested lists by value.
+    """
+    calls = []
+
+    @cached(key=content_key)
+    def multiply(mat1, mat2):
+        calls.append(1)
+        return matrix_multiplication(mat1, mat2)
+
+    identity = [[1.0, 0.0], [0.0, 1.0]]
+    assert multiply([[1.0, 2.0], [3.0, 4.0]], identity) == [[1.0, 2.0], [3.0, 4.0]]
+    assert multiply([[1.0, 2.0], [3.0, 4.0]], identity) == [[1.0, 2.0], [3.0, 4.0]]
+    assert len(calls) == 1
+    assert multiply([[1.0, 2.0], [3.0, 5.0]], identity) == [[1.0, 2.0], [3.0, 5.0]]
+    assert len(calls) == 2
+
+
+def test_content_key():
+    """
+    Checks that content_key ignores the order of dicts and sets but tells
+    apart values of different types and structure.
+    """
+    assert content_key({"a": 1, "b": [2]}) == content_key({"b": [2], "a": 1})
+    assert content_key({1, 2, 3}) == content_key({3, 2, 1})
+    assert content_key([1, 2]) != content_key((1, 2))
+    assert content_key([1]) != content_key([1.0])
+    assert content_key([[1], 2]) != content_key([1, [2]])
+    assert content_key(["a", "b"]) != content_key(["ab"])
+    assert content_key(1, x=2) != content_key(1, 2)
+    assert content_key(b"ab", bytearray(b"c")) == content_key(b"ab", bytearray(b"c"))
+    assert content_key(memoryview(b"abc")) == content_key(memoryview(b"abc"))
+    assert content_key(memoryview(b"abc")) != content_key(b"abc")
+    assert content_key(memoryview(b"abcd").cast("H")) != content_key(
+        memoryview(b"abcd")
+    )
+
+
+def test_cache_info():
+    """
+    Checks the hit, miss, eviction and size counters.
+    """
+    calls = []
+    identity = counting(calls, max_size=2, stats=True)
+    for x in (1, 2, 1, 3, 1):
+        identity(x)
+    info = identity.cache_info()
+    assert info == CacheInfo(2, 3, 1, 2, 2, info.memory)
+    assert info.memory > 0
+
+
+def test_cache_info_without_stats():
+    """
+    Checks that hits and misses are not counted by default.
+    """
+    calls = []
+    identity = counting(calls, max_size=1)
+    for x in (1, 1, 2):
+        identity(x)
+    info = identity.cache_info()
+    assert (info.hits, info.misses, info.evictions, info.size) == (0, 0, 1, 1)
+
+
+def test_cache_clear_and_invalidate():
+    """
+    Checks that results can be removed all at once or per call.
+    """
+    calls = []
+    identity = counting(calls, stats=True)
+    identity(1)
+    identity(2)
+    assert identity.cache_invalidate(1)
+    assert not identity.cache_invalidate(1)
+    identity(1)
+    identity(2)
+    assert calls == [1, 2, 1]
+    identity.cache_clear()
+    assert identity.cache_info() == CacheInfo(0, 0, 0, 0, None, 0)
+    identity(2)
+    assert calls == [1, 2, 1, 2]
+
+
+def test_cache_on_evict(monkeypatch):
+    """
+    Checks that the eviction callback gets evicted and expired entries but
+    not invalidated ones.
+    """
+    now = [0.0]
+    monkeypatch.setattr(cache_module, "monotonic", lambda: now[0])
+    evicted = []
+
+    @cached(max_size=2, ttl=10, on_evict=lambda key, value: evicted.append(value))
+    def square(x):
+        return x * x
+
+    square(1)
+    square(2)
+    square(3)
+    assert evicted == [1]
+    square.cache_invalidate(2)
+    now[0] = 20
+    square(3)
+    assert evicted == [1, 9]
+    assert square.cache_info().evictions == 2
+
+
+def test_cache_info_thread_safe():
+    """
+    Checks that the statistics of all stripes are combined.
+    """
+    calls = []
+    identity = counting(calls, thread_safe=True, stripes=4, stats=True)
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(identity, list(range(100)) * 2))
+    info = identity.cache_info()
+    assert info.size == 100
+    assert info.hits + info.misses == 200
+    assert info.misses >= len(calls) == 100
+    assert identity.cache_invalidate(5)
+    assert identity.cache_info().size == 99
+
+
+def persisted_square(path, calls):
+    """
+    Returns a square function cached in memory and in a DiskCache at path.
+    Every call creates a new in-memory cache, like a restarted process.
+    """
+
+    @cached(persist=DiskCache(path))
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    return square
+
+
+def square_in_child(path, x):
+    persisted_square(path, [])(x)
+
+
+def test_cached_persist_survives_restart(tmp_path):
+    """
+    Checks that results are loaded from the persistent tier by a new cache.
+    """
+    calls = []
+    assert persisted_square(tmp_path / "cache.db", calls)(3) == 9
+    square = persisted_square(tmp_path / "cache.db", calls)
+    assert square(3) == 9
+    assert square(4) == 16
+    assert calls == [3, 4]
+
+
+def test_cached_persist_shared_between_processes(tmp_path):
+    """
+    Checks that a result computed by another process is not recomputed.
+    """
+    context = multiprocessing.get_context("fork")
+    process = context.Process(target=square_in_child, args=(tmp_path / "c.db", 5))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    calls = []
+    assert persisted_square(tmp_path / "c.db", calls)(5) == 25
+    assert calls == []
+
+
+def test_cached_persist_clear_and_invalidate(tmp_path):
+    """
+    Checks that cache_clear() and cache_invalidate() remove persisted results.
+    """
+    calls = []
+    square = persisted_square(tmp_path / "cache.db", calls)
+    square(1)
+    square(2)
+    assert square.cache_invalidate(1)
+    square = persisted_square(tmp_path / "cache.db", calls)
+    square(1)
+    square(2)
+    assert calls == [1, 2, 1]
+    square.cache_clear()
+    persisted_square(tmp_path / "cache.db", calls)(2)
+    assert calls == [1, 2, 1, 2]
+
+
+def test_cached_persist_ttl_and_serializer(tmp_path, monkeypatch):
+    """
+    Checks that persisted results expire and that another serializer can be
+    used.
+    """
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "time", lambda: now[0])
+    calls = []
+    storage = DiskCache(tmp_path / "cache.db", serializer=json)
+
+    def make():
+        @cached(ttl=10, persist=storage)
+        def pair(a, b):
+            calls.append((a, b))
+            return [a, b]
+
+        return pair
+
+    assert make()(1, "x") == [1, "x"]
+    now[0] += 5
+    assert make()(1, "x") == [1, "x"]
+    now[0] += 5
+    assert make()(1, "x") == [1, "x"]
+    assert calls == [(1, "x"), (1, "x")]
+
+
+def test_cached_persist_unserializable(tmp_path, caplog):
+    """
+    Checks that a result the serializer rejects is logged and only cached in
+    memory.
+    """
+    calls = []
+    storage = DiskCache(tmp_path / "cache.db")
+
+    @cached(persist=storage, thread_safe=True)
+    def make_lock(name):
+        calls.append(name)
+        return threading.Lock()
+
+    assert make_lock("a") is make_lock("a")
+    assert calls == ["a"]
+    assert "Cannot store a result" in caplog.text
+
+
+@pytest.mark.parametrize("policy", ["lru", "lfu", "fifo"])
+def test_cached_ttl_sweeps_expired(monkeypatch, policy):
+    """
+    Checks that a ttl-only cache over distinct keys does not grow without
+    bound.
+    """
+    now = [0.0]
+    monkeypatch.setattr(cache_module, "monotonic", lambda: now[0])
+    calls = []
+    identity = counting(calls, ttl=10, policy=policy)
+    for x in range(1000):
+        now[0] = x
+        identity(x)
+    info = identity.cache_info()
+    assert info.size <= 11
+    assert info.evictions >= 989
+
+
+def test_cached_persist_unencodable_arguments(tmp_path, caplog):
+    """
+    Checks that arguments content_key cannot encode bypass the tier instead
+    of failing the call.
+    """
+    calls = []
+
+    @cached(persist=DiskCache(tmp_path / "cache.db"))
+    def locked(x, lock=None):
+        calls.append(x)
+        return x
+
+    lock = threading.Lock()
+    assert locked(1, lock=lock) == 1
+    assert locked(1, lock=lock) == 1
+    assert calls == [1]
+    assert locked.cache_invalidate(1, lock=lock)
+    assert "Cannot build the persistent key" in caplog.text
+
+
+def test_disk_cache_logs_database_errors(tmp_path, caplog):
+    """
+    Checks that delete(), clear() and purge() log database errors like get()
+    and set() instead of raising.
+    """
+    storage = DiskCache(tmp_path / "cache.db")
+    storage._connect().execute("DROP TABLE cache")
+    storage.delete("f", b"key")
+    storage.clear("f")
+    storage.clear()
+    storage.purge()
+    assert storage.get("f", b"key") is cache_module._MISSING
+    assert caplog.text.count("Cannot update") == 4
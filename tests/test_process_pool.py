@@ -0,0 +1,150 @@
+import os
+import signal
+import time
+import pytest
+from array import array
+from concurrent.futures import CancelledError
+from concurrent.futures.process import BrokenProcessPool
+from project.thread_pool.process_pool import ProcessPool
+from project.vector_and_matrix.matrix import matrix_multiplication
+
+
+def add(x, y=0):
+    return x + y
+
+
+def describe(value):
+    return type(value).__name__, value
+
+
+def divide(x, y):
+    return x / y
+
+
+def crash(code):
+    os._exit(code)
+
+
+@pytest.fixture
+def pool():
+    pool = ProcessPool(2, shm_threshold=64)
+    yield pool
+    pool.dispose()
+
+
+def test_task_addition(pool):
+    results = [pool.enqueue(add, i, y=10) for i in range(20)]
+
+    assert [res.result(timeout=5) for res in results] == list(range(10, 30))
+
+
+def test_exception_handling(pool):
+    with pytest.raises(ZeroDivisionError):
+        pool.enqueue(divide, 1, 0).result(timeout=5)
+
+
+def test_unpicklable_task(pool):
+    with pytest.raises(Exception):
+        pool.enqueue(lambda: 1).result(timeout=5)
+    assert pool.enqueue(add, 1, 2).result(timeout=5) == 3
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        list(range(100)),
+        [i / 3 for i in range(100)],
+        [[float(i * j) for j in range(12)] for i in range(12)],
+        bytes(range(200)),
+        bytearray(b"x" * 100),
+        array("i", range(100)),
+        array("d", [0.5] * 100),
+        [1, "mixed", 2.0] * 20,
+    ],
+)
+def test_large_arguments(pool, value):
+    assert pool.enqueue(describe, value).result(timeout=5) == (
+        type(value).__name__,
+        value,
+    )
+
+
+def test_matrix_multiplication(pool):
+    mat = [[float(i + j) for j in range(10)] for i in range(10)]
+
+    result = pool.enqueue(matrix_multiplication, mat, mat).result(timeout=5)
+
+    assert result == matrix_multiplication(mat, mat)
+
+
+def test_worker_recycling():
+    pool = ProcessPool(1, max_tasks_per_child=2)
+    pids = [pool.enqueue(os.getpid).result(timeout=5) for _ in range(6)]
+
+    assert len(set(pids)) == 3
+    assert len(pool.processes) == 1
+    pool.dispose()
+
+
+def test_dispose():
+    pool = ProcessPool(3)
+    processes = list(pool.processes.values())
+    pool.dispose()
+
+    assert not pool.processes
+    assert not any(process.is_alive() for process in processes)
+    with pytest.raises(ValueError):
+        ProcessPool(1, max_tasks_per_child=0)
+
+
+def test_dispose_drains_or_cancels():
+    for drain in (False, True):
+        pool = ProcessPool(1)
+        pool.enqueue(time.sleep, 0.1)
+        results = [pool.enqueue(add, i) for i in range(20)]
+        pool.dispose(drain=drain)
+
+        if drain:
+            assert [res.result(timeout=1) for res in results] == list(range(20))
+        else:
+            assert all(res.done() for res in results)
+            assert results[-1].cancelled()
+
+
+def test_dispose_without_wait_cancels_queued_tasks():
+    pool = ProcessPool(1)
+    results = [pool.enqueue(time.sleep, 0.2) for _ in range(4)]
+    pool.dispose(wait=False)
+
+    for res in results[1:]:
+        with pytest.raises(CancelledError):
+            res.result(timeout=2)
+    pool._collector.join()
+    assert all(res.done() for res in results)
+
+
+def test_worker_crash():
+    pool = ProcessPool(1)
+    with pytest.raises(BrokenProcessPool):
+        pool.enqueue(crash, 3).result(timeout=10)
+    assert pool.enqueue(abs, -5).result(timeout=10) == 5
+    assert len(pool.processes) == 1
+    pool.dispose()
+    assert not pool.processes
+
+
+def test_idle_worker_killed_breaks_pool():
+    pool = ProcessPool(2)
+    os.kill(next(iter(pool.processes.values())).pid, signal.SIGKILL)
+    with pytest.raises(BrokenProcessPool):
+        pool.enqueue(abs, -5).result(timeout=10)
+    pool.dispose()
+    assert not pool.processes
+
+
+def test_enqueue_after_dispose_is_cancelled():
+    pool = ProcessPool(1, shm_threshold=64)
+    pool.dispose()
+    result = pool.enqueue(len, bytes(1000))
+    with pytest.raises(CancelledError):
+        result.result(timeout=2)
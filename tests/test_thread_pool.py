@@ -1,6 +1,27 @@
 import pytest
+import queue
+import threading
 import time
-from project.thread_pool.thread_pool import ThreadPool
+from concurrent.futures import CancelledError
+from project.thread_pool.metrics import LatencyHistogram, TaskHooks
+from project.thread_pool.thread_pool import (
+    ResultWrapper,
+    ThreadPool,
+    _ChunkResult,
+    as_completed,
+    wait_all,
+    wait_any,
+)
+
+
+def occupy(pool, release):
+    """
+    Submits a task that blocks the worker until release is set.
+    """
+    started = threading.Event()
+    result = pool.enqueue(lambda: started.set() or release.wait())
+    assert started.wait(timeout=2)
+    return result
 
 
 def test_task_addition():
@@ -73,3 +94,428 @@ def test_thread_pool_size():
     for thread in pool.threads:
         assert thread.is_alive()
     pool.dispose()
+
+
+def test_tasks_run_in_parallel():
+    barrier = threading.Barrier(4, timeout=2)
+
+    pool = ThreadPool(4)
+    results = [pool.enqueue(barrier.wait) for _ in range(4)]
+
+    assert sorted(res.result(timeout=3) for res in results) == [0, 1, 2, 3]
+    pool.dispose()
+
+
+def test_idle_pool_latency():
+    pool = ThreadPool(2)
+    time.sleep(0.2)
+    start = time.perf_counter()
+    assert pool.enqueue(lambda: 1).result(timeout=1) == 1
+    assert time.perf_counter() - start < 0.05, "Idle workers should wake at once"
+    pool.dispose()
+
+
+def test_dispose_wakes_idle_workers():
+    pool = ThreadPool(3)
+    pool.dispose()
+    assert not any(thread.is_alive() for thread in pool.threads)
+
+
+def test_work_stealing_basic():
+    pool = ThreadPool(4, work_stealing=True)
+    results = [pool.enqueue(pow, i, 2) for i in range(100)]
+
+    assert [res.result(timeout=1) for res in results] == [i * i for i in range(100)]
+    with pytest.raises(ZeroDivisionError):
+        pool.enqueue(divmod, 1, 0).result(timeout=1)
+    pool.dispose()
+    assert not any(thread.is_alive() for thread in pool.threads)
+
+
+def test_work_stealing_recursive_fan_out():
+    pool = ThreadPool(4, work_stealing=True)
+    total = []
+    done = threading.Event()
+    pending = [0]
+    lock = threading.Lock()
+
+    def fan_out(lo, hi):
+        if hi - lo <= 8:
+            with lock:
+                total.append(sum(range(lo, hi)))
+                pending[0] -= 1
+                if pending[0] == 0:
+                    done.set()
+            return
+        mid = (lo + hi) // 2
+        with lock:
+            pending[0] += 1
+        pool.enqueue(fan_out, lo, mid)
+        pool.enqueue(fan_out, mid, hi)
+
+    pending[0] = 1
+    pool.enqueue(fan_out, 0, 10_000)
+
+    assert done.wait(timeout=5)
+    assert sum(total) == sum(range(10_000))
+    pool.dispose()
+
+
+def test_idle_workers_steal_local_tasks():
+    pool = ThreadPool(4, work_stealing=True)
+
+    def parent():
+        children = [pool.enqueue(threading.get_ident) for _ in range(3)]
+        return threading.get_ident(), [child.result(timeout=2) for child in children]
+
+    parent_ident, idents = pool.enqueue(parent).result(timeout=3)
+
+    assert len(idents) == 3
+    assert parent_ident not in idents, "Blocked worker's tasks must be stolen"
+    pool.dispose()
+
+
+@pytest.mark.parametrize("work_stealing", [False, True])
+def test_map(work_stealing):
+    pool = ThreadPool(4, work_stealing=work_stealing)
+
+    expected = [abs(i) for i in range(-50, 50)]
+    assert pool.map(abs, range(-50, 50), chunksize=7) == expected
+    assert pool.map(abs, []) == []
+    assert sorted(pool.imap_unordered(abs, range(100), chunksize=3)) == list(range(100))
+    with pytest.raises(ValueError):
+        pool.map(abs, range(3), chunksize=0)
+    pool.dispose()
+
+
+def test_imap_is_lazy_and_bounded():
+    consumed = []
+
+    def source():
+        for i in range(1000):
+            consumed.append(i)
+            yield i
+
+    pool = ThreadPool(2)
+    results = pool.imap(lambda x: x * 2, source(), chunksize=10, max_pending=3)
+
+    assert consumed == [], "Nothing should be submitted before iteration"
+    assert next(results) == 0
+    assert len(consumed) <= 50, "Only a bounded number of chunks may be read"
+    assert list(results) == [2 * i for i in range(1, 1000)]
+    pool.dispose()
+
+
+def test_imap_bounded_behind_slow_head_chunk():
+    consumed = []
+
+    def source():
+        for i in range(10_000):
+            consumed.append(i)
+            yield i
+
+    def slow_first(x):
+        if x == 0:
+            time.sleep(0.3)
+        return x
+
+    pool = ThreadPool(4)
+    results = pool.imap(slow_first, source(), chunksize=10, max_pending=4)
+    assert next(results) == 0
+    assert len(consumed) <= 80, "Finished chunks must not pile up behind the head"
+    assert list(results) == list(range(1, 10_000))
+    pool.dispose()
+
+
+def test_chunk_result_is_a_result_wrapper():
+    done = queue.SimpleQueue()
+    chunk_result = _ChunkResult(done, 3)
+    callbacks = []
+    chunk_result.add_done_callback(callbacks.append)
+    assert not chunk_result.done()
+    chunk_result.set_result([1, 2])
+    assert chunk_result.done() and not chunk_result.cancelled()
+    assert chunk_result.result() == [1, 2]
+    assert callbacks == [chunk_result]
+    assert done.get_nowait() == (3, True, [1, 2])
+
+    cancelled = _ChunkResult(done, 4)
+    assert cancelled.cancel() and cancelled.cancelled()
+    index, ok, error = done.get_nowait()
+    assert (index, ok) == (4, False) and isinstance(error, CancelledError)
+
+
+def test_imap_ordered_with_uneven_tasks():
+    def slow_for_small(x):
+        time.sleep(0.02 if x < 4 else 0)
+        return x
+
+    pool = ThreadPool(4)
+    assert list(pool.imap(slow_for_small, range(20), chunksize=2)) == list(range(20))
+    pool.dispose()
+
+
+def test_imap_propagates_errors():
+    pool = ThreadPool(2)
+    with pytest.raises(ZeroDivisionError):
+        list(pool.imap(lambda x: 1 / x, [3, 2, 1, 0, 5], chunksize=2))
+    pool.dispose()
+
+
+def test_imap_yields_results_before_the_failed_item():
+    def work(x):
+        if x == 0:
+            time.sleep(0.3)
+        if x == 5:
+            raise ValueError(x)
+        return x
+
+    pool = ThreadPool(4)
+    results = []
+    with pytest.raises(ValueError):
+        for result in pool.imap(work, range(10), chunksize=1):
+            results.append(result)
+    assert results == [0, 1, 2, 3, 4]
+    pool.dispose()
+
+
+def test_bounded_queue_rejects():
+    release = threading.Event()
+    pool = ThreadPool(1, max_queue_size=2, full_policy="reject")
+    occupy(pool, release)
+    queued = [pool.enqueue(abs, -1), pool.enqueue(abs, -2)]
+
+    with pytest.raises(queue.Full):
+        pool.enqueue(abs, -3)
+    release.set()
+    assert [res.result(timeout=1) for res in queued] == [1, 2]
+    pool.dispose()
+
+
+def test_bounded_queue_blocks_with_timeout():
+    release = threading.Event()
+    pool = ThreadPool(1, max_queue_size=1, queue_timeout=0.05)
+    occupy(pool, release)
+    pool.enqueue(abs, -1)
+
+    with pytest.raises(queue.Full):
+        pool.submit(abs, (-2,))
+    threading.Timer(0.05, release.set).start()
+    assert pool.submit(abs, (-3,), timeout=2).result(timeout=1) == 3
+    pool.dispose()
+
+
+def test_priorities():
+    release = threading.Event()
+    order = []
+    pool = ThreadPool(1, priorities=True)
+    occupy(pool, release)
+    results = [pool.submit(order.append, (p,), priority=p) for p in (5, 1, 3, 1, 0)]
+    release.set()
+
+    for res in results:
+        res.result(timeout=1)
+    assert order == [0, 1, 1, 3, 5]
+    pool.dispose()
+
+
+def test_expired_tasks_are_dropped():
+    release = threading.Event()
+    calls = []
+    pool = ThreadPool(1)
+    pool.enqueue(release.wait)
+    expired = pool.submit(calls.append, (1,), deadline=time.monotonic() + 0.01)
+    alive = pool.submit(calls.append, (2,), deadline=time.monotonic() + 10)
+    time.sleep(0.05)
+    release.set()
+
+    with pytest.raises(TimeoutError):
+        expired.result(timeout=1)
+    alive.result(timeout=1)
+    assert calls == [2]
+    pool.dispose()
+
+
+def test_invalid_queue_options():
+    with pytest.raises(ValueError):
+        ThreadPool(1, full_policy="drop")
+    with pytest.raises(ValueError):
+        ThreadPool(1, max_queue_size=0)
+    with pytest.raises(ValueError):
+        ThreadPool(1, work_stealing=True, priorities=True)
+
+
+@pytest.mark.parametrize("work_stealing", [False, True])
+def test_elastic_pool_grows_and_shrinks(work_stealing):
+    pool = ThreadPool(4, work_stealing=work_stealing, min_threads=1, idle_timeout=0.1)
+    assert len(pool.threads) == 1
+
+    barrier = threading.Barrier(4, timeout=2)
+    results = [pool.enqueue(barrier.wait) for _ in range(4)]
+    assert sorted(res.result(timeout=3) for res in results) == [0, 1, 2, 3]
+    assert len(pool.threads) == 4
+
+    deadline = time.monotonic() + 3
+    while len(pool.threads) > 1 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert len(pool.threads) == 1
+    assert pool.enqueue(abs, -5).result(timeout=1) == 5
+    pool.dispose()
+
+
+def test_elastic_pool_starts_empty():
+    pool = ThreadPool(8, min_threads=0, idle_timeout=0.05)
+    assert pool.threads == []
+    assert pool.map(abs, range(-20, 0), chunksize=5) == list(range(20, 0, -1))
+    assert 1 <= len(pool.threads) <= 8
+    pool.dispose()
+    with pytest.raises(ValueError):
+        ThreadPool(2, min_threads=3)
+
+
+def test_result_timeout_raises():
+    release = threading.Event()
+    pool = ThreadPool(1)
+    result = pool.enqueue(release.wait)
+
+    with pytest.raises(TimeoutError):
+        result.result(timeout=0.05)
+    release.set()
+    assert result.result(timeout=1) is True
+    pool.dispose()
+
+
+def test_cancel_queued_task():
+    release = threading.Event()
+    calls = []
+    pool = ThreadPool(1)
+    running = occupy(pool, release)
+    queued = pool.enqueue(calls.append, 1)
+
+    assert not running.cancel()
+    assert queued.cancel()
+    assert queued.cancelled() and queued.done()
+    release.set()
+    with pytest.raises(CancelledError):
+        queued.result(timeout=1)
+    running.result(timeout=1)
+    pool.dispose()
+    assert calls == []
+
+
+def test_cancel_races_with_start():
+    wrappers = [ResultWrapper() for _ in range(2000)]
+    started = []
+    thread = threading.Thread(
+        target=lambda: started.extend(wrapper.set_running() for wrapper in wrappers)
+    )
+    thread.start()
+    cancelled = [wrapper.cancel() for wrapper in wrappers]
+    thread.join()
+    assert all(ok != cut for ok, cut in zip(started, cancelled))
+    assert [wrapper.cancelled() for wrapper in wrappers] == cancelled
+
+
+def test_add_done_callback():
+    pool = ThreadPool(2)
+    seen = []
+    done = threading.Event()
+    result = pool.enqueue(time.sleep, 0.05)
+    result.add_done_callback(lambda res: seen.append(res.done()))
+    result.add_done_callback(lambda res: 1 / 0)
+    result.add_done_callback(lambda res: done.set())
+
+    assert done.wait(timeout=1)
+    result.add_done_callback(lambda res: seen.append("late"))
+    assert seen == [True, "late"]
+    pool.dispose()
+
+
+def test_wait_helpers():
+    pool = ThreadPool(3)
+    results = [pool.enqueue(time.sleep, delay) for delay in (0.2, 0.01, 0.1)]
+
+    assert wait_any(results, timeout=1) is results[1]
+    assert list(as_completed(results, timeout=1)) == [
+        results[1],
+        results[2],
+        results[0],
+    ]
+    wait_all(results, timeout=1)
+    with pytest.raises(TimeoutError):
+        wait_all([pool.enqueue(time.sleep, 0.5)], timeout=0.05)
+    with pytest.raises(ValueError):
+        wait_any([])
+    pool.dispose()
+
+
+@pytest.mark.parametrize("work_stealing", [False, True])
+def test_dispose_drains_or_cancels(work_stealing):
+    for drain in (False, True):
+        release = threading.Event()
+        pool = ThreadPool(1, work_stealing=work_stealing)
+        occupy(pool, release)
+        queued = [pool.enqueue(abs, -i) for i in range(5)]
+        threading.Timer(0.05, release.set).start()
+        pool.dispose(drain=drain)
+
+        if drain:
+            assert [res.result(timeout=1) for res in queued] == list(range(5))
+        else:
+            assert all(res.cancelled() for res in queued)
+            assert pool.enqueue(abs, -1).cancelled()
+
+
+def test_latency_histogram():
+    histogram = LatencyHistogram()
+    for micros in range(1, 1001):
+        histogram.add(micros / 1e6)
+
+    assert histogram.count == 1000
+    assert histogram.max == pytest.approx(1e-3)
+    for p in (50, 90, 99):
+        assert p / 1e5 <= histogram.percentile(p) <= p / 1e5 * 1.25
+    assert LatencyHistogram().percentile(50) == 0
+
+
+def test_stats():
+    pool = ThreadPool(2, metrics=True)
+    results = [pool.enqueue(time.sleep, 0.01) for _ in range(6)]
+    results.append(pool.enqueue(divmod, 1, 0))
+    wait_all(results, timeout=2)
+
+    stats = pool.stats()
+    assert stats["completed"] == 6
+    assert stats["failed"] == 1
+    assert stats["queue_depth"] == 0
+    assert stats["threads"] == 2
+    assert stats["run_time"]["count"] == 7
+    assert 0.01 <= stats["run_time"]["p50"] <= 0.05
+    assert stats["wait_time"]["max"] >= 0.01
+    assert sum(worker["tasks"] for worker in stats["workers"]) == 7
+    assert all(0 < worker["busy_ratio"] <= 1 for worker in stats["workers"])
+    pool.dispose()
+
+
+def test_hooks():
+    class Recorder(TaskHooks):
+        def __init__(self):
+            self.started = []
+            self.finished = []
+
+        def task_started(self, wait_time):
+            self.started.append(wait_time)
+
+        def task_finished(self, run_time, error):
+            self.finished.append(type(error))
+
+    recorder = Recorder()
+    pool = ThreadPool(1, metrics=False, hooks=[recorder])
+    pool.enqueue(abs, -1).result(timeout=1)
+    with pytest.raises(ZeroDivisionError):
+        pool.enqueue(divmod, 1, 0).result(timeout=1)
+
+    assert len(recorder.started) == 2
+    assert recorder.finished == [type(None), ZeroDivisionError]
+    assert pool.stats()["completed"] == 0
+    pool.dispose()
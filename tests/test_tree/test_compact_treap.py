@@ -0,0 +1,73 @@
+import random
+import pytest
+from collections.abc import MutableMapping
+from project.tree.compact_treap import CompactTreap
+
+
+@pytest.fixture
+def treap():
+    tree = CompactTreap()
+    data = {3: "c", 1: "a", 2: "b", 4: "d"}
+    for k, v in data.items():
+        tree[k] = v
+    return tree
+
+
+def test_get_set(treap):
+    assert treap[1] == "a"
+    treap[1] = "z"
+    assert treap[1] == "z"
+    assert len(treap) == 4
+
+
+def test_delete_and_key_error(treap):
+    del treap[2]
+    assert 2 not in treap
+    with pytest.raises(KeyError):
+        _ = treap[2]
+    with pytest.raises(KeyError):
+        del treap[2]
+    assert len(treap) == 3
+
+
+def test_iteration(treap):
+    assert list(treap) == [1, 2, 3, 4]
+    assert list(reversed(treap)) == [4, 3, 2, 1]
+    assert list(treap.items()) == [(1, "a"), (2, "b"), (3, "c"), (4, "d")]
+    assert list(treap.values()) == ["a", "b", "c", "d"]
+
+
+def test_pop_get_setdefault(treap):
+    assert treap.pop(3) == "c"
+    assert treap.pop(3, None) is None
+    assert treap.get(3, "x") == "x"
+    assert treap.setdefault(3, "new") == "new"
+    assert treap.setdefault(3, "other") == "new"
+
+
+def test_freed_slots_are_reused(treap):
+    del treap[1]
+    del treap[2]
+    treap[10] = "j"
+    treap[11] = "k"
+    assert len(treap._keys) == 4
+    assert list(treap) == [3, 4, 10, 11]
+
+
+def test_matches_dict_on_random_operations():
+    random.seed(1)
+    tree = CompactTreap()
+    expected = {}
+    for _ in range(2000):
+        key = random.randrange(300)
+        if random.random() < 0.3 and key in expected:
+            assert tree.pop(key) == expected.pop(key)
+        else:
+            tree[key] = -key
+            expected[key] = -key
+    assert len(tree) == len(expected)
+    assert list(tree.items()) == sorted(expected.items())
+
+
+def test_is_instance_mutablemapping(treap):
+    assert isinstance(treap, MutableMapping)
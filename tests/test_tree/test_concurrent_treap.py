@@ -0,0 +1,89 @@
+import operator
+import random
+import threading
+import pytest
+from collections.abc import MutableMapping
+from project.tree.cartesian_tree import Aggregate, TreapSnapshot
+from project.tree.concurrent_treap import ConcurrentTreap
+
+
+@pytest.fixture
+def tree():
+    tree = ConcurrentTreap(boundaries=[100, 200, 300])
+    tree.update((k, str(k)) for k in range(0, 400, 7))
+    return tree
+
+
+def test_mapping_operations(tree):
+    assert tree[7] == "7"
+    assert 210 in tree
+    assert 211 not in tree
+    tree[211] = "new"
+    assert tree.get(211) == "new"
+    assert tree.pop(211) == "new"
+    assert tree.pop(211, None) is None
+    assert tree.setdefault(5, "five") == "five"
+    del tree[5]
+    with pytest.raises(KeyError):
+        del tree[5]
+    with pytest.raises(KeyError):
+        tree.pop(5)
+    assert len(tree) == len(range(0, 400, 7))
+    assert isinstance(tree, MutableMapping)
+
+
+def test_keys_are_routed_to_shards(tree):
+    assert [len(shard) for shard in tree._shards] == [15, 14, 14, 15]
+    assert list(tree) == list(range(0, 400, 7))
+    assert list(tree.irange(90, 220)) == [k for k in range(0, 400, 7) if 90 <= k < 220]
+    assert list(tree.irange(hi=10)) == [0, 7]
+
+
+def test_snapshot_merges_shards(tree):
+    view = tree.snapshot()
+    tree[1000] = "late"
+    del tree[7]
+    assert isinstance(view, TreapSnapshot)
+    assert list(view) == list(range(0, 400, 7))
+    assert view.select(20) == 140
+    assert list(tree._shards[0]) == [k for k in range(0, 100, 7) if k != 7]
+
+
+def test_snapshot_with_aggregate():
+    tree = ConcurrentTreap([10, 20], Aggregate(operator.add, 0))
+    tree.update({k: k for k in range(30)})
+    assert tree.snapshot().reduce(5, 25) == sum(range(5, 25))
+
+
+def test_update_accepts_other_as_keyword_key():
+    tree = ConcurrentTreap(["p"])
+    tree.update({"a": 0}, other=1, self=2)
+    assert list(tree.items()) == [("a", 0), ("other", 1), ("self", 2)]
+
+
+def test_invalid_boundaries():
+    with pytest.raises(ValueError):
+        ConcurrentTreap([3, 1])
+
+
+def test_concurrent_writers_on_all_shards():
+    tree = ConcurrentTreap(boundaries=[250, 500, 750])
+    expected = {}
+    lock = threading.Lock()
+
+    def work(seed):
+        rng = random.Random(seed)
+        for _ in range(2000):
+            key = rng.randrange(1000)
+            tree[key] = seed
+            with lock:
+                expected.setdefault(key, set()).add(seed)
+
+    threads = [threading.Thread(target=work, args=(seed,)) for seed in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert list(tree) == sorted(expected)
+    for key, value in tree.items():
+        assert value in expected[key]
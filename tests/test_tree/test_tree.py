@@ -1,6 +1,10 @@
+import operator
+import random
+import sys
+import threading
 import pytest
 from collections.abc import MutableMapping
-from project.tree.cartesian_tree import Treap
+from project.tree.cartesian_tree import Aggregate, Treap, TreapNode, split, merge
 
 
 @pytest.fixture
@@ -79,3 +83,526 @@ def test_key_error(treap):
 
 def test_is_instance_mutablemapping(treap):
     assert isinstance(treap, MutableMapping)
+
+
+def test_matches_dict_on_random_operations():
+    random.seed(0)
+    tree = Treap()
+    expected = {}
+    for _ in range(2000):
+        key = random.randrange(300)
+        if random.random() < 0.3 and key in expected:
+            del tree[key]
+            del expected[key]
+        else:
+            tree[key] = key * 2
+            expected[key] = key * 2
+    assert len(tree) == len(expected)
+    assert list(tree.items()) == sorted(expected.items())
+    assert list(reversed(tree)) == sorted(expected, reverse=True)
+
+
+def test_degenerate_tree_deeper_than_recursion_limit():
+    depth = sys.getrecursionlimit() * 2
+    tree = Treap()
+    nodes = [TreapNode(i, str(i), priority=-i) for i in range(depth)]
+    for parent, child in zip(nodes, nodes[1:]):
+        parent.right = child
+    for i, node in enumerate(nodes):
+        node.size = depth - i
+    tree.root = nodes[0]
+
+    assert tree[depth - 1] == str(depth - 1)
+    assert list(tree) == list(range(depth))
+    assert next(reversed(tree)) == depth - 1
+    tree[-1] = "new"
+    del tree[depth // 2]
+    assert len(tree) == depth
+    assert depth // 2 not in tree
+    assert tree.select(depth - 1) == depth - 1
+    assert tree.rank(depth - 1) == depth - 1
+
+
+def test_split_and_merge():
+    tree = Treap()
+    for k in range(10):
+        tree[k] = k
+    left, right = split(tree.root, 4)
+    left_keys = list(tree._inorder(left))
+    right_keys = list(tree._inorder(right))
+    assert left_keys == [0, 1, 2, 3, 4]
+    assert right_keys == [5, 6, 7, 8, 9]
+    tree.root = merge(left, right)
+    assert list(tree) == list(range(10))
+
+
+def test_get_with_default(treap):
+    assert treap.get(1) == "a"
+    assert treap.get(99) is None
+    assert treap.get(99, "x") == "x"
+
+
+def test_setdefault(treap):
+    assert treap.setdefault(1, "zzz") == "a"
+    assert treap.setdefault(7, "g") == "g"
+    assert treap[7] == "g"
+    assert len(treap) == 5
+
+
+def test_pop(treap):
+    assert treap.pop(2) == "b"
+    assert 2 not in treap
+    assert len(treap) == 3
+    assert treap.pop(2, "missing") == "missing"
+    with pytest.raises(KeyError):
+        treap.pop(2)
+    assert list(treap) == [1, 3, 4]
+
+
+def check_invariants(tree):
+    """
+    Checks the key order and the heap order of priorities without recursion.
+    """
+    stack = [(tree.root, None)]
+    while stack:
+        node, parent = stack.pop()
+        if node is None:
+            continue
+        if parent is not None:
+            assert node.priority <= parent.priority
+        stack.append((node.left, node))
+        stack.append((node.right, node))
+        left_size = node.left.size if node.left else 0
+        right_size = node.right.size if node.right else 0
+        assert node.size == left_size + right_size + 1
+    keys = list(tree)
+    assert keys == sorted(keys)
+    assert len(keys) == len(tree)
+
+
+def test_from_sorted():
+    tree = Treap.from_sorted((k, str(k)) for k in range(1000))
+    check_invariants(tree)
+    assert len(tree) == 1000
+    assert tree[500] == "500"
+    assert list(tree) == list(range(1000))
+
+
+def test_from_sorted_rejects_unsorted_keys():
+    with pytest.raises(ValueError):
+        Treap.from_sorted([(2, "b"), (1, "a")])
+    with pytest.raises(ValueError):
+        Treap.from_sorted([(1, "a"), (1, "b")])
+
+
+def test_update_merges_unsorted_batch(treap):
+    treap.update([(10, "j"), (2, "B"), (0, "zero"), (10, "J")])
+    check_invariants(treap)
+    assert list(treap) == [0, 1, 2, 3, 4, 10]
+    assert treap[2] == "B"
+    assert treap[10] == "J"
+
+
+def test_update_with_kwargs():
+    tree = Treap()
+    tree.update({"b": 2}, a=1, b=3)
+    assert list(tree.items()) == [("a", 1), ("b", 3)]
+
+
+def test_update_accepts_other_as_keyword_key():
+    tree = Treap()
+    tree.update(other=1, self=2)
+    assert list(tree.items()) == [("other", 1), ("self", 2)]
+
+
+def test_update_from_mapping_and_treap():
+    random.seed(3)
+    tree = Treap()
+    expected = {}
+    for _ in range(20):
+        batch = {random.randrange(500): random.random() for _ in range(50)}
+        if random.random() < 0.5:
+            tree.update(batch)
+        else:
+            tree.update(Treap.from_sorted(sorted(batch.items())))
+        expected.update(batch)
+        check_invariants(tree)
+    assert list(tree.items()) == sorted(expected.items())
+
+
+@pytest.fixture
+def big_treap():
+    random.seed(5)
+    tree = Treap()
+    keys = random.sample(range(0, 2000, 2), 300)
+    for key in keys:
+        tree[key] = -key
+    for key in keys[::3]:
+        del tree[key]
+    return tree
+
+
+def test_sizes_after_mutations(big_treap):
+    check_invariants(big_treap)
+    size = len(big_treap)
+    left, right = split(big_treap.root, 1000)
+    assert left.size + right.size == size
+    big_treap.root = merge(left, right)
+    check_invariants(big_treap)
+
+
+def test_select_and_rank(big_treap):
+    keys = list(big_treap)
+    for i, key in enumerate(keys):
+        assert big_treap.select(i) == key
+        assert big_treap.rank(key) == i
+        assert big_treap.rank(key + 1) == i + 1
+    assert big_treap.select(-1) == keys[-1]
+    with pytest.raises(IndexError):
+        big_treap.select(len(keys))
+
+
+def test_irange_and_count_range(big_treap):
+    keys = list(big_treap)
+    bounds = [(None, None), (100, 900), (101, 899), (1500, None), (None, 3), (7, 7)]
+    for lo, hi in bounds:
+        expected = [
+            k for k in keys if (lo is None or k >= lo) and (hi is None or k < hi)
+        ]
+        assert list(big_treap.irange(lo, hi)) == expected
+        assert big_treap.count_range(lo, hi) == len(expected)
+    assert list(big_treap.irange_items(100, 120)) == [
+        (k, -k) for k in keys if 100 <= k < 120
+    ]
+    assert big_treap.count_range(900, 100) == 0
+
+
+def test_reduce_sum_over_ranges():
+    random.seed(7)
+    tree = Treap(Aggregate(operator.add, 0))
+    expected = {}
+    for _ in range(600):
+        key = random.randrange(200)
+        if random.random() < 0.25 and key in expected:
+            del tree[key]
+            del expected[key]
+        else:
+            tree[key] = key % 17
+            expected[key] = key % 17
+    tree.update({k: 1 for k in range(150, 260, 3)})
+    expected.update({k: 1 for k in range(150, 260, 3)})
+    for _ in range(200):
+        lo, hi = sorted(random.sample(range(-10, 270), 2))
+        assert tree.reduce(lo, hi) == sum(
+            v for k, v in expected.items() if lo <= k < hi
+        )
+    assert tree.reduce() == sum(expected.values())
+    assert tree.reduce(50, 10) == 0
+
+
+def test_reduce_keeps_value_order():
+    tree = Treap.from_sorted(
+        [(i, chr(ord("a") + i)) for i in range(26)], Aggregate(operator.add, "")
+    )
+    del tree[3]
+    tree[3] = "D"
+    tree.pop(20)
+    assert tree.reduce(2, 6) == "cDef"
+    assert tree.reduce(hi=5) == "abcDe"
+    assert tree.reduce(18) == "stvwxyz"
+
+
+def test_reduce_min_and_max():
+    tree = Treap(Aggregate(min, float("inf")))
+    for k in range(100):
+        tree[k] = (k * 37) % 101
+    assert tree.reduce(10, 20) == min((k * 37) % 101 for k in range(10, 20))
+    assert tree.reduce(200, 300) == float("inf")
+
+
+def test_reduce_without_aggregate(treap):
+    with pytest.raises(TypeError):
+        treap.reduce()
+
+
+def random_pair(seed):
+    random.seed(seed)
+    first = {k: ("first", k) for k in random.sample(range(400), 150)}
+    second = {k: ("second", k) for k in random.sample(range(400), 60)}
+    return first, second
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_set_operators(seed):
+    first, second = random_pair(seed)
+    a = Treap()
+    a.update(first)
+    b = Treap()
+    b.update(second)
+
+    union = a | b
+    intersection = a & b
+    difference = a - b
+
+    check_invariants(union)
+    check_invariants(intersection)
+    check_invariants(difference)
+    assert dict(union.items()) == {**first, **second}
+    assert dict(intersection.items()) == {k: v for k, v in first.items() if k in second}
+    assert dict(difference.items()) == {
+        k: v for k, v in first.items() if k not in second
+    }
+    assert dict(a.items()) == first
+    assert dict(b.items()) == second
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_in_place_set_operators(seed):
+    first, second = random_pair(seed)
+    b = Treap()
+    b.update(second)
+    for op, expected in [
+        ("|=", {**first, **second}),
+        ("&=", {k: v for k, v in first.items() if k in second}),
+        ("-=", {k: v for k, v in first.items() if k not in second}),
+    ]:
+        a = Treap(Aggregate(operator.add, 0))
+        a.update({k: 1 for k in first})
+        a.update(first)
+        original = a
+        if op == "|=":
+            a |= b
+        elif op == "&=":
+            a &= b
+        else:
+            a -= b
+        assert a is original
+        check_invariants(a)
+        assert dict(a.items()) == expected
+        assert dict(b.items()) == second
+
+
+def test_set_operators_keep_aggregate():
+    a = Treap.from_sorted([(k, k) for k in range(10)], Aggregate(operator.add, 0))
+    b = Treap.from_sorted([(k, 100) for k in range(5, 15)])
+    assert (a | b).reduce() == sum(range(5)) + 100 * 10
+    assert (a & b).reduce() == sum(range(5, 10))
+    assert (a - b).reduce() == sum(range(5))
+
+
+def test_only_aggregate_trees_carry_agg():
+    plain = Treap.from_sorted([(k, k) for k in range(10)])
+    summed = Treap.from_sorted([(k, 1) for k in range(5, 15)], Aggregate(max, 0))
+    assert not hasattr(plain.root, "agg")
+    plain |= summed
+    check_invariants(plain)
+    assert not any(hasattr(node, "agg") for node in plain._range_nodes(None, None))
+    summed |= plain
+    assert summed.reduce() == 4
+
+
+def test_set_operators_with_other_types(treap):
+    with pytest.raises(TypeError):
+        treap | {1: "x"}
+    treap |= {10: "x"}
+    assert treap[10] == "x"
+
+
+def test_copy_is_independent(treap):
+    copy = treap.copy()
+    copy[1] = "changed"
+    del copy[2]
+    assert treap[1] == "a"
+    assert 2 in treap
+    assert list(copy) == [1, 3, 4]
+
+
+def test_union_with_small_batch():
+    tree = Treap.from_sorted([(k, k) for k in range(0, 1000, 2)])
+    small = Treap.from_sorted([(1, "one"), (2, "two")])
+    tree |= small
+    check_invariants(tree)
+    assert len(tree) == 501
+    assert tree[1] == "one"
+    assert tree[2] == "two"
+
+
+def test_snapshot_is_not_affected_by_writes():
+    random.seed(9)
+    tree = Treap(Aggregate(operator.add, 0))
+    tree.update({k: k for k in range(0, 300, 3)})
+    snapshots = []
+    for step in range(40):
+        snapshots.append((tree.snapshot(), dict(tree.items())))
+        key = random.randrange(300)
+        action = step % 5
+        if action == 0:
+            tree[key] = -key
+        elif action == 1:
+            tree.pop(key, None)
+        elif action == 2:
+            tree.update({k: 1 for k in range(key, key + 150)})
+        elif action == 3:
+            tree |= Treap.from_sorted([(key, 7)], Aggregate(operator.add, 0))
+        else:
+            tree -= Treap.from_sorted([(k, 0) for k in range(key, key + 20)])
+    for view, expected in snapshots:
+        check_invariants(view)
+        assert dict(view.items()) == expected
+        assert view.reduce() == sum(expected.values())
+    check_invariants(tree)
+
+
+def test_snapshot_is_read_only(treap):
+    view = treap.snapshot()
+    with pytest.raises(TypeError):
+        view[1] = "x"
+    with pytest.raises(TypeError):
+        del view[1]
+    with pytest.raises(TypeError):
+        view.pop(1)
+    with pytest.raises(TypeError):
+        view.update({5: "e"})
+    with pytest.raises(TypeError):
+        view |= treap
+    assert view.snapshot() is view
+    assert list(view) == [1, 2, 3, 4]
+
+
+def test_snapshot_queries_and_copy(treap):
+    view = treap.snapshot()
+    treap[0] = "zero"
+    assert view.select(0) == 1
+    assert view.rank(3) == 2
+    assert list(view.irange(2, 4)) == [2, 3]
+    fork = view.copy()
+    fork[9] = "i"
+    assert 9 not in view
+    assert list(fork) == [1, 2, 3, 4, 9]
+
+
+def test_copies_are_independent_both_ways():
+    tree = Treap.from_sorted([(k, k) for k in range(100)])
+    copy = tree.copy()
+    tree[5] = "tree"
+    copy[5] = "copy"
+    del tree[50]
+    copy[1000] = 1000
+    assert (tree[5], copy[5]) == ("tree", "copy")
+    assert 50 in copy and 50 not in tree
+    assert 1000 not in tree
+    check_invariants(tree)
+    check_invariants(copy)
+
+
+def test_only_shared_trees_carry_owner():
+    tree = Treap.from_sorted([(k, k) for k in range(20)])
+    other = Treap.from_sorted([(k, -k) for k in range(10, 40)])
+    assert type(tree.root) is TreapNode
+    common = tree & other
+    rest = tree - other
+    tree |= other
+    assert list(other.items()) == [(k, -k) for k in range(10, 40)]
+    assert list(common) == list(range(10, 20))
+    assert list(rest) == list(range(10))
+    assert tree[15] == -15 and len(tree) == 40
+    assert type(common.root) is TreapNode
+    for result in (tree, other, common, rest):
+        check_invariants(result)
+
+
+def test_readers_iterate_snapshots_while_writing():
+    tree = Treap()
+    tree.update({k: k for k in range(2000)})
+    published = [tree.snapshot()]
+    stop = threading.Event()
+    errors = []
+
+    def writer():
+        random.seed(13)
+        for _ in range(3000):
+            key = random.randrange(4000)
+            if key in tree:
+                del tree[key]
+            else:
+                tree[key] = key
+            published.append(tree.snapshot())
+        stop.set()
+
+    def reader():
+        while not stop.is_set():
+            view = published[-1]
+            keys = list(view)
+            if keys != sorted(keys) or len(keys) != len(view):
+                errors.append(keys)
+
+    threads = [threading.Thread(target=reader) for _ in range(3)]
+    threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def test_snapshot_survives_intersection():
+    tree = Treap.from_sorted([(k, k) for k in range(50)])
+    view = tree.snapshot()
+    tree &= Treap.from_sorted([(k, None) for k in range(0, 100, 2)])
+    assert list(view) == list(range(50))
+    assert list(tree) == list(range(0, 50, 2))
+    check_invariants(view)
+    check_invariants(tree)
+
+
+def shape(node):
+    if node is None:
+        return None
+    return (node.key, node.value, node.priority, shape(node.left), shape(node.right))
+
+
+def test_dump_load_restores_tree(tmp_path, big_treap):
+    path = tmp_path / "tree.bin"
+    big_treap.dump(path)
+    tree = Treap.load(path, mmap=False)
+    assert shape(tree.root) == shape(big_treap.root)
+    check_invariants(tree)
+    tree[-1] = "new"
+    assert tree[-1] == "new"
+
+
+def test_load_mapped(tmp_path):
+    data = {f"key{i:03}": [i, str(i)] for i in range(0, 300, 3)}
+    tree = Treap()
+    tree.update(data)
+    path = tmp_path / "tree.bin"
+    tree.dump(path)
+    with Treap.load(path) as mapped:
+        assert len(mapped) == len(data)
+        assert mapped["key003"] == [3, "3"]
+        assert "key003" in mapped
+        assert "key004" not in mapped
+        with pytest.raises(KeyError):
+            mapped["key004"]
+        assert mapped.get("key004", 0) == 0
+        assert list(mapped) == sorted(data)
+        assert list(reversed(mapped)) == sorted(data, reverse=True)
+        assert dict(mapped.items()) == data
+        assert list(mapped.irange("key010", "key020")) == ["key012", "key015", "key018"]
+        assert mapped.select(-1) == "key297"
+        assert mapped.rank("key010") == tree.rank("key010")
+        with pytest.raises(TypeError):
+            mapped["key003"] = 1
+
+
+def test_load_empty_and_invalid(tmp_path):
+    path = tmp_path / "empty.bin"
+    Treap().dump(path)
+    assert len(Treap.load(path, mmap=False)) == 0
+    with Treap.load(path) as mapped:
+        assert list(mapped) == []
+        assert "a" not in mapped
+    bad = tmp_path / "bad.bin"
+    bad.write_bytes(b"not a treap at all, definitely")
+    with pytest.raises(ValueError):
+        Treap.load(bad)